@@ -18,7 +18,6 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
-import json
 import logging
 import os
 import sys
@@ -26,13 +25,13 @@ import atexit
 import click
 import subprocess
 
-from icgcget.commands.access_checks import AccessCheckDispatcher
-from icgcget.commands.configure import ConfigureDispatcher
-from icgcget.commands.download import DownloadDispatcher
-from icgcget.commands.reports import StatusScreenDispatcher
+# Dispatchers, download clients and the libraries behind them are imported by the commands that use them, so that
+# --help, version and other light commands start quickly
+from icgcget.clients.cache import cache_key
+from icgcget.clients.state import get_state_writer, session_parts
+from icgcget.commands.scheduling import SCHEDULES, SHARD_METHODS
 from icgcget.commands.utils import compare_ids, config_parse, validate_ids, load_json, filter_repos
-from icgcget.commands.versions import versions_command
-from icgcget.params import RepoParam, LogfileParam
+from icgcget.params import RepoParam, LogfileParam, ShardParam
 from icgcget.log_filters import MaxLevelFilter
 from icgcget.version import __version__, __container_version__
 
@@ -80,11 +79,14 @@ def logger_setup(logfile, verbose):
 
 def docker_cleanup(cid_dir):
     """
-    Function run at program exit. Removes Container ID file and exited docker containers
+    Function run at program exit. Removes the session's long running containers, the Container ID file and exited
+    docker containers
     :param cid_dir:
     :return:
     """
+    from icgcget.clients.containers import stop_containers
     logger = logging.getLogger('__log__')
+    stop_containers()
     try:
         os.remove(cid_dir + '/cidfile')
     except OSError as ex:
@@ -118,10 +120,17 @@ def subprocess_cleanup(json_path):
     """
     session = load_json(json_path, False)
     if session:
-        if session['container']:
+        container_ids = []
+        for part in session_parts(session):  # the session and each parallel repository worker
+            if part['container']:
+                container_ids.append(part['container'])
+            container_ids.extend(part.get('containers', []))  # long running containers shared by the clients
+            part['container'] = 0
+            part['containers'] = []
+        if container_ids:
             env = dict(os.environ)
             env['PATH'] = '/usr/local/bin:' + env['PATH']
-            args = ['docker', 'rm', '-f', session['container']]
+            args = ['docker', 'rm', '-f'] + sorted(set(container_ids))
             devnull = open(os.devnull, 'w')
             try:
                 subprocess.call(args, stdout=devnull, stderr=devnull, env=env)
@@ -130,11 +139,36 @@ def subprocess_cleanup(json_path):
                     print 'Docker was not installed, unable to run command'
                 else:
                     raise ex
-            # try to stop the last running container
-            session['container'] = 0
     return session
 
 
+def shard_name(name, shard):
+    """
+    Adds the shard to the name of a state file or staging directory, so that shards of a download sharing a log or
+    output directory keep their own
+    :param name:
+    :param shard: tuple of shard number and count, or None
+    :return:
+    """
+    if not shard:
+        return name
+    root, ext = os.path.splitext(name)
+    return '{0}-{1}-of-{2}{3}'.format(root, shard[0], shard[1], ext)
+
+
+def configure_clients(ctx):
+    """
+    Applies the http and move sections of config.yaml.  Called by the commands that call the APIs or move files, so
+    that other commands don't load the modules involved.
+    :param ctx:
+    :return:
+    """
+    from icgcget.clients.moves import configure_moves
+    from icgcget.clients.portal_client import configure_transport
+    configure_transport(ctx.obj.get('http'))
+    configure_moves(ctx.obj.get('move'))
+
+
 def get_container_tag(context_map):
     """
     Gets the version tag for the docker container. Default tag can be overridden by config.yaml file or environmental
@@ -169,7 +203,8 @@ def cli(ctx, config, docker, logfile, verbose):
     """
     if ctx.invoked_subcommand != 'configure':  # can't load a config file if we haven't made one yet
         config_file = config_parse(config, DEFAULT_CONFIG_FILE, docker, DOCKER_PATHS)
-        ctx.obj = {'docker': '', 'logfile': None}
+        ctx.obj = {'docker': '', 'logfile': None, 'portal': config_file.get('portal') or {},
+                   'cache': config_file.get('cache') or {}}
 
         if config != DEFAULT_CONFIG_FILE and not config_file:
             raise click.Abort()
@@ -190,6 +225,8 @@ def cli(ctx, config, docker, logfile, verbose):
             ctx.obj['logdir'] = None
             logger = logger_setup(None, verbose)
 
+        ctx.obj['http'] = config_file.get('http')
+        ctx.obj['move'] = config_file.get('move')
         if ctx.obj['docker']:
             atexit.register(docker_cleanup, ctx.obj['logdir'])
         atexit.register(subprocess_cleanup, ctx.obj['logdir'] + '/state.json')
@@ -209,6 +246,8 @@ def cli(ctx, config, docker, logfile, verbose):
 @click.option('--ega-path', envvar='ICGCGET_EGA_PATH')
 @click.option('--ega-transport-parallel', type=click.STRING, default='1', envvar='ICGCGET_EGA_TRANSPORT_PARALLEL')
 @click.option('--ega-udt', default=False, envvar='ICGCGET_EGA_UDT')
+@click.option('--ega-request-batch', type=click.IntRange(min=1), default=50, envvar='ICGCGET_EGA_REQUEST_BATCH',
+              help='Number of EGA objects added to a download request per client call')
 @click.option('--gdc-token', type=click.STRING, envvar='ICGCGET_GDC_TOKEN')
 @click.option('--gdc-path', envvar='ICGCGET_GDC_PATH')
 @click.option('--gdc-transport-parallel', type=click.STRING, default='8')
@@ -222,17 +261,51 @@ def cli(ctx, config, docker, logfile, verbose):
 @click.option('--pdc-secret', type=click.STRING, envvar='ICGCGET_PDC_SECRET')
 @click.option('--pdc-path', envvar='ICGCGET_PDC_PATH')
 @click.option('--pdc-transport-parallel', type=click.STRING, default='8', envvar='ICGCGET_PDC_TRANSPORT_PARALLEL')
+@click.option('--parallel-repos', type=click.IntRange(min=1), default=1, envvar='ICGCGET_PARALLEL_REPOS',
+              help='Number of repositories to download from at the same time')
+@click.option('--no-verify', is_flag=True, default=False, help='Do not check downloaded files against manifest md5s')
+@click.option('--staging', type=click.Path(exists=True, writable=True, file_okay=False, resolve_path=True),
+              envvar='ICGCGET_STAGING',
+              help='Scratch directory for files in transfer, defaults to the output directory')
+@click.option('--staging-size', type=click.IntRange(min=1), envvar='ICGCGET_STAGING_SIZE',
+              help='Megabytes of staging space to use, defaults to 90% of the free space of --staging')
+@click.option('--client-processes', type=click.IntRange(min=1), default=1, envvar='ICGCGET_CLIENT_PROCESSES',
+              help='Number of client processes downloading from each repository at the same time')
+@click.option('--client-batch', type=click.IntRange(min=1), default=1000, envvar='ICGCGET_CLIENT_BATCH',
+              help='Most files given to one client process')
+@click.option('--shard', type=ShardParam(), envvar='ICGCGET_SHARD',
+              help='Download only shard i of N of the files, given as i/N')
+@click.option('--shard-by', type=click.Choice(SHARD_METHODS), default='hash', envvar='ICGCGET_SHARD_BY',
+              help='Split shards by a hash of the file id, or into shares of equal size')
+@click.option('--queue', type=click.Path(exists=True, writable=True, file_okay=False, resolve_path=True),
+              envvar='ICGCGET_QUEUE', help='Shared directory to claim files from, with other nodes given the same ids')
+@click.option('--queue-batch', type=click.IntRange(min=1), default=4, envvar='ICGCGET_QUEUE_BATCH',
+              help='Number of files claimed from the shared queue at a time')
+@click.option('--schedule', type=click.Choice(SCHEDULES), default='manifest', envvar='ICGCGET_SCHEDULE',
+              help='Order in which files are downloaded: manifest order, largest or smallest first, or balanced ' +
+                   'across client streams')
 @click.option('--override', '-o', is_flag=True, default=True, help='Bypass all confirmation prompts')
 @click.option('--no-ssl-verify', is_flag=True, default=True, help='Do not verify ssl certificates')
+@click.option('--no-cache', is_flag=True, default=False, help='Do not read or write cached portal metadata')
+@click.option('--refresh', is_flag=True, default=False, help='Fetch portal metadata again and update the cache')
 @click.pass_context
 def download(ctx, **kwargs):
     """
     Download data objects by File IDs or Manifest ID.
     """
+    from icgcget.commands.download import DownloadDispatcher
     logger = logging.getLogger('__log__')
     logger.debug(str(ctx.params))
+    configure_clients(ctx)
 
-    staging = kwargs['output'] + '/.staging'
+    if kwargs['staging']:  # one directory per output, so that jobs can share a scratch filesystem
+        staging = os.path.join(kwargs['staging'], '.icgc-get-' + cache_key(kwargs['output'])[:12])
+    else:
+        staging = kwargs['output'] + '/.staging'
+    staging = shard_name(staging, kwargs['shard'])
+    if kwargs['queue']:  # nodes of a queue can share an output directory, each keeps its own partial files
+        from icgcget.clients.work_queue import node_name
+        staging = staging + '.' + node_name()
     filter_repos(kwargs['repos'])
     tag = get_container_tag(ctx)
     oldmask = os.umask(0000)
@@ -240,7 +313,7 @@ def download(ctx, **kwargs):
     if not os.path.exists(staging):
         os.mkdir(staging, 0777)
     if ctx.obj['logdir']:
-        json_path = ctx.obj['logdir'] + '/state.json'
+        json_path = ctx.obj['logdir'] + '/' + shard_name('state.json', kwargs['shard'])
     else:
         json_path = None
 
@@ -256,11 +329,18 @@ def download(ctx, **kwargs):
             download_session['file_data'] = compare_ids(download_session['file_data'],
                                                         old_download_session['file_data'], kwargs['override'])
             download_session['subprocess'] = old_download_session['subprocess']
+            download_session['repos'] = old_download_session.get('repos', {})
 
-    json.dump(download_session, open(json_path, 'w', 0777))
+    state = get_state_writer(json_path)
+    state.write(download_session)
     dispatch.download(download_session, staging, ctx)
     os.umask(oldmask)
-    os.remove(json_path)
+    state.discard()
+    if kwargs['staging'] or kwargs['shard'] or kwargs['queue']:
+        try:
+            os.rmdir(staging)
+        except OSError:
+            pass
     logger.info('Download command completed successfully.')
 
 
@@ -272,9 +352,16 @@ def download(ctx, **kwargs):
               envvar='ICGCGET_OUTPUT')
 @click.option('--table-format', '-f', type=click.Choice(['tsv', 'pretty', 'json']), default='pretty')
 @click.option('--data-type', '-t', type=click.Choice(['file', 'summary']), default='file')
+@click.option('--shard', type=ShardParam(), envvar='ICGCGET_SHARD', help='Report only shard i of N of the files')
+@click.option('--shard-by', type=click.Choice(SHARD_METHODS), default='hash', envvar='ICGCGET_SHARD_BY')
+@click.option('--queue', type=click.Path(exists=True, file_okay=False, resolve_path=True), envvar='ICGCGET_QUEUE',
+              help='Shared queue directory of the download, to report the progress of every node')
 @click.option('--no-ssl-verify', is_flag=True, default=True, help='Do not verify ssl certificates')
+@click.option('--no-cache', is_flag=True, default=False, help='Do not read or write cached portal metadata')
+@click.option('--refresh', is_flag=True, default=False, help='Fetch portal metadata again and update the cache')
 @click.pass_context
-def report(ctx, repos, ids, manifest, output, table_format, data_type, no_ssl_verify):
+def report(ctx, repos, ids, manifest, output, table_format, data_type, shard, shard_by, queue, no_ssl_verify,
+           no_cache, refresh):
     """
     Produce report on provided list of files or manifest ID.
     :param ctx:
@@ -284,35 +371,91 @@ def report(ctx, repos, ids, manifest, output, table_format, data_type, no_ssl_ve
     :param output:
     :param table_format:
     :param data_type:
+    :param shard:
+    :param shard_by:
+    :param queue:
     :param no_ssl_verify:
+    :param no_cache:
+    :param refresh:
     :return:
     """
     logger = logging.getLogger('__log__')
     logger.debug(str(ctx.params))
+    from icgcget.commands.reports import StatusScreenDispatcher
     filter_repos(repos)
     tag = get_container_tag(ctx)
 
     json_path = None
     download_session = None
     if ctx.obj['logdir']:
-        json_path = ctx.obj['logdir'] + '/.staging/state.json'  # Json is only used to speed up command if available
+        # Json is only used to speed up command if available
+        json_path = ctx.obj['logdir'] + '/.staging/' + shard_name('state.json', shard)
         old_download_session = load_json(json_path, abort=False)  # report will never write to json
         if old_download_session and (not ids or ids == old_download_session['command']):  # can run report from state
             download_session = old_download_session
 
     if ids and not download_session:
+        from icgcget.commands.download import DownloadDispatcher
+        configure_clients(ctx)
         validate_ids(ids, manifest)
         download_dispatch = DownloadDispatcher(json_path, container_version=tag)
         download_session = download_dispatch.download_manifest(ctx,  API_URL)
     dispatch = StatusScreenDispatcher()
     if not download_session:
         raise click.BadArgumentUsage('No ids provided and no session info found, aborting')
+    if queue:
+        from icgcget.clients.work_queue import WorkQueue, queue_directory
+        queue = WorkQueue(queue_directory(queue, ids or download_session['command'], repos), read_only=True)
+        dispatch.cluster_progress(download_session['file_data'], queue)
     if data_type == 'file':
         dispatch.file_table(download_session['file_data'], output, table_format)
     elif data_type == 'summary':
         dispatch.summary_table(download_session['file_data'], output, table_format)
 
 
+@cli.command()
+@click.argument('IDS', nargs=-1, required=True)
+@click.option('--repos', '-r', multiple=True, type=RepoParam())
+@click.option('--manifest', '-m', is_flag=True, default=False)
+@click.option('--output', type=click.Path(exists=True, file_okay=False, resolve_path=True), required=True,
+              envvar='ICGCGET_OUTPUT')
+@click.option('--table-format', '-f', type=click.Choice(['tsv', 'pretty', 'json']), default='pretty')
+@click.option('--processes', type=click.IntRange(min=1), default=None,
+              help='Number of files hashed at once, defaults to the number of cores')
+@click.option('--no-ssl-verify', is_flag=True, default=True, help='Do not verify ssl certificates')
+@click.option('--no-cache', is_flag=True, default=False, help='Do not read or write cached portal metadata')
+@click.option('--refresh', is_flag=True, default=False, help='Fetch portal metadata again and update the cache')
+@click.pass_context
+def verify(ctx, repos, ids, manifest, output, table_format, processes, no_ssl_verify, no_cache, refresh):
+    """
+    Check downloaded files against the md5s and sizes of a list of files or manifest ID.
+    :param ctx:
+    :param repos:
+    :param ids:
+    :param manifest:
+    :param output:
+    :param table_format:
+    :param processes:
+    :param no_ssl_verify:
+    :param no_cache:
+    :param refresh:
+    :return:
+    """
+    from icgcget.commands.download import DownloadDispatcher
+    from icgcget.commands.verification import VerificationDispatcher
+    logger = logging.getLogger('__log__')
+    logger.debug(str(ctx.params))
+    configure_clients(ctx)
+    filter_repos(repos)
+    validate_ids(ids, manifest)
+    tag = get_container_tag(ctx)
+    download_dispatch = DownloadDispatcher(container_version=tag)
+    download_session = download_dispatch.download_manifest(ctx, API_URL, space_check=False)
+    failed = VerificationDispatcher().verify(download_session['file_data'], output, table_format, processes)
+    if failed:
+        raise click.ClickException('{} files are missing or failed verification'.format(failed))
+
+
 @cli.command()
 @click.argument('IDS', nargs=-1, required=False)
 @click.option('--repos', '-r', multiple=True, type=RepoParam())
@@ -327,14 +470,19 @@ def report(ctx, repos, ids, manifest, output, table_format, data_type, no_ssl_ve
 @click.option('--pdc-secret', type=click.STRING, envvar='ICGCGET_PDC_SECRET')
 @click.option('--pdc-path', envvar='ICGCGET_PDC_ACCESS')
 @click.option('--no-ssl-verify', is_flag=True, default=True, help='Do not verify ssl certificates')
+@click.option('--no-cache', is_flag=True, default=False, help='Do not read or write cached portal metadata')
+@click.option('--refresh', is_flag=True, default=False, help='Fetch portal metadata again and update the cache')
 @click.pass_context
 def check(ctx, **kwargs):
     """
     Verify credentials for specified repositories.
     """
+    from icgcget.commands.access_checks import AccessCheckDispatcher
+    from icgcget.commands.download import DownloadDispatcher
     logger = logging.getLogger('__log__')
     logger.debug(str(ctx.params))
 
+    configure_clients(ctx)
     ids = kwargs['ids']
     repos = kwargs['repos']
 
@@ -359,6 +507,7 @@ def configure(config):
     """
     Start a series of prompts to configure icgc-get.
     """
+    from icgcget.commands.configure import ConfigureDispatcher
     default_dir = os.path.split(DEFAULT_CONFIG_FILE)[0]
     if config == DEFAULT_CONFIG_FILE and not os.path.exists(default_dir):
         os.umask(0000)
@@ -380,6 +529,7 @@ def version(ctx, ega_path, gdc_path, icgc_path, pdc_path):
     """
     Display versions for icgc-get and other download clients.
     """
+    from icgcget.commands.versions import versions_command
     logger = logging.getLogger('__log__')
     logger.debug(str(ctx.params))
     tag = get_container_tag(ctx)
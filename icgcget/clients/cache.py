@@ -0,0 +1,218 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import errno
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+
+import click
+
+DEFAULT_CACHE_DIR = os.getenv('ICGCGET_CACHE_DIR') or os.path.join(click.get_app_dir('icgc-get', force_posix=True),
+                                                                   'cache')
+METADATA_TTL = 3600
+METADATA_MAX_BYTES = 256 * 1024 * 1024
+CREDENTIAL_TTL = 900
+CREDENTIAL_MAX_BYTES = 1024 * 1024
+SECRET_PATH = os.path.join(DEFAULT_CACHE_DIR, 'secret')
+SECRET_BYTES = 32
+
+_SECRETS = {}
+
+
+def cache_key(*parts):
+    """
+    Builds a file name safe key out of any json serializable values
+    :param parts:
+    :return:
+    """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+
+def credential_key(*parts):
+    """
+    Builds a key for cached credential checks.  Only an hmac of the credential, keyed with the install secret, is kept,
+    never the credential itself.
+    :param parts:
+    :return:
+    """
+    return hmac.new(install_secret(), json.dumps(parts, sort_keys=True), hashlib.sha256).hexdigest()
+
+
+def install_secret(path=None):
+    """
+    Returns the random secret credential keys are derived from, creating it readable only by its owner on first use.
+    If the secret file cannot be read or written, a secret for this process alone is used.
+    :param path:
+    :return:
+    """
+    path = path or SECRET_PATH
+    if path not in _SECRETS:
+        _SECRETS[path] = read_secret(path) or create_secret(path) or read_secret(path) or os.urandom(SECRET_BYTES)
+    return _SECRETS[path]
+
+
+def read_secret(path):
+    try:
+        with open(path, 'rb') as secret_file:
+            secret = secret_file.read()
+    except IOError:
+        return None
+    return secret if len(secret) == SECRET_BYTES else None
+
+
+def create_secret(path):
+    """
+    Writes a new secret to a 0600 temporary file and links it into place, so concurrent runs agree on one secret.
+    :param path:
+    :return: the new secret, or None if another run created the secret first or the file could not be written
+    """
+    secret = os.urandom(SECRET_BYTES)
+    temp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0700)
+        secret_file = os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), 'wb')
+        with secret_file:
+            secret_file.write(secret)
+        os.link(temp_path, path)
+    except (IOError, OSError) as ex:
+        if ex.errno != errno.EEXIST:
+            logging.getLogger('__log__').debug('Unable to write cache secret %s: %s', path, ex.strerror)
+        return None
+    finally:
+        FileCache.remove(temp_path)
+    return secret
+
+
+class FileCache(object):
+    """
+    Directory of json documents that expire after a time to live.  The directory is kept under a size limit by evicting
+    the oldest entries.  A cache without a directory never stores anything.
+    """
+
+    def __init__(self, directory, ttl, max_bytes, refresh=False):
+        self.logger = logging.getLogger('__log__')
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns the cached value for a key, or None if it is missing, expired or unreadable.
+        :param key:
+        :return:
+        """
+        if not self.directory or self.refresh:
+            return None
+        path = os.path.join(self.directory, key + '.json')
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path) as cache_file:
+                return json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self, key, value):
+        """
+        Stores a value, replacing the previous entry atomically, and evicts entries if the cache is over its limit.
+        :param key:
+        :param value:
+        :return:
+        """
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, key + '.json')
+        temp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0700)
+            with open(temp_path, 'w') as cache_file:
+                json.dump(value, cache_file)
+            os.rename(temp_path, path)
+        except (IOError, OSError) as ex:
+            self.logger.debug('Unable to write cache entry %s: %s', path, ex.strerror)
+            return
+        self.evict()
+
+    def delete(self, key):
+        """
+        Removes the entry for a key, if there is one.
+        :param key:
+        :return:
+        """
+        if self.directory:
+            self.remove(os.path.join(self.directory, key + '.json'))
+
+    def fetch(self, key, func, *args):
+        """
+        Returns the cached value for a key, calling func with args and caching its return value on a miss.
+        :param key:
+        :param func:
+        :param args:
+        :return:
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = func(*args)
+        self.put(key, value)
+        return value
+
+    def evict(self):
+        """
+        Removes expired entries, then the least recently written entries until the cache fits in max_bytes.
+        :return:
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self.remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import hashlib
+import os
+from multiprocessing import cpu_count, Pool
+
+HASH_BUFFER = 8 * 1024 * 1024
+VERIFY_TIMEOUT = 24 * 3600  # upper bound on waiting for a check, keeps the wait interruptible
+
+
+def file_md5(path, buffer_size=HASH_BUFFER):
+    """
+    Computes the md5 of a file, reading it through a single large reusable buffer
+    :param path:
+    :param buffer_size:
+    :return: hex digest
+    """
+    md5 = hashlib.md5()
+    data = bytearray(buffer_size)
+    view = memoryview(data)
+    with open(path, 'rb') as data_file:
+        while True:
+            count = data_file.readinto(data)
+            if not count:
+                break
+            md5.update(view[:count])
+    return md5.hexdigest()
+
+
+def check_file(task):
+    """
+    Compares a file against its expected size and md5.  Runs in a worker process.
+    :param task: tuple of (key, path, md5, size); md5 and size may be None when not known
+    :return: tuple of key and a description of the problem, or None if the file is intact
+    """
+    key, path, md5, size = task
+    try:
+        actual_size = os.path.getsize(path)
+        if size is not None and actual_size != size:
+            return key, 'size is {0} bytes, expected {1}'.format(actual_size, size)
+        if md5 and file_md5(path) != md5.lower():
+            return key, 'md5 does not match {}'.format(md5)
+    except (IOError, OSError) as ex:
+        return key, ex.strerror
+    return key, None
+
+
+class Checks(object):
+    """
+    Checks queued by one download on the pool of a verifier it shares with others, so that it waits only on its own
+    files.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.pending = []
+
+    def submit(self, key, path, md5, size):
+        """
+        Queues a file to be checked
+        :param key: identifies the file in the results
+        :param path:
+        :param md5:
+        :param size:
+        :return:
+        """
+        self.pending.append(self.pool.apply_async(check_file, ((key, path, md5, size),)))
+
+    def failures(self):
+        """
+        Waits for all queued checks
+        :return: dict of key to problem for every file that failed
+        """
+        pending, self.pending = self.pending, []
+        failed = {}
+        for result in pending:
+            key, error = result.get(VERIFY_TIMEOUT)
+            if error:
+                failed[key] = error
+        return failed
+
+
+class Verifier(object):
+    """
+    Checks files against their expected md5 and size on a pool of processes, one per core by default, so hashing uses
+    every core and runs alongside transfers.  The pool forks when the verifier is made, so it should be made before
+    any threads are started.
+    """
+
+    def __init__(self, processes=None):
+        self.pool = Pool(processes or cpu_count())
+
+    def checks(self):
+        """
+        Starts a set of checks on the pool, for one download to queue its files in
+        :return: Checks
+        """
+        return Checks(self.pool)
+
+    def check_all(self, tasks):
+        """
+        Checks a list of files, largest first so that the pool stays busy until the end
+        :param tasks: list of (key, path, md5, size) tuples
+        :return: iterator of (key, problem) tuples in completion order
+        """
+        tasks = sorted(tasks, key=lambda task: task[3] or 0, reverse=True)
+        return self.pool.imap_unordered(check_file, tasks)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import logging
+import os
+import subprocess
+import threading
+
+_CONTAINERS = {}
+_LOCK = threading.Lock()
+PID_LABEL = 'icgc-get.pid'
+
+
+def docker_env():
+    env = dict(os.environ)
+    env['PATH'] = '/usr/local/bin:' + env['PATH']
+    return env
+
+
+def warm_container(image, mnt=None, docker_mnt='/icgc/mnt', uid=None):
+    """
+    Returns the id of a long running container for an image, mount and user, starting one on first use.  Client
+    commands are run inside it with docker exec, so container start up is paid once per session instead of per call.
+    Containers are labelled with the pid of the process that started them, so ones left by a crashed session can be
+    found and removed.
+    :param image:
+    :param mnt: host directory mounted at docker_mnt
+    :param docker_mnt:
+    :param uid: user the container runs as, or None for the image's default user
+    :return: container id, or None if the container could not be started
+    """
+    key = (image, mnt, uid)
+    with _LOCK:
+        if key not in _CONTAINERS:
+            args = ['docker', 'run', '-d', '--rm', '--label', '{0}={1}'.format(PID_LABEL, os.getpid()),
+                    '--entrypoint', 'tail']
+            if uid is not None:
+                args.append('-u={}'.format(uid))
+            if mnt:
+                args.extend(['-v', mnt + ':' + docker_mnt])
+            args.extend([image, '-f', '/dev/null'])
+            try:
+                container = subprocess.check_output(args, env=docker_env()).strip()
+            except (OSError, subprocess.CalledProcessError) as ex:
+                logging.getLogger('__log__').debug('Unable to start container for %s: %s', image, ex)
+                return None
+            _CONTAINERS[key] = container
+        return _CONTAINERS[key]
+
+
+def stale_containers():
+    """
+    Returns the ids of warm containers whose session process is no longer running
+    :return: list of container ids
+    """
+    import psutil  # only needed at exit in docker mode, kept out of startup otherwise
+    args = ['docker', 'ps', '-q', '-f', 'label=' + PID_LABEL, '--format', '{{.ID}} {{.Label "%s"}}' % PID_LABEL]
+    try:
+        listing = subprocess.check_output(args, env=docker_env())
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    container_ids = []
+    for line in listing.splitlines():
+        fields = line.split()
+        if len(fields) == 2 and fields[1].isdigit() and not psutil.pid_exists(int(fields[1])):
+            container_ids.append(fields[0])
+    return container_ids
+
+
+def remove_containers(container_ids):
+    """
+    Force removes containers, ignoring ones that are already gone
+    :param container_ids:
+    :return:
+    """
+    if container_ids:
+        devnull = open(os.devnull, 'w')
+        try:
+            subprocess.call(['docker', 'rm', '-f'] + container_ids, stdout=devnull, stderr=devnull, env=docker_env())
+        except OSError:
+            pass
+        finally:
+            devnull.close()
+
+
+def stop_containers():
+    """
+    Removes every container started by warm_container, along with warm containers left behind by sessions that have
+    exited without cleaning up.  Called at exit by the docker cleanup hook.
+    :return:
+    """
+    with _LOCK:
+        container_ids = _CONTAINERS.values()
+        _CONTAINERS.clear()
+    remove_containers(container_ids + stale_containers())
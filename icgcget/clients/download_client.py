@@ -19,7 +19,6 @@
 #
 import abc
 import logging
-import json
 import subprocess
 import tempfile
 import shutil
@@ -28,7 +27,9 @@ import re
 import subprocess32
 from time import sleep
 
-import click
+from icgcget.clients.containers import warm_container
+from icgcget.clients.state import get_state_writer, SessionIndex
+from icgcget.clients.utils import read_lines
 
 class DownloadClient(object):
     """
@@ -41,13 +42,17 @@ class DownloadClient(object):
 
         self.logger = logging.getLogger('__log__')
         self.jobs = []
-        self.session = {'subprocess': [], 'container': 0, 'command': ''}
+        self.session = {'subprocess': [], 'container': 0, 'containers': [], 'command': ''}
         self.path = json_path
+        self.state = get_state_writer(json_path)
+        self.index = None
         self.docker = docker
         self.repo = ''
         self.docker_uid = True
         self.docker_mnt = '/icgc/mnt'
         self.docker_version = 'icgc/icgc-get:' + container_version
+        self.container = None
+        self.on_file_complete = None  # called with repo and file id as each file is ready to be placed
         self.log_dir = log_dir
         if log_dir:
             self.cidfile = log_dir + '/cidfile'
@@ -121,13 +126,15 @@ class DownloadClient(object):
         """
         self.logger.info(output)
 
-    def _run_command(self, args, parser, env=None):
+    def _run_command(self, args, parser, env=None, finish=True):
         """
         Function controlling the calling and handling of subprocesses.  Creates, monitors and closes subprocesses,
         handles errors.
         :param args:
         :param parser:
         :param env:
+        :param finish: mark the running file finished when the command exits cleanly.  Disabled for commands run
+        alongside a download.
         :return:
         """
         self.logger.debug(args)
@@ -139,7 +146,6 @@ class DownloadClient(object):
         env['PATH'] = '/usr/local/bin:' + env['PATH']  # virtualenv compatibility.  Not strictly necessary
 
         try:
-            output = ''
             process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
             self.log_subprocess(process.pid)
         except subprocess.CalledProcessError as ex:
@@ -149,18 +155,11 @@ class DownloadClient(object):
             self.logger.warning('Path to download tool, %s, does not lead to expected application', args[0])
             return 2
 
-        while True:
-            char = process.stdout.read(1)
-            if process.poll() is not None:
-                break
-            if (char == '\n' or char == '\r') and output:  # Compatibility with storage client, other updating text
-                parser(output)
-                output = ''
-            else:
-                output += char
+        for line in read_lines(process.stdout):  # Reads until the client closes its output, so nothing is dropped
+            parser(line)
 
-        return_code = process.poll()
-        if return_code == 0:
+        return_code = process.wait()
+        if return_code == 0 and finish:
             self.session_update('', self.repo)  # clear any running files if exit cleanly
 
         if self.cidfile and os.path.isfile(self.cidfile):
@@ -219,15 +218,25 @@ class DownloadClient(object):
 
     def prepend_docker_args(self, args, mnt=None, envvars=None):
         """
-        Function that accepts client arguments and prepends them to run the command through a docker container
+        Function that accepts client arguments and prepends them to run the command through a docker container.
+        Commands are executed in a long running container shared by all clients with the same mount, falling back to a
+        new container per command if one can't be started.
         :param args:
         :param mnt:
         :param envvars: environmental variables
         :return:
         """
-        uid = os.getuid()
-        docker_args = ['docker', 'run', '-t', '--rm']
+        uid = os.getuid() if mnt and self.docker_uid else None
+        self.container = warm_container(self.docker_version, mnt, self.docker_mnt, uid)
         envvars = envvars or {}
+        if self.container:
+            docker_args = ['docker', 'exec', '-t']
+            for name, value in envvars.iteritems():
+                docker_args.extend(['-e', name + '=' + value])
+            docker_args.append(self.container)
+            return docker_args + args
+
+        docker_args = ['docker', 'run', '-t', '--rm']
         for name, value in envvars.iteritems():
             docker_args.extend(['-e', name + '=' + value])
 
@@ -235,7 +244,7 @@ class DownloadClient(object):
             docker_args.append('--cidfile={}'.format(self.cidfile))
 
         if mnt:
-            if self.docker_uid:
+            if uid is not None:
                 docker_args.extend(['-u={}'.format(uid), '-v', mnt + ':' + self.docker_mnt])
             else:
                 docker_args.extend(['-v', mnt + ':' + self.docker_mnt])
@@ -270,24 +279,66 @@ class DownloadClient(object):
         :return:
         """
         if 'file_data' in self.session:
-            for name, file_object in self.session['file_data'][repo].iteritems():
-                if file_object['index_filename'] == file_name or file_object['fileName'] == file_name or \
-                                file_object['fileUrl'] == file_name:
-                    file_object['state'] = 'Running'
-                    self.session['file_data'][repo][name] = file_object
-                elif file_object['state'] == 'Running':  # only one file at a time can be downloaded.
-                    file_object['state'] = 'Finished'
-                    self.session['file_data'][repo][name] = file_object
-            json.dump(self.session, open(self.path, 'w', 0777))
+            for file_id in self.session_index().update(file_name, repo):
+                self.file_finished(repo, file_id)
+            self.state.update(self.session)
+
+    def session_finished(self, file_name, repo):
+        """
+        Updates state file when a client reports that one of several concurrently transferred files has completed
+        :param file_name:
+        :param repo:
+        :return:
+        """
+        if 'file_data' in self.session:
+            for file_id in self.session_index().finish(file_name, repo):
+                self.file_finished(repo, file_id)
+            self.state.update(self.session)
+
+    def file_finished(self, repo, file_id):
+        """
+        Called once the client has finished transferring a file.  Lets subclasses start work on each file as soon as it
+        arrives instead of waiting for the client to exit.  By default the file is complete as soon as it arrives.
+        :param repo:
+        :param file_id:
+        :return:
+        """
+        self.file_complete(repo, file_id)
+
+    def file_complete(self, repo, file_id):
+        """
+        Hands a file that is ready to be placed in the output directory to the on_file_complete hook.  The file is
+        marked Downloaded until the hook has put it in place.
+        :param repo:
+        :param file_id:
+        :return:
+        """
+        if self.on_file_complete:
+            self.session['file_data'][repo][file_id]['state'] = 'Downloaded'
+            self.on_file_complete(repo, file_id)
+
+    def session_index(self):
+        """
+        Returns the name index of the current session, rebuilding it if the dispatcher has replaced the session
+        :return:
+        """
+        if self.index is None or self.index.session is not self.session:
+            self.index = SessionIndex(self.session)
+        return self.index
 
     def log_subprocess(self, pid):
         """
-        Logs container id from cidfile and pid from subprocess variable to download session
+        Logs pid from subprocess variable to download session, along with the warm container the command runs in or
+        the container id from cidfile
         :param pid:
         :return:
         """
         self.session['subprocess'].append(pid)
-        if self.docker and self.cidfile:
+        if self.docker and self.container:
+            containers = self.session.setdefault('containers', [])
+            if self.container not in containers:
+                containers.append(self.container)
+        elif self.docker and self.cidfile:
             count = 0
             cidfile = None
             while count < 5:
@@ -299,4 +350,4 @@ class DownloadClient(object):
                     count += 1
             if cidfile:
                 self.session['container'] = cidfile.readline()
-        json.dump(self.session, open(self.path, 'w+', 0777))
+        self.state.write(self.session)  # written immediately so the subprocess can be cleaned up after a crash
@@ -18,19 +18,27 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
-import fnmatch
+import hmac
 import os
 import re
 from copy import copy
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 from random import SystemRandom
 from string import ascii_uppercase, digits
 from urllib import quote
-from requests import HTTPError
 
+from icgcget.clients.cache import FileCache, credential_key, CREDENTIAL_TTL, CREDENTIAL_MAX_BYTES
+from icgcget.clients.errors import ApiError
 from icgcget.clients.utils  import client_style
 from icgcget.clients.download_client import DownloadClient
 from icgcget.clients.portal_client import call_api
 
+EGA_API_URL = 'https://ega.ebi.ac.uk/ega/rest/access/v2/'
+REQUEST_BATCH = 50  # objects registered per client invocation
+REQUEST_TTL = 7 * 24 * 3600
+DECRYPT_TIMEOUT = 24 * 3600  # upper bound on waiting for decryption, keeps the wait interruptible
+
 
 class EgaDownloadClient(DownloadClient):
     """
@@ -42,11 +50,20 @@ class EgaDownloadClient(DownloadClient):
         self.verify = verify
         self.label = ''
         self.skip = False
+        self.credential_cache = FileCache(None, CREDENTIAL_TTL, CREDENTIAL_MAX_BYTES)
+        self.request_cache = FileCache(None, REQUEST_TTL, CREDENTIAL_MAX_BYTES)
+        self.request_batch = REQUEST_BATCH
+        self.request_keys = {}
+        self.decryption = None
+        self.deferred = False
+        self.decrypting = {}
 
     def download(self, object_ids, access, tool_path, staging, parallel, udt=None, file_from=None, repo=None,
                  secret_key=None, password=None):
         """
-        Inherited method.  Makes four subprocess calls to request, download and decrypt data from the EGA repository
+        Inherited method.  Makes subprocess calls to request, download and decrypt data from the EGA repository.
+        Objects are requested in batches, and requests made by a previous run are reused from the request cache.  Only
+        request labels are cached; re-encryption keys are kept in memory for the life of the client.
         :param object_ids:
         :param access:
         :param tool_path:
@@ -59,14 +76,26 @@ class EgaDownloadClient(DownloadClient):
         :param secret_key:
         :return:
         """
-        key = ''.join(SystemRandom().choice(ascii_uppercase + digits) for _ in range(4))
         self.label = object_ids[0] + '_download_request'
+        self.skip = False
         args = ['java', '-jar', tool_path, '-p', access, password, '-nt', parallel]
         if self.docker:
             args = self.prepend_docker_args(args, staging)
             file_dir = self.docker_mnt
         else:
             file_dir = staging
+        request_key = credential_key('ega-request', access, self.label, sorted(object_ids))
+        key = self.request_keys.get(request_key)
+        if key is None:
+            key = ''.join(SystemRandom().choice(ascii_uppercase + digits) for _ in range(4))
+        if self.request_cache.get(request_key):
+            self.logger.debug('Reusing download request %s', self.label)
+            rc_download, rc_decrypt = self.download_and_decrypt(args, staging, file_dir, udt, key, object_ids)
+            if rc_download == 0:
+                return rc_decrypt
+            self.logger.info('Download request %s could not be reused, requesting files again', self.label)
+            self.request_cache.delete(request_key)
+
         # Get a list of outstanding requests, to see if the current request has already been made
         request_list_args = copy(args)
         request_list_args.append('-lr')
@@ -75,40 +104,152 @@ class EgaDownloadClient(DownloadClient):
             return code
         # If the request hasn't already been made, make a download request
         if not self.skip:
-            for object_id in object_ids:
-                request_call_args = copy(args)
-                if object_id[3] == 'D':
-                    request_call_args.append('-rfd')
-                else:
-                    request_call_args.append('-rf')
-                request_call_args.extend([object_id, '-re', key, '-label', self.label])
-                rc_request = self._run_command(request_call_args, self.download_parser)
-                if rc_request != 0:
-                    return rc_request
+            rc_request = self.request_files(args, object_ids, key)
+            if rc_request != 0:
+                return rc_request
+            self.request_keys[request_key] = key
+            self.request_cache.put(request_key, {'label': self.label})
         # Now that request exists in some form, download the files
+        rc_download, rc_decrypt = self.download_and_decrypt(args, staging, file_dir, udt, key, object_ids)
+        if rc_download != 0:
+            return rc_download
+        return rc_decrypt
+
+    def request_files(self, args, object_ids, key):
+        """
+        Adds objects to the download request, several objects per client invocation.  A batch the client rejects is
+        requested again one object at a time.
+        :param args:
+        :param object_ids:
+        :param key:
+        :return:
+        """
+        for i in xrange(0, len(object_ids), self.request_batch):
+            batch = object_ids[i:i + self.request_batch]
+            rc_request = self._run_command(self.request_args(args, batch, key), self.download_parser)
+            if rc_request != 0 and len(batch) > 1:
+                self.logger.debug('Batch request failed, requesting %s objects individually', len(batch))
+                for object_id in batch:
+                    rc_request = self._run_command(self.request_args(args, [object_id], key), self.download_parser)
+                    if rc_request != 0:
+                        return rc_request
+            elif rc_request != 0:
+                return rc_request
+        return 0
+
+    def request_args(self, args, object_ids, key):
+        """
+        Builds the arguments of a request call for a list of file and dataset ids
+        :param args:
+        :param object_ids:
+        :param key:
+        :return:
+        """
+        request_call_args = copy(args)
+        for object_id in object_ids:
+            if object_id[3] == 'D':
+                request_call_args.extend(['-rfd', object_id])
+            else:
+                request_call_args.extend(['-rf', object_id])
+        request_call_args.extend(['-re', key, '-label', self.label])
+        return request_call_args
+
+    def download_request(self, args, file_dir, udt):
+        """
+        Downloads the files of the current request label
+        :param args:
+        :param file_dir:
+        :param udt:
+        :return:
+        """
         download_call_args = copy(args)
         download_call_args.extend(['-dr', self.label, '-path', file_dir])
         if udt:
             download_call_args.append('-udt')
-        rc_download = self._run_command(download_call_args, self.download_parser)
-        if rc_download != 0:
-            return rc_download
-        # Decrypt downloaded files
+        return self._run_command(download_call_args, self.download_parser)
+
+    def download_and_decrypt(self, args, staging, file_dir, udt, key, object_ids):
+        """
+        Downloads the files of the current request, decrypting each file as soon as the client reports it complete.
+        Decryptions run in their own client processes, up to one per core, while the download continues.  Encrypted
+        files of the request the client did not report, including files downloaded by an earlier run, are decrypted
+        once the download ends.  Containers started per command share a cidfile, so without a long running container
+        decryptions wait for the download and run one at a time.
+        :param args:
+        :param staging: download directory on the host
+        :param file_dir: download directory as seen by the client
+        :param udt:
+        :param key:
+        :param object_ids: ids of the files in the request
+        :return: tuple of download and decryption return codes
+        """
+        concurrent = not self.docker or self.container
+        pool = ThreadPool(cpu_count() if concurrent else 1)
+        self.decrypting = {}
+        self.decryption = (pool, args, staging, file_dir, key)
+        self.deferred = not concurrent
+        try:
+            rc_download = self.download_request(args, file_dir, udt)
+            self.deferred = False
+            if rc_download == 0:
+                requested = set(object_ids)
+                for file_id, file_object in self.session['file_data'].get(self.repo, {}).iteritems():
+                    if file_object['uuid'] in requested and file_object.get('fileName') not in (None, 'None'):
+                        self.decrypt_file(file_object['fileName'] + '.cip', file_id)
+            pool.close()
+            codes = [result.get(DECRYPT_TIMEOUT) for result in self.decrypting.values()]
+        finally:
+            self.decryption = None
+            self.deferred = False
+            pool.terminate()
+        return rc_download, next((code for code in codes if code != 0), 0)
+
+    def decrypt_file(self, cip_file, file_id=None):
+        """
+        Starts decryption of a downloaded file, unless it has already been started or decryptions are deferred until
+        the download ends.  Files of the session are complete once decrypted.
+        :param cip_file: name of the encrypted file in the download directory
+        :param file_id: id of the file in the session, if known
+        :return:
+        """
+        pool, args, staging, file_dir, key = self.decryption
+        if self.deferred or cip_file in self.decrypting or not os.path.isfile(staging + '/' + cip_file):
+            return
         decrypt_call_args = copy(args)
-        decrypt_call_args.append('-dc')
-        for cip_file in os.listdir(file_dir):  # File names cannot be dynamically predicted from dataset names
-            if fnmatch.fnmatch(cip_file, '*.cip'):  # Tool attempts to decrypt all encrypted files in download directory
-                decrypt_call_args.append(file_dir + '/' + cip_file)
-        decrypt_call_args.extend(['-dck', key])
-        rc_decrypt = self._run_command(decrypt_call_args, self.download_parser)
-        if rc_decrypt != 0:
-            return rc_decrypt
-        return 0
+        decrypt_call_args.extend(['-dc', file_dir + '/' + cip_file, '-dck', key])
+        self.decrypting[cip_file] = pool.apply_async(self._run_command, (decrypt_call_args, self.decrypt_parser),
+                                                     {'finish': False}, self.decrypted(file_id))
+
+    def decrypted(self, file_id):
+        """
+        Returns the callback run when the decryption of a file exits
+        :param file_id:
+        :return:
+        """
+        def callback(code):
+            if code == 0 and file_id is not None:
+                self.file_complete(self.repo, file_id)
+        return callback
+
+    def file_finished(self, repo, file_id):
+        """
+        Starts decrypting a file as soon as its download completes
+        :param repo:
+        :param file_id:
+        :return:
+        """
+        if self.decryption and repo == self.repo:
+            file_object = self.session['file_data'][repo][file_id]
+            if self.on_file_complete:
+                file_object['state'] = 'Downloaded'
+            if file_object.get('fileName') not in (None, 'None'):
+                self.decrypt_file(file_object['fileName'] + '.cip', file_id)
 
     def access_check(self, access, uuids=None, path=None, repo=None, output=None, api_url=None, password=None,
                      secret_key=None):
         """
-        Calls ega api once to log in and a second time to verify access
+        Calls ega api once to log in and a second time to verify access.  The datasets of a successful login are cached
+        for a short time under the user name, with an hmac of the password that later checks must match.
         :param access:
         :param uuids:
         :param path:
@@ -119,24 +260,40 @@ class EgaDownloadClient(DownloadClient):
         :param secret_key:
         :return:
         """
-        base_url = 'https://ega.ebi.ac.uk/ega/rest/access/v2/'
+        key = credential_key('ega', EGA_API_URL, access)
+        password_key = credential_key('ega-password', EGA_API_URL, access, password)
+        login = self.credential_cache.get(key)
+        if login is None or not hmac.compare_digest(str(login.get('password', '')), str(password_key)):
+            login = self.ega_login(access, password)
+            if login is None:
+                return False
+            login['password'] = password_key
+            self.credential_cache.put(key, login)
+        data_sets = login['datasets']
+        if 'EGAD00001000023' in data_sets and 'EGAD00010000562' in data_sets:
+            return True
+        return False
 
-        login_request = base_url + 'users/' + quote(access) + '?pass=' + quote(password)
+    def ega_login(self, access, password):
+        """
+        Logs in to the ega api and lists the datasets available to the session
+        :param access:
+        :param password:
+        :return: dict of datasets, or None if the login was refused
+        """
+        login_request = EGA_API_URL + 'users/' + quote(access) + '?pass=' + quote(password)
         try:
             resp = call_api(login_request, verify=self.verify)
-        except HTTPError:  # invalid return code
-            return False
-        if resp['header']['userMessage'] == 'OK':
+            if resp['header']['userMessage'] != 'OK':
+                return None
             session_id = resp['response']['result'][1]
-            dataset_request = base_url + 'datasets?session=' + session_id
-            try:
-                dataset_response = call_api(dataset_request, verify=self.verify)
-                data_sets = dataset_response['response']['result']
-            except HTTPError:
-                return False
-            if 'EGAD00001000023' in data_sets and 'EGAD00010000562' in data_sets:
-                return True
-        return False
+            dataset_request = EGA_API_URL + 'datasets?session=' + session_id
+            dataset_response = call_api(dataset_request, verify=self.verify)
+        except ApiError as ex:
+            if ex.code:  # invalid return code
+                return None
+            raise
+        return {'datasets': dataset_response['response']['result']}
 
     def print_version(self, path):
         """
@@ -170,6 +327,14 @@ class EgaDownloadClient(DownloadClient):
             self.session_update(filename, 'ega')
         self.logger.info(client_style(response.strip()))
 
+    def decrypt_parser(self, response):
+        """
+        Parser that outputs decryption client response to user
+        :param response:
+        :return:
+        """
+        self.logger.info(client_style(response.strip()))
+
     def requests_parser(self, response):
         """
         Parser that attempts to identify if a request for a given file has already been made based on request command
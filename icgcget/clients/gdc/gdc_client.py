@@ -22,11 +22,17 @@ import re
 import os
 import click
 import shutil
+from multiprocessing.pool import ThreadPool
 from icgcget.clients.utils import client_style
 from icgcget.clients.errors import ApiError
 from icgcget.clients.download_client import DownloadClient
 from icgcget.clients.portal_client import call_api
 
+DATA_URL = 'https://gdc-api.nci.nih.gov/data/'
+ACCESS_BATCH_SIZE = 100  # uuids per HEAD request, keeps request urls well under server limits
+ACCESS_WORKERS = 4
+ACCESS_TIMEOUT = 600
+
 
 class GdcDownloadClient(DownloadClient):
     """
@@ -36,6 +42,7 @@ class GdcDownloadClient(DownloadClient):
         super(GdcDownloadClient, self).__init__(json_path, log_dir, docker, container_version=container_version)
         self.repo = 'gdc'
         self.verify = verify
+        self.data_url = DATA_URL
 
     def download(self, uuids, access, tool_path, staging, processes, udt=None, file_from=None, repo=None,
                  password=None, secret_key=None):
@@ -95,17 +102,49 @@ class GdcDownloadClient(DownloadClient):
         :param secret_key:
         :return:
         """
-        base_url = 'https://gdc-api.nci.nih.gov/data/'
-        request = base_url + ','.join(uuids)
+        return not self.forbidden_uuids(access, uuids)
+
+    def forbidden_uuids(self, access, uuids, batch_size=ACCESS_BATCH_SIZE):
+        """
+        Finds the uuids a credential cannot download.  uuids are checked in batches of head requests made concurrently,
+        and forbidden batches are split until the forbidden files are found.
+        :param access:
+        :param uuids:
+        :param batch_size:
+        :return: list of forbidden uuids, in the order given
+        """
+        batches = [(access, uuids[i:i + batch_size]) for i in xrange(0, len(uuids), batch_size)]
+        if len(batches) > 1:
+            pool = ThreadPool(min(ACCESS_WORKERS, len(batches)))
+            try:
+                results = pool.map_async(self.forbidden_batch, batches).get(ACCESS_TIMEOUT)
+            finally:
+                pool.terminate()
+        else:
+            results = [self.forbidden_batch(batch) for batch in batches]
+        forbidden = []
+        for result in results:
+            forbidden.extend(result)
+        return forbidden
+
+    def forbidden_batch(self, batch):
+        """
+        Checks access to a batch of uuids with one head request, bisecting the batch if access is forbidden
+        :param batch: tuple of (access, uuids)
+        :return: list of forbidden uuids
+        """
+        access, uuids = batch
         header = {'X-Auth-Token': access, 'Content-Type': 'application/json'}
         try:
-            call_api(request, header, head=True, verify=self.verify)
-            return True
+            call_api(self.data_url + ','.join(uuids), header, head=True, verify=self.verify)
+            return []
         except ApiError as ex:
-            if ex.code == 403:
-                return False
-            else:
+            if ex.code != 403:
                 raise ex
+        if len(uuids) == 1:
+            return uuids
+        middle = len(uuids) // 2
+        return self.forbidden_batch((access, uuids[:middle])) + self.forbidden_batch((access, uuids[middle:]))
 
     def print_version(self, path):
         """
@@ -134,6 +173,6 @@ class GdcDownloadClient(DownloadClient):
         """
         file_id = re.findall(r'v------ \w{8}-\w{4}-\w{4}-\w{4}-\w{12} ------v', response)
         if file_id:
-            file_id = file_id[8:-8]
+            file_id = file_id[0][8:-8]
             self.session_update(file_id, 'gdc')
         self.logger.info(client_style(response.strip()))
@@ -22,6 +22,7 @@ import os
 import re
 import shutil
 import fileinput
+from icgcget.clients.cache import FileCache, credential_key, CREDENTIAL_TTL, CREDENTIAL_MAX_BYTES
 from icgcget.clients.utils import client_style
 from icgcget.clients.download_client import DownloadClient
 from icgcget.clients.portal_client import call_api
@@ -36,6 +37,7 @@ class StorageClient(DownloadClient):
     def __init__(self, json_path=None, docker=False, verify=True, log_dir=None, container_version=''):
         super(StorageClient, self).__init__(json_path, log_dir, docker, container_version=container_version)
         self.verify = verify
+        self.credential_cache = FileCache(None, CREDENTIAL_TTL, CREDENTIAL_MAX_BYTES)
 
     def download(self, uuids, access, tool_path, staging, processes, udt=None, file_from=None, repo=None,
                  password=None, secret_key=None):
@@ -91,7 +93,8 @@ class StorageClient(DownloadClient):
     def access_check(self, access, uuids=None, path=None, repo=None, output=None, api_url=None, password=None,
                      secret_key=None):
         """
-        Function that calls the icgc api to determine the access of a given access token
+        Function that calls the icgc api to determine the access of a given access token.  Scopes of valid tokens are
+        cached for a short time.
         :param access:
         :param uuids:
         :param path:
@@ -102,15 +105,20 @@ class StorageClient(DownloadClient):
         :param secret_key:
         :return:
         """
-        request = api_url + 'settings/tokens/' + access
-        try:
-            resp = call_api(request, verify=self.verify)
-        except ApiError as ex:
-            if ex.code == 400:
-                return False
-            raise ApiError(ex.request_string, ex.message, ex.code)
+        key = credential_key('icgc', api_url, access)
+        scope = self.credential_cache.get(key)
+        if scope is None:
+            request = api_url + 'settings/tokens/' + access
+            try:
+                resp = call_api(request, verify=self.verify)
+            except ApiError as ex:
+                if ex.code == 400:
+                    return False
+                raise ApiError(ex.request_string, ex.message, ex.code)
+            scope = resp['scope']
+            self.credential_cache.put(key, scope)
         match = repo + '.download'
-        return match in resp['scope']
+        return match in scope
 
     def print_version(self, path):
         """
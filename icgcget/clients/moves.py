@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import ctypes
+import ctypes.util
+import errno
+import os
+import shutil
+import threading
+
+MOVES = {'workers': 4, 'fsync': 'file'}  # fsync is one of none, file or always (files and their directory)
+_LOCK = threading.Lock()
+
+COPY_CHUNK = 64 * 1024 * 1024  # bytes handed to the kernel per copy call
+BUFFER_SIZE = 8 * 1024 * 1024  # buffer of the userspace fallback copy
+_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)
+
+
+def _libc_function(name, argtypes):
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        function = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    function.argtypes = argtypes
+    function.restype = ctypes.c_ssize_t
+    return function
+
+# Python 2 has neither os.sendfile nor os.copy_file_range, so the libc calls are used directly where available
+_COPY_FILE_RANGE = _libc_function('copy_file_range', [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p,
+                                                      ctypes.c_size_t, ctypes.c_uint])
+_SENDFILE = _libc_function('sendfile', [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t])
+
+
+def configure_moves(settings):
+    """
+    Overrides the move defaults with values from the move section of config.yaml
+    :param settings: dict with any of workers and fsync
+    :return:
+    """
+    if not settings:
+        return
+    with _LOCK:
+        for key in MOVES:
+            if settings.get(key) is not None:
+                MOVES[key] = settings[key]
+
+
+def move_path(source, destination, fsync=None):
+    """
+    Moves a file or directory.  Within a filesystem this is a rename.  Across filesystems the data is copied by the
+    kernel to a temporary name next to the destination, optionally synced, and renamed into place, so the destination
+    only ever appears complete.  The source is removed once the destination is in place.
+    :param source:
+    :param destination: full destination path, which must not exist
+    :param fsync: none, file or always; defaults to the configured policy
+    :return:
+    """
+    fsync = fsync or MOVES['fsync']
+    try:
+        os.rename(source, destination)
+        return
+    except OSError as ex:
+        if ex.errno != errno.EXDEV:
+            raise
+    directory, name = os.path.split(destination)
+    temp_path = os.path.join(directory, '.{0}.{1}.part'.format(name, os.getpid()))
+    try:
+        copy_path(source, temp_path, fsync)
+        os.rename(temp_path, destination)
+    except (IOError, OSError):
+        remove_path(temp_path)
+        raise
+    if fsync == 'always':
+        sync_directory(directory)
+    remove_path(source)
+
+
+def copy_path(source, destination, fsync='none'):
+    """
+    Copies a file, symbolic link or directory tree, preserving modes and times
+    :param source:
+    :param destination:
+    :param fsync: file or always to sync each file before returning
+    :return:
+    """
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), destination)
+    elif os.path.isdir(source):
+        os.mkdir(destination)
+        for child in os.listdir(source):
+            copy_path(os.path.join(source, child), os.path.join(destination, child), fsync)
+        shutil.copystat(source, destination)
+    else:
+        source_fd = os.open(source, os.O_RDONLY)
+        try:
+            destination_fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600)
+            try:
+                copy_data(source_fd, destination_fd)
+                if fsync in ('file', 'always'):
+                    os.fsync(destination_fd)
+            finally:
+                os.close(destination_fd)
+        finally:
+            os.close(source_fd)
+        shutil.copystat(source, destination)
+
+
+def copy_data(source_fd, destination_fd):
+    """
+    Copies the rest of one file descriptor to another, inside the kernel where possible.  copy_file_range is tried
+    first, then sendfile, then a large-buffer userspace copy.
+    :param source_fd:
+    :param destination_fd:
+    :return:
+    """
+    if _COPY_FILE_RANGE and _kernel_copy(lambda: _COPY_FILE_RANGE(source_fd, None, destination_fd, None,
+                                                                 COPY_CHUNK, 0)):
+        return
+    if _SENDFILE and _kernel_copy(lambda: _SENDFILE(destination_fd, source_fd, None, COPY_CHUNK)):
+        return
+    data = bytearray(BUFFER_SIZE)
+    view = memoryview(data)
+    source = os.fdopen(os.dup(source_fd), 'rb', 0)
+    try:
+        while True:
+            count = source.readinto(data)
+            if not count:
+                return
+            written = 0
+            while written < count:
+                written += os.write(destination_fd, view[written:count])
+    finally:
+        source.close()
+
+
+def _kernel_copy(copy_call):
+    """
+    Repeats a kernel copy call until end of file
+    :param copy_call: function returning the number of bytes copied, 0 at end of file or -1 on error
+    :return: False if the call is not supported for these files and nothing was copied, True once done
+    """
+    copied = 0
+    while True:
+        count = copy_call()
+        if count == 0:
+            return True
+        if count < 0:
+            error = ctypes.get_errno()
+            if error == errno.EINTR:
+                continue
+            if copied == 0 and error in _UNSUPPORTED:
+                return False
+            raise OSError(error, os.strerror(error))
+        copied += count
+
+
+def sync_directory(directory):
+    directory_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+def remove_path(path):
+    """
+    Removes a file, link or directory tree if it exists
+    :param path:
+    :return:
+    """
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except OSError:
+        pass
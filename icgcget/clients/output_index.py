@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import json
+import logging
+import os
+import stat
+import time
+
+from icgcget.clients.cache import cache_key, DEFAULT_CACHE_DIR
+
+MTIME_GRANULARITY = 2  # seconds, the coarsest directory modification time kept by a supported filesystem
+
+
+def get_output_index(output):
+    """
+    Returns an up to date index of an output directory, reusing the index saved by the previous command on the same
+    directory where directory modification times show nothing has changed.
+    :param output:
+    :return:
+    """
+    if not output:
+        return OutputIndex(None)
+    cache_path = os.path.join(DEFAULT_CACHE_DIR, 'outputs', cache_key(os.path.abspath(output)) + '.json')
+    return OutputIndex(output, cache_path)
+
+
+class OutputIndex(object):
+    """
+    Index of every file and directory name below an output directory, built in one pass so that checking whether a
+    file has already been downloaded is a set lookup instead of a walk of the whole tree.  Each directory's listing is
+    stored with its modification time, so a refresh only lists directories that had entries added, removed or renamed.
+    A listing made within the modification time granularity of the directory's last change could miss a change made
+    in the same tick, so it is not trusted and the directory is listed again.  Sizes and modification times of files
+    are only as fresh as the listing of the directory they are in.
+    """
+
+    def __init__(self, output, cache_path=None):
+        self.logger = logging.getLogger('__log__')
+        self.output = output
+        self.cache_path = cache_path
+        self.directories = {}
+        self.names = {}
+        if output:
+            self.directories = self.load()
+            self.refresh()
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def path(self, name):
+        """
+        Returns the absolute path of the first file or directory found with a name, or None
+        :param name:
+        :return:
+        """
+        if name not in self.names:
+            return None
+        return os.path.join(self.output, self.names[name])
+
+    def stat(self, name):
+        """
+        Returns the [size, mtime] pair recorded for a file, or None for directories and missing names
+        :param name:
+        :return:
+        """
+        if name not in self.names:
+            return None
+        directory, base = os.path.split(self.names[name])
+        return self.directories[directory]['files'].get(base)
+
+    def refresh(self):
+        """
+        Brings the index up to date with the output directory and saves it.
+        :return:
+        """
+        previous = self.directories
+        self.directories = {}
+        self.names = {}
+        listed = 0
+        pending = ['']
+        while pending:
+            relative = pending.pop()
+            absolute = os.path.join(self.output, relative)
+            try:
+                mtime = os.stat(absolute).st_mtime
+            except OSError:
+                continue
+            entry = previous.get(relative)
+            if not entry or entry['mtime'] != mtime or entry.get('listed', 0) - mtime <= MTIME_GRANULARITY:
+                entry = self.list_directory(absolute, mtime)
+                listed += 1
+            self.directories[relative] = entry
+            for name in entry['files']:
+                self.names.setdefault(name, os.path.join(relative, name))
+            for name in entry['dirs']:
+                self.names.setdefault(name, os.path.join(relative, name))
+                pending.append(os.path.join(relative, name))
+        self.logger.debug('Indexed %s: %s of %s directories listed', self.output, listed, len(self.directories))
+        self.save()
+
+    @staticmethod
+    def list_directory(absolute, mtime):
+        entry = {'mtime': mtime, 'listed': time.time(), 'files': {}, 'dirs': []}
+        try:
+            names = os.listdir(absolute)
+        except OSError:
+            return entry
+        for name in names:
+            try:
+                info = os.lstat(os.path.join(absolute, name))
+            except OSError:
+                continue
+            if stat.S_ISDIR(info.st_mode):  # symbolic links are indexed by name but never followed
+                entry['dirs'].append(name)
+            else:
+                entry['files'][name] = [info.st_size, info.st_mtime]
+        return entry
+
+    def load(self):
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path) as cache_file:
+                saved = json.load(cache_file)
+            if saved['output'] == os.path.abspath(self.output):
+                return saved['directories']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def save(self):
+        if not self.cache_path:
+            return
+        temp_path = '{0}.{1}.tmp'.format(self.cache_path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(self.cache_path)):
+                os.makedirs(os.path.dirname(self.cache_path), 0700)
+            with open(temp_path, 'w') as cache_file:
+                json.dump({'output': os.path.abspath(self.output), 'directories': self.directories}, cache_file)
+            os.rename(temp_path, self.cache_path)
+        except (IOError, OSError) as ex:
+            self.logger.debug('Unable to save index of %s: %s', self.output, ex.strerror)
@@ -20,6 +20,8 @@
 
 import os
 import re
+import tempfile
+from collections import OrderedDict
 from icgcget.clients.utils import client_style
 from icgcget.clients.errors import SubprocessError
 from icgcget.clients.download_client import DownloadClient
@@ -53,22 +55,72 @@ class PdcDownloadClient(DownloadClient):
         """
         code = 0
         env_dict = dict(os.environ)
+        aws_config = self.transfer_config(staging, processes)
+        try:
+            for prefix, names in self.group_paths(data_paths).iteritems():
+                call_args = [tool_path, 's3', self.url, 'cp', prefix]
+                if self.docker:
+                    call_args.extend([self.docker_mnt + '/'])
+                    envvars = {'AWS_ACCESS_KEY_ID': key, 'AWS_SECRET_ACCESS_KEY': secret_key,
+                               'AWS_CONFIG_FILE': self.docker_mnt + '/' + os.path.basename(aws_config.name)}
+                else:
+                    env_dict['AWS_ACCESS_KEY_ID'] = key
+                    env_dict['AWS_SECRET_ACCESS_KEY'] = secret_key
+                    env_dict['AWS_CONFIG_FILE'] = aws_config.name
+                    call_args.extend([staging + '/'])
+                if names is not None:
+                    call_args.extend(['--recursive', '--exclude', '*'])
+                    for name in names:
+                        call_args.extend(['--include', self.escape_pattern(name)])
+                if self.docker:
+                    call_args = self.prepend_docker_args(call_args, staging, envvars)
+                code = self._run_command(call_args, self.download_parser, env=env_dict)
+                if code != 0:
+                    return code
+        finally:
+            aws_config.close()
+        return code
 
+    @staticmethod
+    def group_paths(data_paths):
+        """
+        Groups s3 data paths by bucket and prefix so that each group can be copied by one recursive aws-cli call.
+        Objects directly under a bucket are copied on their own, as a recursive copy would list the whole bucket.
+        :param data_paths:
+        :return: ordered dict of prefix to list of object names under that prefix, or of data path to None for objects
+        copied on their own
+        """
+        groups = OrderedDict()
         for data_path in data_paths:
-            call_args = [tool_path, 's3', self.url, 'cp', data_path]
-            if self.docker:
-                call_args.extend([self.docker_mnt + '/'])
-                envvars = {'AWS_ACCESS_KEY_ID': key, 'AWS_SECRET_ACCESS_KEY': secret_key}
-                call_args = self.prepend_docker_args(call_args, staging, envvars)
+            prefix, name = data_path.rsplit('/', 1)
+            if prefix.count('/') < 3:  # s3://bucket
+                groups[data_path] = None
             else:
-                env_dict['AWS_ACCESS_KEY_ID'] = key
-                env_dict['AWS_SECRET_ACCESS_KEY'] = secret_key
-                call_args.extend([staging + '/'])
-            code = self._run_command(call_args, self.download_parser, env=env_dict)
-            if code != 0:
-                return code
-            self.session_update(data_path, 'pdc')
-        return code
+                groups.setdefault(prefix + '/', []).append(name)
+        return groups
+
+    @staticmethod
+    def escape_pattern(name):
+        """
+        Escapes the wildcard characters of an object name so that an aws-cli filter matches only that name
+        :param name:
+        :return:
+        """
+        return re.sub(r'([*?[])', r'[\1]', name)
+
+    @staticmethod
+    def transfer_config(staging, processes):
+        """
+        Writes a temporary aws-cli configuration file setting the number of concurrent s3 transfers.  The file is
+        removed when closed.
+        :param staging:
+        :param processes:
+        :return:
+        """
+        aws_config = tempfile.NamedTemporaryFile(dir=staging, prefix='.aws-config-')
+        aws_config.write('[default]\ns3 =\n    max_concurrent_requests = {}\n'.format(processes))
+        aws_config.flush()
+        return aws_config
 
     def access_check(self, key, data_paths=None, path=None, repo=None, output=None, api_url=None, password=None,
                      secret_key=None):
@@ -116,13 +168,34 @@ class PdcDownloadClient(DownloadClient):
 
     def download_parser(self, output):
         """
-        Due to limited output of aws-cli, this parser does not track which file is being downloaded.
-         Just outputs client response.
+        Marks each file as finished when aws-cli reports its transfer complete, and outputs client response.
+        aws-cli does not report which files are in progress.
         :param output:
         :return:
         """
+        completed = self.completed_path(output)
+        if completed:
+            self.session_finished(completed, 'pdc')
         self.logger.info(client_style(output.strip()))
 
+    @staticmethod
+    def completed_path(output):
+        """
+        Returns the s3 path of a transfer aws-cli reports complete.  Keys and local paths can both contain spaces, so
+        the report is split at the ' to ' where the object and the local file have the same name.
+        :param output:
+        :return:
+        """
+        start = output.find('download: s3://')
+        if start < 0:
+            return None
+        transfer = output[start + len('download: '):].rstrip('\r\n')
+        splits = [match.start() for match in re.finditer(' to ', transfer)]
+        for split in splits:
+            if os.path.basename(transfer[:split]) == os.path.basename(transfer[split + 4:]):
+                return transfer[:split]
+        return transfer[:splits[0]] if splits else None
+
     def version_parser(self, output):
         """
         Parser function that filters version number out of client version output.
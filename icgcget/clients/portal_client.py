@@ -19,12 +19,59 @@
 #
 
 import logging
+import threading
+from multiprocessing.pool import ThreadPool
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 
 from icgcget.clients.errors import ApiError
 from click import UsageError
 
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+TRANSPORT = {'pool_size': 10, 'retries': 3, 'backoff': 0.5, 'connect_timeout': 10, 'read_timeout': 60}
+_SESSION = {'session': None, 'lock': threading.Lock()}
+
+PAGE_SIZE = 100
+METADATA_WORKERS = 4
+PAGE_ATTEMPTS = 3
+METADATA_TIMEOUT = 3600  # upper bound on a bulk metadata fetch, keeps the wait on worker threads interruptible
+
+
+def configure_transport(settings):
+    """
+    Overrides the defaults of the shared HTTP session with values from the http section of config.yaml
+    :param settings: dict with any of pool_size, retries, backoff, connect_timeout and read_timeout
+    :return:
+    """
+    if not settings:
+        return
+    with _SESSION['lock']:
+        for key in TRANSPORT:
+            if settings.get(key) is not None:
+                TRANSPORT[key] = settings[key]
+        _SESSION['session'] = None  # rebuilt with the new settings on next use
+
+
+def get_session():
+    """
+    Returns the requests session shared by all API calls.  Connections are kept alive and pooled per host, and
+    idempotent requests are retried with exponential backoff on connection errors and 429/5xx responses.
+    :return:
+    """
+    with _SESSION['lock']:
+        if _SESSION['session'] is None:
+            retry = Retry(total=TRANSPORT['retries'], backoff_factor=TRANSPORT['backoff'],
+                          status_forcelist=RETRY_STATUSES, raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=TRANSPORT['pool_size'], pool_maxsize=TRANSPORT['pool_size'],
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _SESSION['session'] = session
+        return _SESSION['session']
+
 
 def call_api(request, headers=None, head=False, verify=True):
     """
@@ -36,15 +83,20 @@ def call_api(request, headers=None, head=False, verify=True):
     :return:
     """
     logger = logging.getLogger('__log__')
+    session = get_session()
+    timeout = (TRANSPORT['connect_timeout'], TRANSPORT['read_timeout'])
     try:
         if head:
             logger.debug(request)
-            resp = requests.head(request, headers=headers, verify=verify)
+            resp = session.head(request, headers=headers, verify=verify, timeout=timeout)
         else:
-            resp = requests.get(request, headers=headers, verify=verify)
+            resp = session.get(request, headers=headers, verify=verify, timeout=timeout)
     except requests.exceptions.SSLError as ex:
         logger.error(ex.message.message)  # this isn't an error, the request exception class has an object for message
         raise ApiError(request, ex.message.message)
+    except requests.exceptions.Timeout as ex:
+        logger.error(str(ex))
+        raise ApiError(request, 'API request timed out after {} retries.'.format(TRANSPORT['retries']))
     except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
             requests.exceptions.RequestException) as ex:
         logger.error(ex.message.message)
@@ -62,9 +114,11 @@ class IcgcPortalClient(object):
     """
     Object containing functions for common ICGC api calls
     """
-    def __init__(self, verify):
+    def __init__(self, verify, page_size=None, workers=None):
         self.logger = logging.getLogger('__log__')
         self.verify = verify
+        self.page_size = page_size or PAGE_SIZE
+        self.workers = workers or METADATA_WORKERS
 
     def __parse_repos(self, entity_set):
         try:
@@ -148,24 +202,47 @@ class IcgcPortalClient(object):
 
     def get_metadata_bulk(self, file_ids, api_url):
         """
-        Function that calls ICGC api for file metadata by list of files
+        Function that calls ICGC api for file metadata by list of files.  Pages are fetched concurrently and merged
+        back in the order of file_ids.
         :param file_ids:
         :param api_url:
         :return:
         """
-
-        page_size = 100  # Divide list into chunks based on page size
-        pages = lambda l, pg: [l[i:i+pg] for i in xrange(0, len(l), pg)]
+        pages = [(file_ids[i:i + self.page_size], api_url) for i in xrange(0, len(file_ids), self.page_size)]
+        if len(pages) > 1 and self.workers > 1:
+            pool = ThreadPool(min(self.workers, len(pages)))
+            try:
+                responses = pool.map_async(self.get_metadata_page, pages).get(METADATA_TIMEOUT)
+            finally:
+                pool.terminate()
+        else:
+            responses = [self.get_metadata_page(page) for page in pages]
 
         entity_set = []
-        for page in pages(file_ids, page_size):
-            request = (api_url + 'repository/files' + self.filters(page) +
-                       '"&&from=1&size=100&sort=id&order=desc')
-            resp = call_api(request, verify=self.verify)
-            entity_set.extend(resp['hits'])
-
+        for hits in responses:
+            entity_set.extend(hits)
         return entity_set
 
+    def get_metadata_page(self, page):
+        """
+        Fetches the metadata for one page of file ids, retrying the page if the request fails after the transport's
+        own retries.  Client errors are not retried.
+        :param page: tuple of (file ids, api url)
+        :return: list of file entities
+        """
+        file_ids, api_url = page
+        request = (api_url + 'repository/files' + self.filters(file_ids) +
+                   '"&&from=1&size={}&sort=id&order=desc'.format(len(file_ids)))
+        attempt = 1
+        while True:
+            try:
+                return call_api(request, verify=self.verify)['hits']
+            except ApiError as ex:
+                if attempt >= PAGE_ATTEMPTS or (ex.code and ex.code < 500 and ex.code != 429):
+                    raise
+                self.logger.debug('Retrying metadata page starting at %s after error: %s', file_ids[0], ex.message)
+                attempt += 1
+
     @staticmethod
     def filters(file_ids):
         """
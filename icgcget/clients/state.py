@@ -0,0 +1,265 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import atexit
+import itertools
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+FLUSH_INTERVAL = 2.0  # seconds between writes of a changing session
+FLUSH_UPDATES = 500  # number of coalesced updates that forces a write regardless of time
+
+_WRITERS = {}
+_TEMP_COUNTER = itertools.count()
+
+
+def get_state_writer(json_path):
+    """
+    Returns the writer shared by every client pointed at a state file, creating it on first use.
+    :param json_path:
+    :return:
+    """
+    if json_path not in _WRITERS:
+        _WRITERS[json_path] = StateWriter(json_path)
+        install_signal_handlers()
+    return _WRITERS[json_path]
+
+
+def session_slice(session, repo):
+    """
+    Returns the part of a session a worker downloading a single repository works on.  The repository's file data is
+    shared with the session; subprocess ids and containers are the worker's own.
+    :param session:
+    :param repo:
+    :return:
+    """
+    return {'file_data': {repo: session['file_data'][repo]}, 'subprocess': [], 'container': 0, 'containers': [],
+            'command': session.get('command', '')}
+
+
+def session_parts(session):
+    """
+    Returns the session and the bookkeeping of each repository worker recorded in it, for cleaning up the subprocesses
+    and containers of every worker
+    :param session:
+    :return: list of dicts with subprocess and container entries
+    """
+    return [session] + session.get('repos', {}).values()
+
+
+def flush_all():
+    """
+    Writes out any pending session updates held by state writers.
+    :return:
+    """
+    for writer in _WRITERS.values():
+        writer.flush()
+
+
+def install_signal_handlers():
+    """
+    Flushes state files before the process is terminated by SIGTERM or SIGHUP.  Exits through SystemExit so that the
+    remaining atexit cleanup still runs.  Handlers can only be installed from the main thread.
+    :return:
+    """
+    for signum in (signal.SIGTERM, signal.SIGHUP):
+        try:
+            if signal.getsignal(signum) in (signal.SIG_DFL, None):
+                signal.signal(signum, _handle_signal)
+        except ValueError:
+            return
+
+
+def _handle_signal(signum, frame):
+    flush_all()
+    raise SystemExit(128 + signum)
+
+
+class StateWriter(object):
+    """
+    Debounced writer for state.json.  Session updates are coalesced and written on a time or update count budget,
+    always through a temporary file that is renamed over the state file so readers never see partial JSON.  Writes are
+    serialized so that clients downloading from several repositories at once can share one writer.
+    """
+
+    def __init__(self, json_path, interval=FLUSH_INTERVAL, max_updates=FLUSH_UPDATES):
+        self.logger = logging.getLogger('__log__')
+        self.path = json_path
+        self.interval = interval
+        self.max_updates = max_updates
+        self.session = None
+        self.pending = 0
+        self.last_write = 0
+        self.lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def update(self, session):
+        """
+        Records a session change, writing it out only if the time or count budget has been used up.
+        :param session:
+        :return:
+        """
+        with self.lock:
+            self.session = session
+            self.pending += 1
+            if self.pending >= self.max_updates or time.time() - self.last_write >= self.interval:
+                self.flush()
+
+    def write(self, session):
+        """
+        Records a session change and writes it out immediately.  Used for information needed to clean up after a crash,
+        such as subprocess ids.
+        :param session:
+        :return:
+        """
+        with self.lock:
+            self.session = session
+            self.pending += 1
+            self.flush()
+
+    def flush(self):
+        """
+        Atomically replaces the state file with the latest session if there are pending updates.
+        :return:
+        """
+        with self.lock:
+            if not self.path or not self.pending or self.session is None:
+                return
+            temp_path = '{0}.{1}.{2}.tmp'.format(self.path, os.getpid(), next(_TEMP_COUNTER))
+            try:
+                temp_file = os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0666), 'w')
+                with temp_file:
+                    json.dump(self.session, temp_file)
+                os.rename(temp_path, self.path)
+            except (IOError, OSError) as ex:
+                self.logger.warning('Unable to write download state to %s: %s', self.path, ex.strerror)
+                if os.path.isfile(temp_path):
+                    os.remove(temp_path)
+                return
+            self.pending = 0
+            self.last_write = time.time()
+
+    def discard(self):
+        """
+        Drops pending updates and removes the state file.  Used once a download has completed.
+        :return:
+        """
+        with self.lock:
+            self.pending = 0
+            self.session = None
+            if self.path and os.path.isfile(self.path):
+                os.remove(self.path)
+
+
+class SliceWriter(object):
+    """
+    State writer of a worker downloading one repository from a session slice.  Each change is merged into the full
+    session, the worker's subprocesses and containers under the repository's entry of 'repos', and written through the
+    writer shared by every worker, so that the state file always holds every repository.
+    """
+
+    def __init__(self, writer, session, repo):
+        self.writer = writer
+        self.session = session
+        self.repo = repo
+
+    def merge(self, part):
+        self.session['file_data'][self.repo] = part['file_data'][self.repo]
+        self.session.setdefault('repos', {})[self.repo] = {'subprocess': part['subprocess'],
+                                                           'container': part['container'],
+                                                           'containers': part['containers']}
+
+    def update(self, part):
+        with self.writer.lock:
+            self.merge(part)
+            self.writer.update(self.session)
+
+    def write(self, part):
+        with self.writer.lock:
+            self.merge(part)
+            self.writer.write(self.session)
+
+    def flush(self):
+        self.writer.flush()
+
+
+class SessionIndex(object):
+    """
+    Reverse indexes from the names download clients report (file name, index file name, file url and object uuid) to
+    file ids, along with the file currently running in each repository.  Lets session updates touch only the files
+    whose state actually changes.
+    """
+    KEYS = ('fileName', 'index_filename', 'fileUrl', 'uuid')
+
+    def __init__(self, session):
+        self.session = session
+        self.names = {}
+        self.running = {}
+        for repo, files in session['file_data'].iteritems():
+            names = self.names[repo] = {}
+            running = self.running[repo] = []
+            for file_id, file_object in files.iteritems():
+                for key in self.KEYS:
+                    name = file_object.get(key)
+                    if name and name != 'None':
+                        file_ids = names.setdefault(name, [])
+                        if file_id not in file_ids:
+                            file_ids.append(file_id)
+                if file_object['state'] == 'Running':
+                    running.append(file_id)
+
+    def update(self, file_name, repo):
+        """
+        Marks every file with the name as running and the previously running files as finished.  Only one file at a
+        time is downloaded per repository, though several entries of the manifest can share its name.
+        :param file_name:
+        :param repo:
+        :return: ids of the files that finished
+        """
+        if repo not in self.names:
+            return []
+        files = self.session['file_data'][repo]
+        file_ids = self.names[repo].get(file_name, [])
+        finished = [file_id for file_id in self.running[repo] if file_id not in file_ids]
+        for file_id in finished:
+            files[file_id]['state'] = 'Finished'
+        for file_id in file_ids:
+            files[file_id]['state'] = 'Running'
+        self.running[repo] = list(file_ids)
+        return finished
+
+    def finish(self, file_name, repo):
+        """
+        Marks every file with the name as finished without changing which files are running.  Used by clients that
+        transfer several files at once and report each one as it completes.
+        :param file_name:
+        :param repo:
+        :return: ids of the files that finished
+        """
+        if repo not in self.names:
+            return []
+        file_ids = self.names[repo].get(file_name, [])
+        for file_id in file_ids:
+            self.session['file_data'][repo][file_id]['state'] = 'Finished'
+        self.running[repo] = [file_id for file_id in self.running[repo] if file_id not in file_ids]
+        return list(file_ids)
@@ -19,8 +19,12 @@
 #
 import collections
 import os
+import re
 import click
 
+LINE_BREAK = re.compile(r'[\r\n]')
+READ_CHUNK_SIZE = 65536
+
 
 def build_table(table, repo, sizes, counts, donors, downloads, output):
     """
@@ -62,7 +66,7 @@ def calculate_size(manifest_json, download_session):
     file_data = {}
     for repo_info in manifest_json['entries']:
         repo = repo_info['repo']
-        file_data[repo] = {}
+        file_data[repo] = collections.OrderedDict()  # kept in manifest order for the download schedule
         for file_info in repo_info['files']:
             file_data[repo][file_info['id']] = {'uuid': file_info['repoFileId'], 'state': 'Not started',
                                                 'fileName': 'None', 'index_filename': 'None',
@@ -162,23 +166,28 @@ def normalize_keys(obj):
         return {k.replace('.', '_'): normalize_keys(v) for k, v in obj.items()}
 
 
-def search_recursive(filename, output):
+def read_lines(stream, chunk_size=READ_CHUNK_SIZE):
     """
-    Function to recursively search through a directory and all of it's children for a file name.
-    :param filename:
-    :param output:
+    Generator that reads a subprocess output stream in large chunks and yields it one line at a time.  Lines are split
+    on both newlines and carriage returns so that clients redrawing progress bars are still reported line by line.
+    Anything left in the buffer when the stream closes is yielded as a final line.
+    :param stream: file object of a subprocess pipe
+    :param chunk_size: maximum number of bytes read per system call
     :return:
     """
-    if not output:
-        return False
-    for root, dirs, files in os.walk(output, topdown=False):
-        for name in files:
-            if name == filename:
-                return True
-        for directory in dirs:
-            if directory == filename:
-                return True
-    return False
+    file_descriptor = stream.fileno()
+    remainder = ''
+    while True:
+        chunk = os.read(file_descriptor, chunk_size)  # returns as soon as any output is available
+        if not chunk:
+            break
+        lines = LINE_BREAK.split(remainder + chunk)
+        remainder = lines.pop()
+        for line in lines:
+            if line:
+                yield line
+    if remainder:
+        yield remainder
 
 
 def client_style(output):
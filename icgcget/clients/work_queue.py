@@ -0,0 +1,319 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import errno
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from icgcget.clients.cache import cache_key
+
+LEASE_TIMEOUT = 300  # seconds without a heartbeat after which a claimed file can be taken by another node
+HEARTBEAT_INTERVAL = 60  # seconds between renewals of a node's claims
+POLL_INTERVAL = 30  # seconds between looks at the queue while other nodes hold the remaining files
+
+
+def queue_directory(root, ids, repos):
+    """
+    Directory of the queue for a download within a shared directory, so that one shared directory can hold the queues
+    of several manifests
+    :param root:
+    :param ids: file or manifest ids of the download
+    :param repos:
+    :return:
+    """
+    return os.path.join(root, 'queue-' + cache_key(sorted(ids), list(repos))[:12])
+
+
+def node_name():
+    """
+    Name of this process within the cluster of nodes sharing a queue
+    :return:
+    """
+    return '{0}.{1}'.format(socket.gethostname(), os.getpid())
+
+
+class WorkQueue(object):
+    """
+    Queue of the files of a download, kept in a directory shared by every node working on it.  There is no
+    coordinator: a node claims a file by creating its claim file exclusively, keeps the claim alive with heartbeats,
+    and publishes the file to the ledger once it is downloaded.  Claims whose heartbeats stop are taken over by other
+    nodes once their lease has run out.  All times are file modification times set by the shared filesystem, so node
+    clocks do not need to agree.
+    """
+
+    def __init__(self, directory, node=None, lease=LEASE_TIMEOUT, heartbeat=HEARTBEAT_INTERVAL, read_only=False):
+        self.logger = logging.getLogger('__log__')
+        self.directory = directory
+        self.node = node or node_name()
+        self.lease = lease
+        self.heartbeat = heartbeat
+        self.read_only = read_only
+        self.claims_dir = os.path.join(directory, 'claims')
+        self.ledger_dir = os.path.join(directory, 'ledger')
+        self.nodes_dir = os.path.join(directory, 'nodes')
+        for path in () if read_only else (self.claims_dir, self.ledger_dir, self.nodes_dir):
+            try:
+                os.makedirs(path)
+            except OSError as ex:
+                if ex.errno != errno.EEXIST:
+                    raise
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Starts renewing the claims of this node in the background
+        :return:
+        """
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops the heartbeat and gives up any claims still held
+        :return:
+        """
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.release(list(self.held))
+        self.remove(os.path.join(self.nodes_dir, self.node))
+
+    def run(self):
+        while not self.stopped.wait(self.heartbeat):
+            self.renew()
+
+    def renew(self):
+        """
+        Renews the leases of every file claimed by this node
+        :return:
+        """
+        self.clock()
+        with self.lock:
+            held = list(self.held)
+        for key in held:
+            try:
+                if not self.owns(key):
+                    raise OSError(errno.ENOENT, 'claimed by another node')
+                os.utime(self.claim_path(key), None)
+            except (IOError, OSError):
+                self.logger.warning('Lost claim on %s to another node', key)
+                with self.lock:
+                    self.held.discard(key)
+
+    def owns(self, key):
+        """
+        Checks that the claim file of a file still names this node
+        :param key:
+        :return:
+        """
+        try:
+            with open(self.claim_path(key)) as claim_file:
+                return claim_file.read() == self.node
+        except IOError:
+            return False
+
+    def clock(self):
+        """
+        Records a heartbeat for this node and returns the time of the shared filesystem
+        :return:
+        """
+        path = os.path.join(self.nodes_dir, self.node)
+        with open(path, 'a'):
+            os.utime(path, None)
+        return os.path.getmtime(path)
+
+    def now(self):
+        """
+        Returns the time of the shared filesystem without recording a heartbeat.  A read only queue can't touch the
+        filesystem, so it takes the time of the latest heartbeat of any node, or the local time if there is none.
+        :return:
+        """
+        if not self.read_only:
+            os.utime(self.directory, None)
+            return os.path.getmtime(self.directory)
+        heartbeats = [os.path.getmtime(os.path.join(self.nodes_dir, node)) for node in self.listdir(self.nodes_dir)]
+        return max(heartbeats) if heartbeats else time.time()
+
+    def claim(self, repo, files, batch):
+        """
+        Claims up to batch files of a repository that are neither finished nor held by a live claim, in the order given
+        :param repo:
+        :param files: file data keyed by file id, in download order
+        :param batch: maximum number of files to claim
+        :return: list of claimed file ids
+        """
+        now = self.clock()
+        claimed = []
+        for file_id in files:
+            if len(claimed) >= batch:
+                break
+            key = self.key(repo, file_id)
+            if key in self.held or os.path.exists(self.ledger_path(key)):
+                continue
+            if self.create_claim(key) or (self.expired(key, now) and self.take_over(key, now)):
+                claimed.append(file_id)
+        with self.lock:
+            self.held.update(self.key(repo, file_id) for file_id in claimed)
+        return claimed
+
+    def create_claim(self, key):
+        try:
+            descriptor = os.open(self.claim_path(key), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0666)
+        except OSError as ex:
+            if ex.errno == errno.EEXIST:
+                return False
+            raise
+        with os.fdopen(descriptor, 'w') as claim_file:
+            claim_file.write(self.node)
+        return True
+
+    def expired(self, key, now):
+        try:
+            return now - os.path.getmtime(self.claim_path(key)) > self.lease
+        except OSError:
+            return False
+
+    def take_over(self, key, now):
+        """
+        Takes an expired claim from another node.  The stale claim is renamed out of the way first, which only one node
+        can do, so two nodes can't both take over the same file.  The claim may have been renewed or taken over since it
+        was found expired, so the renamed claim is checked again and put back if it is not the expired one.
+        :param key:
+        :param now: time of the shared filesystem the claim was found expired at
+        :return: True if the claim now belongs to this node
+        """
+        path = self.claim_path(key)
+        stale = '{0}.stale.{1}'.format(path, self.node)
+        try:
+            with open(path) as claim_file:
+                owner = claim_file.read()
+            os.rename(path, stale)
+        except (IOError, OSError):
+            return False
+        try:
+            with open(stale) as claim_file:
+                renamed = claim_file.read() == owner and now - os.path.getmtime(stale) > self.lease
+        except (IOError, OSError):
+            renamed = False
+        if not renamed:
+            try:
+                os.link(stale, path)  # fails rather than replacing a claim created in the meantime
+            except OSError:
+                pass
+            self.remove(stale)
+            return False
+        self.remove(stale)
+        self.logger.info('Reclaiming %s from unresponsive node %s', key, owner)
+        return self.create_claim(key)
+
+    def complete(self, repo, file_ids, size=None):
+        """
+        Publishes downloaded files to the ledger and drops their claims
+        :param repo:
+        :param file_ids:
+        :param size: dict of file sizes, recorded in the ledger
+        :return:
+        """
+        for file_id in file_ids:
+            key = self.key(repo, file_id)
+            entry = {'repo': repo, 'id': file_id, 'node': self.node, 'size': (size or {}).get(file_id)}
+            temp_path = '{0}.{1}.tmp'.format(self.ledger_path(key), self.node)
+            with open(temp_path, 'w') as ledger_file:
+                json.dump(entry, ledger_file)
+            os.rename(temp_path, self.ledger_path(key))
+        self.release([self.key(repo, file_id) for file_id in file_ids])
+
+    def release(self, keys):
+        """
+        Gives up claims so that other nodes can take the files
+        :param keys: claim keys, as returned by key
+        :return:
+        """
+        for key in keys:
+            with self.lock:
+                self.held.discard(key)
+            if self.owns(key):
+                self.remove(self.claim_path(key))
+
+    def pending(self, file_data):
+        """
+        Counts the files that are not in the ledger yet
+        :param file_data:
+        :return:
+        """
+        return sum(1 for repo, files in file_data.iteritems() for file_id in files
+                   if not os.path.exists(self.ledger_path(self.key(repo, file_id))))
+
+    def progress(self, file_data):
+        """
+        Marks files finished anywhere in the cluster as Finished and files claimed by a live node as Running, and
+        summarizes the cluster's progress
+        :param file_data: file data, edited in place
+        :return: dict of finished and total file counts and bytes, and the number of live nodes
+        """
+        now = self.now()
+        summary = {'files': 0, 'finished': 0, 'bytes': 0, 'finished_bytes': 0,
+                   'nodes': sum(1 for node in self.listdir(self.nodes_dir)
+                                if now - os.path.getmtime(os.path.join(self.nodes_dir, node)) <= self.lease)}
+        for repo, files in file_data.iteritems():
+            for file_id, file_object in files.iteritems():
+                key = self.key(repo, file_id)
+                summary['files'] += 1
+                summary['bytes'] += file_object['size']
+                if os.path.exists(self.ledger_path(key)):
+                    file_object['state'] = 'Finished'
+                    summary['finished'] += 1
+                    summary['finished_bytes'] += file_object['size']
+                elif os.path.exists(self.claim_path(key)) and not self.expired(key, now):
+                    file_object['state'] = 'Running'
+        return summary
+
+    def claim_path(self, key):
+        return os.path.join(self.claims_dir, key)
+
+    def ledger_path(self, key):
+        return os.path.join(self.ledger_dir, key + '.json')
+
+    @staticmethod
+    def key(repo, file_id):
+        return '{0}.{1}'.format(repo, file_id.replace('/', '_'))
+
+    @staticmethod
+    def listdir(path):
+        try:
+            return os.listdir(path)
+        except OSError:
+            return []
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -18,7 +18,14 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 import logging
+import os
+import time
+from collections import namedtuple
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
 import click
+from icgcget.clients.cache import FileCache, DEFAULT_CACHE_DIR, CREDENTIAL_TTL, CREDENTIAL_MAX_BYTES
 from icgcget.clients.ega.ega_client import EgaDownloadClient
 from icgcget.clients.errors import SubprocessError
 from icgcget.clients.gdc.gdc_client import GdcDownloadClient
@@ -27,18 +34,26 @@ from icgcget.clients.pdc.pdc_client import PdcDownloadClient
 from icgcget.clients.errors import ApiError
 from icgcget.commands.utils import check_access
 
+ACCESS_WORKERS = 5  # one per supported repository
+ACCESS_TIMEOUT = 120  # seconds allowed for each repository's check
+
+AccessCheck = namedtuple('AccessCheck', ['repo', 'label', 'function', 'args', 'kwargs', 'abort'])
+
 
 class AccessCheckDispatcher(object):
     """
     Dispatcher that controls verification of access commands
     """
 
-    def __init__(self):
+    def __init__(self, workers=ACCESS_WORKERS, timeout=ACCESS_TIMEOUT):
         self.logger = logging.getLogger('__log__')
+        self.workers = workers
+        self.timeout = timeout
 
     def access_checks(self, ctx, file_data, docker, api_url, container_version=''):
         """
-        Dispatcher for access check functions of all repositories
+        Dispatcher for access check functions of all repositories.  Credentials are validated up front, then the checks
+        run concurrently and are reported in repository order.
         """
         params = ctx.params
         verify = params['no_ssl_verify']
@@ -49,23 +64,90 @@ class AccessCheckDispatcher(object):
         ega_client = EgaDownloadClient(verify=verify)
         icgc_client = StorageClient(verify=verify)
         pdc_client = PdcDownloadClient(docker=docker, container_version=container_version)
+        ega_client.credential_cache = icgc_client.credential_cache = self.credential_cache(ctx)
 
-
+        checks = []
         if 'collaboratory' in repos:
-            self.access_check('collaboratory', params['icgc_token'], icgc_client, api_url=api_url, code='collab')
+            checks.append(self.access_check('collaboratory', params['icgc_token'], icgc_client, api_url=api_url,
+                                            code='collab'))
 
         if 'aws-virginia' in repos:
-            self.access_check('aws-virginia', params['icgc_token'], icgc_client, api_url=api_url, code='aws')
+            checks.append(self.access_check('aws-virginia', params['icgc_token'], icgc_client, api_url=api_url,
+                                            code='aws'))
 
         if 'ega' in repos:
-            self.access_check('ega', params['ega_username'], ega_client, password=params['ega_password'])
+            checks.append(self.access_check('ega', params['ega_username'], ega_client, password=params['ega_password']))
 
         if 'gdc' in repos:
-            self.access_check_ids('gdc', file_data, params['gdc_token'], gdc_client)
+            checks.append(self.access_check_ids('gdc', file_data, params['gdc_token'], gdc_client))
 
         if 'pdc' in repos:
-            self.access_check_ids('pdc', file_data, params['pdc_key'], pdc_client, params['pdc_path'], output,
-                                  params['pdc_secret'])
+            checks.append(self.access_check_ids('pdc', file_data, params['pdc_key'], pdc_client, params['pdc_path'],
+                                                output, params['pdc_secret']))
+        self.run_checks([check for check in checks if check])
+
+    @staticmethod
+    def credential_cache(ctx):
+        """
+        Builds the on-disk cache of verified credentials, honouring the --no-cache and --refresh options and the cache
+        section of config.yaml
+        :param ctx:
+        :return:
+        """
+        params = ctx.params
+        settings = ctx.obj.get('cache', {}) if ctx.obj else {}
+        directory = None if params.get('no_cache') else os.path.join(DEFAULT_CACHE_DIR, 'credentials')
+        return FileCache(directory, settings.get('credential_ttl', CREDENTIAL_TTL), CREDENTIAL_MAX_BYTES,
+                         refresh=params.get('refresh', False))
+
+    def run_checks(self, checks):
+        """
+        Runs access checks on a bounded pool of threads and reports their results in the order given.  Each check has
+        its own timeout so that one unresponsive repository does not hold up the others.
+        :param checks: list of AccessCheck
+        :return:
+        """
+        if not checks:
+            return
+        pool = ThreadPool(min(self.workers, len(checks)))
+        try:
+            pending = []
+            for check in checks:
+                deadline = time.time() + self.timeout
+                pending.append((check, deadline, pool.apply_async(check.function, check.args, check.kwargs)))
+            for check, deadline, result in pending:
+                self.check_response(check, result, deadline)
+        finally:
+            pool.terminate()
+
+    def check_response(self, check, result, deadline):
+        """
+        Waits for the result of an access check and logs it.  Checks of individual files abort the command on failure.
+        :param check:
+        :param result: AsyncResult of the check
+        :param deadline: time by which the check must have completed
+        :return:
+        """
+        try:
+            response = result.get(max(deadline - time.time(), 0))
+            if isinstance(response, tuple):
+                self.files_response(check.repo, *response)
+            else:
+                self.access_response(response, check.label)
+        except TimeoutError:
+            self.logger.error('Access check for the %s repository did not complete within %s seconds',
+                              check.repo.upper(), self.timeout)
+            if check.abort:
+                raise click.Abort
+        except SubprocessError as ex:
+            self.logger.error(ex.message)
+            raise click.Abort
+        except ApiError as api_error:
+            if check.abort:
+                self.logger.error(api_error.message)
+                raise click.Abort
+            self.logger.error('Unable to connect to the %s API, cannot determine status of access credentials',
+                              check.repo.upper())
 
     def access_response(self, result, repo):
         """
@@ -79,6 +161,19 @@ class AccessCheckDispatcher(object):
         else:
             self.logger.info('Invalid access to the ' + repo)
 
+    def files_response(self, repo, allowed, forbidden):
+        """
+        Logs formatted output for access checks that report individual files
+        :param repo:
+        :param allowed: ids of files that can be downloaded
+        :param forbidden: ids of files that can't be downloaded
+        :return:
+        """
+        if allowed:
+            self.access_response(True, repo.upper() + ' files: {}'.format(', '.join(allowed)))
+        if forbidden:
+            self.access_response(False, repo.upper() + ' files: {}'.format(', '.join(forbidden)))
+
     def access_check(self, repo, token, client, api_url=None, password=None, code=None):
         """
         Access check for clients that allow access checks for the entire repository instead of single files.  Used by
@@ -89,15 +184,11 @@ class AccessCheckDispatcher(object):
         :param api_url:
         :param password:
         :param code:
-        :return:
+        :return: AccessCheck to be run by run_checks
         """
         check_access(self, token, repo)
-        try:
-            self.access_response(client.access_check(token, repo=code, api_url=api_url, password=password),
-                                 repo.upper())
-        except ApiError:
-            self.logger.error('Unable to connect to the %s API, cannot determine status of access credentials',
-                              repo.upper())
+        return AccessCheck(repo, repo.upper(), client.access_check, (token,),
+                           {'repo': code, 'api_url': api_url, 'password': password}, False)
 
     def access_check_ids(self, repo, file_data, key, client, path=None, output=None, secret_key="Default"):
         """
@@ -109,7 +200,7 @@ class AccessCheckDispatcher(object):
         :param path:
         :param output:
         :param secret_key:
-        :return:
+        :return: AccessCheck to be run by run_checks, or None if no files will be downloaded from the repository
         """
         if repo in file_data:
             if repo == 'pdc':
@@ -119,15 +210,25 @@ class AccessCheckDispatcher(object):
             if not uuids:
                 self.logger.info('None of the specified ids will be downloaded from the %s repository:' +
                                  'unable to verify access credentials.', repo)
-                return
+                return None
             check_access(self, key, repo, path, secret_key=secret_key)
-            try:
-                self.access_response(client.access_check(key, uuids, path, output=output, repo=repo,
-                                                         secret_key=secret_key),
-                                     repo.upper() + ' files: {}'.format(', '.join(file_data[repo].keys())))
-            except SubprocessError as ex:
-                self.logger.error(ex.message)
-                raise click.Abort
-            except ApiError as api_error:
-                self.logger.error(api_error.message)
-                raise click.Abort
+            if repo == 'gdc':
+                return AccessCheck(repo, repo.upper(), self.forbidden_files, (client, key, file_data[repo]), {}, True)
+            return AccessCheck(repo, repo.upper() + ' files: {}'.format(', '.join(file_data[repo].keys())),
+                               client.access_check, (key, uuids, path),
+                               {'output': output, 'repo': repo, 'secret_key': secret_key}, True)
+        return None
+
+    @staticmethod
+    def forbidden_files(client, key, files):
+        """
+        Splits files by whether the credential can download them, for clients that can identify forbidden uuids
+        :param client:
+        :param key:
+        :param files: file data of the repository, keyed by file id
+        :return: tuple of sorted allowed and forbidden file ids
+        """
+        file_ids = sorted(files.keys())
+        forbidden = set(client.forbidden_uuids(key, [files[file_id]['uuid'] for file_id in file_ids]))
+        return ([file_id for file_id in file_ids if files[file_id]['uuid'] not in forbidden],
+                [file_id for file_id in file_ids if files[file_id]['uuid'] in forbidden])
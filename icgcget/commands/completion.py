@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import logging
+import os
+import threading
+from Queue import Queue
+
+from icgcget.clients.moves import move_path, remove_path, MOVES
+
+
+def move_staged(staging, name, output):
+    """
+    Moves an entry of the staging directory to the output directory with the move engine.  Directories already present
+    in the output directory are merged, other entries already present are removed from staging instead.
+    :param staging:
+    :param name:
+    :param output:
+    :return:
+    """
+    logger = logging.getLogger('__log__')
+    source = os.path.join(staging, name)
+    destination = os.path.join(output, name)
+    if os.path.isdir(source) and os.path.isdir(destination) and not os.path.islink(destination):
+        for child in os.listdir(source):
+            move_staged(source, child, destination)
+        try:
+            os.rmdir(source)
+        except OSError:
+            pass
+        return
+    if os.path.lexists(destination):
+        try:
+            logger.info('File %s already present in download directory', name)
+            os.remove(source)
+        except OSError:
+            logger.error('Insufficient permissions to move files. ' +
+                         'Please remove .staging from your download directory manually.')
+        return
+    move_path(source, destination)
+
+
+def remove_placed(paths):
+    """
+    Removes files and directories placed in the output directory, ignoring those already gone
+    :param paths:
+    :return:
+    """
+    for path in paths:
+        remove_path(path)
+
+
+class CompletionStage(object):
+    """
+    Places each file in the output directory as soon as its client reports it complete, while the client carries on
+    with the rest of the repository.  Moves are done by a few background threads, so that slow copies across
+    filesystems overlap; files are taken in the order they complete, but may be placed in a different order.  A file
+    is only marked Finished once it is in place; entries that can't be matched to a file are left for the final move
+    of the repository.  Placed files are queued on the verifier checks, if there are any, and passed to the on_placed
+    hook.
+    """
+
+    def __init__(self, session, staging, output, state, verifier=None, on_placed=None):
+        self.logger = logging.getLogger('__log__')
+        self.session = session
+        self.staging = staging
+        self.output = output
+        self.state = state
+        self.verifier = verifier
+        self.on_placed = on_placed
+        self.placed = {}
+        self.queue = Queue()
+        self.threads = [threading.Thread(target=self.run) for _ in range(MOVES['workers'])]
+        for thread in self.threads:
+            thread.daemon = True
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, repo, file_id):
+        """
+        Queues a completed file to be placed in the output directory
+        :param repo:
+        :param file_id:
+        :return:
+        """
+        self.queue.put((repo, file_id))
+
+    def close(self):
+        """
+        Waits for queued files to be placed and stops the stage
+        :return:
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self.place(*item)
+            except (IOError, OSError) as ex:
+                self.logger.warning('Unable to move %s to %s: %s', item[1], self.output, ex)
+
+    def place(self, repo, file_id):
+        """
+        Moves the staged entries of a file, including its index file, and marks the file Finished if any were found
+        :param repo:
+        :param file_id:
+        :return:
+        """
+        file_object = self.session['file_data'][repo][file_id]
+        names = self.staged_names(file_object)
+        if not names:
+            return
+        for name in names:
+            move_staged(self.staging, name, self.output)
+        self.logger.debug('Moved %s to %s', ', '.join(names), self.output)
+        self.placed[(repo, file_id)] = [os.path.join(self.output, name) for name in names]
+        file_object['state'] = 'Finished'
+        self.state.update(self.session)
+        if self.on_placed:
+            self.on_placed(repo, file_id)
+        path = self.file_path(file_object, names)
+        if self.verifier and path:
+            self.verifier.submit((repo, file_id), path, file_object.get('fileMd5sum'), file_object.get('size'))
+
+    def file_path(self, file_object, names):
+        """
+        Finds the data file of a placed file among its moved entries
+        :param file_object:
+        :param names: moved staging entries
+        :return: path of the data file, or None if it is not among them
+        """
+        file_name = file_object.get('fileName')
+        for name in names:
+            path = os.path.join(self.output, name)
+            if name == file_name:
+                return path
+            if os.path.isdir(path) and os.path.isfile(os.path.join(path, file_name)):
+                return os.path.join(path, file_name)
+        return None
+
+    def staged_names(self, file_object):
+        """
+        Finds the top level staging entries that belong to a file: the file and index file themselves, or a directory
+        named after the object.
+        :param file_object:
+        :return:
+        """
+        candidates = [file_object.get('fileName'), file_object.get('index_filename'), file_object.get('uuid')]
+        if file_object.get('fileUrl') not in (None, 'None'):
+            candidates.append(file_object['fileUrl'].rsplit('/', 1)[-1])
+        names = []
+        for name in candidates:
+            if name and name != 'None' and name not in names and os.path.lexists(os.path.join(self.staging, name)):
+                names.append(name)
+        return names
@@ -20,40 +20,69 @@
 
 import logging
 import os
-import shutil
 import datetime
+import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 import click
 import psutil
 
 from icgcget.clients import portal_client
-from icgcget.clients.ega.ega_client import EgaDownloadClient
+from icgcget.clients.cache import cache_key, FileCache, DEFAULT_CACHE_DIR, METADATA_TTL, METADATA_MAX_BYTES, \
+    CREDENTIAL_MAX_BYTES
+from icgcget.clients.checksums import Verifier
+from icgcget.clients.moves import MOVES
+from icgcget.clients.ega.ega_client import EgaDownloadClient, REQUEST_TTL
 from icgcget.clients.gdc.gdc_client import GdcDownloadClient
 from icgcget.clients.icgc.storage_client import StorageClient
 from icgcget.clients.pdc.pdc_client import PdcDownloadClient
-from icgcget.clients.utils import calculate_size, convert_size, search_recursive, flatten_file_data
+from icgcget.clients.output_index import get_output_index
+from icgcget.clients.state import SliceWriter, session_slice
+from icgcget.clients.utils import calculate_size, convert_size, flatten_file_data
+from icgcget.clients.work_queue import WorkQueue, POLL_INTERVAL, queue_directory
 
+from icgcget.commands.completion import CompletionStage, move_staged, remove_placed
+from icgcget.commands.scheduling import balanced_bins, schedule_files, shard_files, stream_loads, tail_utilisation
+from icgcget.commands.staging import StagingCapacity
 from icgcget.commands.utils import api_error_catch, filter_manifest_ids, check_access, get_manifest_json, \
     match_repositories
 
 
+VERIFY_ATTEMPTS = 2  # downloads of a file before a failed verification is an error
+CLIENT_BATCH = 1000  # most object ids given to one client process, keeps command lines well under ARG_MAX
+QUEUE_BATCH = 4  # files claimed from a shared work queue at a time
+REPO_TIMEOUT = 7 * 24 * 3600  # upper bound on a single repository's download, keeps worker joins interruptible
+
+
 class DownloadDispatcher(object):
     """
     Dispatcher that handles downloading files from client and metadata from the api.
     """
     def __init__(self, json_path=None, docker=False, log_dir=None, container_version=''):
         self.logger = logging.getLogger('__log__')
+        self.json_path = json_path
+        self.docker = docker
+        self.log_dir = log_dir
+        self.container_version = container_version
+        self.verify_checksums = True
+        self.verifier = None
+        self.capacity = None
+        self.schedule = 'manifest'
+        self.client_processes = 1
+        self.client_batch = CLIENT_BATCH
         self.gdc_client = GdcDownloadClient(json_path, docker, log_dir=log_dir, container_version=container_version)
         self.ega_client = EgaDownloadClient(json_path, docker, log_dir=log_dir, container_version=container_version)
         self.pdc_client = PdcDownloadClient(json_path, docker, log_dir, container_version=container_version)
         self.icgc_client = StorageClient(json_path, docker, log_dir=log_dir, container_version=container_version)
 
-    def download_manifest(self, ctx, api_url, unique=False):
+    def download_manifest(self, ctx, api_url, unique=False, space_check=True):
         """
         Function responsible for retrieving manifests and metadata from the icgc api and formatting that data into
         a download session object.  All queries to the portal go through this function.
         :param ctx: click context
         :param api_url: icgc-api url
         :param unique: controls if all files on output manifest must be unique
+        :param space_check: warn if the output directory does not have room for the files
         :return: download session
         """
         params = ctx.params
@@ -63,75 +92,316 @@ class DownloadDispatcher(object):
         repos = params['repos']
         output = params['output']
 
-        portal = portal_client.IcgcPortalClient(verify)
-        manifest_json = self.get_manifest(manifest, ids, api_url, params['repos'], portal)
+        portal_settings = ctx.obj.get('portal', {}) if ctx.obj else {}
+        portal = portal_client.IcgcPortalClient(verify, portal_settings.get('page_size'),
+                                                portal_settings.get('workers'))
+        cache = self.metadata_cache(ctx)
+        manifest_json = cache.fetch(cache_key('manifest', manifest, ids, repos, api_url), self.get_manifest, manifest,
+                                    ids, api_url, repos, portal)
         download_session = {'pid': os.getpid(), 'start_time': datetime.datetime.utcnow().isoformat(),
-                            'subprocess': [], 'command': ids, 'container': 0}
+                            'subprocess': [], 'command': ids, 'container': 0, 'containers': []}
         size, download_session = calculate_size(manifest_json, download_session)  # This initializes the file data dict
         file_data = download_session['file_data']
+        file_ids = ids
+        if params.get('shard'):  # before skipping downloaded files, so that every node splits the same file set
+            size = self.shard(file_data, params['shard'], params.get('shard_by') or 'hash', size)
+            file_ids = flatten_file_data(file_data)
         if manifest:  # if provided with manifest id, populate the file ids object with actual file ids
             file_ids = []
             for repo in file_data:
                 file_ids.extend(file_data[repo].keys())
                 self.logger.debug(' '.join(file_data[repo].keys()) + ' found on manifest')
-        entities = api_error_catch(self, portal.get_metadata_bulk, ids, api_url)
+        entities = cache.fetch(cache_key('metadata', sorted(file_ids), api_url), api_error_catch, self,
+                               portal.get_metadata_bulk, file_ids, api_url)
+        self.logger.debug('Metadata cache: %s hits, %s misses', cache.hits, cache.misses)
+        downloaded = get_output_index(output) if unique else None
         for entity in entities:
             repo, copy = match_repositories(self, repos, entity)
             if not repo:
                 raise click.Abort()
 
             if copy['repoCode'] == repo:
-                if unique and search_recursive(copy['fileName'], output):
+                if unique and copy['fileName'] in downloaded:
                     file_data[repo].pop(entity['id'])
                     self.logger.info('File %s found in download directory as {}, skipping'
                                      .format(copy['fileName']), entity['id'])
                     continue
                 temp_file = {'fileName': copy["fileName"], 'dataType': entity['dataCategorization']['dataType'],
-                             'donors': entity["donors"], 'fileFormat': copy['fileFormat']}
+                             'donors': entity["donors"], 'fileFormat': copy['fileFormat'],
+                             'fileMd5sum': copy.get('fileMd5sum')}
 
                 if 'fileName' in copy['indexFile']:
                     temp_file['index_filename'] = copy['indexFile']['fileName']
                 if repo == 'pdc':
                     file_data[repo][entity['id']]['fileUrl'] = 's3://' + copy['repoDataPath']
-                    if unique and search_recursive(copy['repoDataPath'].split('/')[1], output):
+                    if unique and copy['repoDataPath'].split('/')[1] in downloaded:
                         file_data[repo].pop(entity['id'])
                         self.logger.info('File %s found in download directory, skipping', entity['id'])
                         continue
                 file_data[repo][entity['id']].update(temp_file)
                 self.logger.debug('File %s added to file data under repo %s', entity['id'], repo)
 
-        self.size_check(size, output)
+        if space_check:
+            self.size_check(size, output)
         if not flatten_file_data(file_data):
             self.logger.info('All files were found in download directory ({}), aborting'.format(output))
 
         return download_session
 
+    def shard(self, file_data, shard, method, size):
+        """
+        Keeps only the files of one shard of the manifest
+        :param file_data:
+        :param shard: tuple of shard number and count
+        :param method: one of SHARD_METHODS
+        :param size: total size of the manifest
+        :return: total size of the shard
+        """
+        total = len(flatten_file_data(file_data))
+        shard_files(file_data, shard[0], shard[1], method)
+        shard_size = sum(file_object['size'] for files in file_data.values() for file_object in files.values())
+        self.logger.info('Shard %s/%s by %s: %s of %s files, %s of %s', shard[0], shard[1], method,
+                         len(flatten_file_data(file_data)), total, ''.join(convert_size(shard_size)),
+                         ''.join(convert_size(size)))
+        return shard_size
+
+    @staticmethod
+    def metadata_cache(ctx):
+        """
+        Builds the on-disk cache for manifests and file metadata, honouring the --no-cache and --refresh options and
+        the cache section of config.yaml
+        :param ctx:
+        :return:
+        """
+        params = ctx.params
+        settings = ctx.obj.get('cache', {}) if ctx.obj else {}
+        directory = None if params.get('no_cache') else os.path.join(DEFAULT_CACHE_DIR, 'metadata')
+        return FileCache(directory, settings.get('ttl', METADATA_TTL), settings.get('max_size', METADATA_MAX_BYTES),
+                         refresh=params.get('refresh', False))
+
+    @staticmethod
+    def request_cache(ctx):
+        """
+        Builds the on-disk cache of EGA download requests, honouring the --no-cache and --refresh options
+        :param ctx:
+        :return:
+        """
+        params = ctx.params
+        directory = None if params.get('no_cache') else os.path.join(DEFAULT_CACHE_DIR, 'ega_requests')
+        return FileCache(directory, REQUEST_TTL, CREDENTIAL_MAX_BYTES, refresh=params.get('refresh', False))
+
     def download(self, session, staging, ctx):
         """
         Function that manages client download calls, cleans up downloaded files, and passes updated session info
-        between each process.
+        between each process.  Repositories are downloaded one after another unless parallel_repos is above one.
         """
         params = ctx.params
         output = params['output']
+        self.verify_checksums = not params.get('no_verify', False)
+        if params.get('staging_size') or params.get('staging'):  # otherwise staging shares the output filesystem
+            self.capacity = StagingCapacity(staging, (params.get('staging_size') or 0) * 1024 * 1024)
+        else:
+            self.capacity = None
+        self.schedule = params.get('schedule') or 'manifest'
+        self.client_processes = params.get('client_processes') or 1
+        self.client_batch = params.get('client_batch') or CLIENT_BATCH
+        jobs = self.download_jobs(params, self.request_cache(ctx))
+        parallel_repos = params.get('parallel_repos') or 1
+
+        started = self.start_verifier()
+        try:
+            if params.get('queue'):
+                queue = WorkQueue(queue_directory(params['queue'], params['ids'], params['repos']))
+                self.queue_download(jobs, session, staging, output, queue, params.get('queue_batch') or QUEUE_BATCH)
+            elif parallel_repos > 1:
+                self.parallel_download(jobs, session, staging, output, parallel_repos)
+            else:
+                for repo, token, path, client, transport_parallel, options in jobs:
+                    self.client_download(repo, token, path, client, session, staging, output, transport_parallel,
+                                         **options)
+        finally:
+            if started:
+                self.stop_verifier()
+        return session
+
+    def start_verifier(self):
+        """
+        Starts the verifier shared by every repository and client batch, if checksums are verified and none is running.
+        Called on the main thread before any worker starts, so that its processes are never forked by a worker thread.
+        :return: True if a verifier was started, to be stopped by the caller with stop_verifier
+        """
+        if not self.verify_checksums or self.verifier:
+            return False
+        self.verifier = Verifier()
+        return True
 
-        self.client_download('aws-virginia', params['icgc_token'], params['icgc_path'], self.icgc_client, session,
-                             staging, output, params['icgc_transport_parallel'], code='aws',
-                             transport_file_from=params['icgc_transport_file_from'])
+    def stop_verifier(self):
+        self.verifier.close()
+        self.verifier = None
 
-        self.client_download('collaboratory', params['icgc_token'], params['icgc_path'], self.icgc_client, session,
-                             staging, output, params['icgc_transport_parallel'], code='collab',
-                             transport_file_from=params['icgc_transport_file_from'])
+    def download_jobs(self, params, request_cache=None):
+        """
+        Builds the arguments of client_download for every repository, in download order
+        :param params:
+        :param request_cache: cache of EGA download requests
+        :return: list of (repo, token, path, client, transport_parallel, options) tuples
+        """
+        return [('aws-virginia', params['icgc_token'], params['icgc_path'], self.icgc_client,
+                 params['icgc_transport_parallel'],
+                 {'code': 'aws', 'transport_file_from': params['icgc_transport_file_from']}),
+                ('collaboratory', params['icgc_token'], params['icgc_path'], self.icgc_client,
+                 params['icgc_transport_parallel'],
+                 {'code': 'collab', 'transport_file_from': params['icgc_transport_file_from']}),
+                ('gdc', params['gdc_token'], params['gdc_path'], self.gdc_client, params['gdc_transport_parallel'],
+                 {'udt': params['gdc_udt']}),
+                ('ega', params['ega_username'], params['ega_path'], self.ega_client, params['ega_transport_parallel'],
+                 {'udt': params['ega_udt'], 'password': params['ega_password'],
+                  'request_batch': params.get('ega_request_batch'), 'request_cache': request_cache}),
+                ('pdc', params['pdc_key'], params['pdc_path'], self.pdc_client, params['pdc_transport_parallel'],
+                 {'secret_key': params['pdc_secret']})]
 
-        self.client_download('gdc', params['gdc_token'], params['gdc_path'], self.gdc_client, session, staging,
-                             output, params['gdc_transport_parallel'], udt=params['gdc_udt'])
+    def queue_download(self, jobs, session, staging, output, queue, batch):
+        """
+        Downloads batches of files claimed from a work queue shared with other nodes until every file of the session is
+        in the queue's ledger.  Repositories are worked through one after another.  While the remaining files are
+        claimed by other nodes the queue is polled, so that files held by nodes that stop responding are taken over.
+        :param jobs: output of download_jobs
+        :param session:
+        :param staging:
+        :param output:
+        :param queue: WorkQueue
+        :param batch: number of files claimed at a time
+        :return:
+        """
+        file_data = session['file_data']
+        for repo, files in file_data.iteritems():  # files finished by an earlier run of this node
+            queue.complete(repo, [file_id for file_id, file_object in files.iteritems()
+                                  if file_object['state'] == 'Finished'])
+        queue.start()
+        try:
+            while True:
+                claimed = False
+                for repo, token, path, client, transport_parallel, options in jobs:
+                    if not file_data.get(repo):
+                        continue
+                    file_ids = queue.claim(repo, schedule_files(file_data[repo], self.schedule), batch)
+                    if not file_ids:
+                        continue
+                    claimed = True
+                    self.logger.info('Claimed %s from the %s queue', ' '.join(file_ids), repo)
+                    files = OrderedDict((file_id, file_data[repo][file_id]) for file_id in file_ids)
+                    try:
+                        self.client_download(repo, token, path, client, session, staging, output, transport_parallel,
+                                             files=files, **options)
+                    except (click.ClickException, click.Abort):
+                        self.publish(queue, repo, files, [file_id for file_id in file_ids
+                                                          if files[file_id]['state'] == 'Finished'])
+                        raise
+                    self.publish(queue, repo, files, file_ids)
+                if not claimed:
+                    pending = queue.pending(file_data)
+                    if not pending:
+                        break
+                    self.logger.info('Waiting on %s files claimed by other nodes', pending)
+                    time.sleep(POLL_INTERVAL)
+        finally:
+            queue.stop()
 
-        self.client_download('ega', params['ega_username'], params['ega_path'], self.ega_client, session, staging,
-                             output, params['ega_transport_parallel'], udt=params['ega_udt'],
-                             password=params['ega_password'])
+    @staticmethod
+    def publish(queue, repo, files, finished):
+        """
+        Publishes the finished files of a claimed batch to the queue's ledger and gives the rest back to the queue
+        :param queue:
+        :param repo:
+        :param files: file data of the batch
+        :param finished: ids of the files that were downloaded
+        :return:
+        """
+        queue.complete(repo, finished, dict((file_id, files[file_id]['size']) for file_id in finished))
+        queue.release([queue.key(repo, file_id) for file_id in files if file_id not in finished])
 
-        self.client_download('pdc', params['pdc_key'], params['pdc_path'], self.pdc_client, session, staging, output,
-                             params['pdc_transport_parallel'], secret_key=params['pdc_secret'])
-        return session
+    def parallel_download(self, jobs, session, staging, output, parallel_repos):
+        """
+        Runs the download of each repository in its own worker, each with its own client, staging subdirectory and
+        slice of the session.  The slices are merged back into the session through the state writer shared by all
+        workers.  A failed repository does not stop the others; a summary of every repository is logged once all
+        workers are done.
+        :param jobs: output of download_jobs
+        :param session:
+        :param staging:
+        :param output:
+        :param parallel_repos: maximum number of repositories downloading at once
+        :return:
+        """
+        jobs = [job for job in jobs if job[0] in session['file_data'] and session['file_data'][job[0]]]
+        if not jobs:
+            return
+        started = self.start_verifier()
+        pool = ThreadPool(min(parallel_repos, len(jobs)))
+        results = []
+        failed = []
+        try:
+            for repo, token, path, client, transport_parallel, options in jobs:
+                repo_client = self.new_client(client, repo)
+                repo_client.state = SliceWriter(repo_client.state, session, repo)
+                repo_staging = os.path.join(staging, repo)
+                if not os.path.exists(repo_staging):
+                    os.mkdir(repo_staging, 0777)
+                args = (repo, token, path, repo_client, session_slice(session, repo), repo_staging, output,
+                        transport_parallel, options)
+                results.append((repo, pool.apply_async(self.repo_worker, args)))
+            pool.close()
+
+            for repo, result in results:
+                error = result.get(REPO_TIMEOUT)
+                if error:
+                    failed.append(repo)
+                    self.logger.error('Download from %s failed: %s', repo, error)
+                else:
+                    self.logger.info('Download from %s completed successfully.', repo)
+            pool.join()
+        finally:
+            if started:
+                self.stop_verifier()
+        if failed:
+            raise click.ClickException('Downloads failed for: {}'.format(', '.join(failed)))
+
+    def repo_worker(self, repo, token, path, client, session, staging, output, transport_parallel, options):
+        """
+        Worker for parallel_download.  Runs a single repository's download and returns an error message instead of
+        raising, so that other repositories keep running.
+        :return: None on success, otherwise a description of the failure
+        """
+        try:
+            self.client_download(repo, token, path, client, session, staging, output, transport_parallel, **options)
+        except click.ClickException as ex:
+            return ex.format_message()
+        except click.Abort:
+            return 'aborted'
+        except Exception as ex:
+            self.logger.exception(ex)
+            return str(ex)
+        finally:
+            try:
+                os.rmdir(staging)
+            except OSError:
+                pass
+        return None
+
+    def new_client(self, client, repo):
+        """
+        Creates a fresh client of the same type for use by a single repository worker, with its own docker cidfile.
+        The new client writes state through the same writer as the client it is made from.
+        :param client:
+        :param repo:
+        :return:
+        """
+        repo_client = type(client)(json_path=self.json_path, docker=self.docker, log_dir=self.log_dir,
+                                   container_version=self.container_version)
+        repo_client.state = client.state
+        if repo_client.cidfile:
+            repo_client.cidfile = repo_client.cidfile + '-' + repo
+        return repo_client
 
     def check_code(self, client, code):
         """
@@ -160,7 +430,8 @@ class DownloadDispatcher(object):
         self.move_files(staging, output)
 
     def client_download(self, repo, token, path, client, session, staging, output, transport_parallel,
-                        transport_file_from=None, code=None, udt=True, password="Default", secret_key="Default"):
+                        transport_file_from=None, code=None, udt=True, password="Default", secret_key="Default",
+                        request_batch=None, request_cache=None, files=None):
         """
         Generalized function handling argument verification, parsing, and cleanup for download from client
         :param repo:
@@ -176,30 +447,224 @@ class DownloadDispatcher(object):
         :param udt:
         :param password:
         :param secret_key:
+        :param request_batch: objects per EGA request call
+        :param request_cache: cache of EGA download requests
+        :param files: file data of the files to download, defaults to all of the repository's files
         :return:
         """
         file_data = session['file_data']
         if repo in file_data and file_data[repo]:
             check_access(self, token, repo, client.docker, path, udt, secret_key)
-            self.icgc_client.session = session
+            client.session = session
+            if request_batch:
+                client.request_batch = request_batch
+            if request_cache is not None:
+                client.request_cache = request_cache
             if repo == 'ega' and transport_parallel != '1':
                 self.logger.warning('Parallel streams on the EGA client may cause reliability issues and failed ' +
                                     'downloads.  This option is not recommended.')
-            if repo == 'pdc':
-                uuids = []
-                for object_id in file_data[repo]:
-                    uuids.append(file_data[repo][object_id]['fileUrl'])
-            else:
-                uuids = self.get_uuids(file_data[repo])
+            options = {'repo': code, 'udt': udt, 'file_from': transport_file_from, 'password': password,
+                       'secret_key': secret_key}
+            files = self.schedule_files(repo, file_data[repo] if files is None else files, transport_parallel)
+            started = self.start_verifier()
+            try:
+                for attempt in range(1, VERIFY_ATTEMPTS + 1):
+                    failed = self.staged_transfer(repo, files, token, path, client, session, staging, output,
+                                                  transport_parallel, self.verifier, options)
+                    if not failed:
+                        break
+                    files = self.schedule_files(repo, dict((file_id, file_data[repo][file_id]) for file_id in failed),
+                                                transport_parallel)
+                    if attempt < VERIFY_ATTEMPTS:
+                        self.logger.info('Downloading files that failed verification again: %s', ' '.join(failed))
+            finally:
+                if started:
+                    self.stop_verifier()
+            if failed:
+                raise click.ClickException('Files failed verification: {}'.format(', '.join(failed)))
+
+    def schedule_files(self, repo, files, transport_parallel):
+        """
+        Orders a repository's files with the configured schedule and logs how busy the client's streams are predicted
+        to be, from the manifest sizes
+        :param repo:
+        :param files: file data keyed by file id
+        :param transport_parallel: number of parallel streams of the client
+        :return: OrderedDict of the file data in download order
+        """
+        streams = int(transport_parallel) if str(transport_parallel).isdigit() else 1
+        files = schedule_files(files, self.schedule, streams)
+        utilisation, tail = tail_utilisation(stream_loads([file_object['size'] for file_object in files.values()],
+                                                          streams))
+        self.logger.info('Scheduled %s files from %s in %s order on %s streams: predicted utilisation %.1f%%, ' +
+                         'idle tail %.1f%% of transfer time', len(files), repo, self.schedule, streams,
+                         utilisation * 100, tail * 100)
+        return files
+
+    def staged_transfer(self, repo, files, token, path, client, session, staging, output, transport_parallel,
+                        verifier, options):
+        """
+        Runs transfer on batches of files that fit in the staging capacity, claiming the space of each batch.  The space
+        of a file is returned as soon as it is moved out of staging, the rest once the batch is done.
+        :return: sorted ids of files that failed verification
+        """
+        if not self.capacity:
+            return self.batched_transfer(repo, files, token, path, client, session, staging, output,
+                                         transport_parallel, verifier, options)
+        failed = []
+        for batch in self.capacity.batches(files):
+            self.capacity.reserve_files(repo, batch)
+            try:
+                failed.extend(self.batched_transfer(repo, batch, token, path, client, session, staging, output,
+                                                    transport_parallel, verifier, options))
+            finally:
+                self.capacity.release_files(repo, batch)
+        return sorted(failed)
 
-            fids = self.get_fids(file_data[repo])
-            start_string = '************************************************************************************\n' + \
-                           'Starting download(s) for files: %s from: %s ' + \
-                           '\n************************************************************************************'
-            self.logger.info(start_string, fids, repo)
-            return_code = client.download(uuids, token, path, staging, transport_parallel, repo=code, udt=udt,
-                                          file_from=transport_file_from, password=password, secret_key=secret_key)
-            self.cleanup(repo, return_code, staging, output)
+    def batched_transfer(self, repo, files, token, path, client, session, staging, output, transport_parallel,
+                         verifier, options):
+        """
+        Splits files into batches of nearly equal size, of at most client_batch files each, and runs transfer on each
+        batch in its own client process, client_processes at a time.  Every batch has its own client and staging
+        subdirectory, and queues its checks on the shared verifier.  A failed batch does not stop the others; the return
+        of every batch is logged once all are done.
+        :return: sorted ids of files that failed verification
+        """
+        processes = min(self.client_processes, len(files))
+        if processes <= 1 and len(files) <= self.client_batch:
+            return self.transfer(repo, files, token, path, client, session, staging, output, transport_parallel,
+                                 verifier, options)
+        bins = balanced_bins(dict((file_id, file_object['size']) for file_id, file_object in files.iteritems()),
+                             processes, limit=self.client_batch)
+        pool = ThreadPool(max(processes, 1))
+        results = []
+        for index, file_ids in enumerate(bins, 1):
+            file_ids = set(file_ids)
+            batch = OrderedDict((file_id, file_object) for file_id, file_object in files.iteritems()
+                                if file_id in file_ids)
+            args = (repo, index, batch, token, path, client, session, staging, output, transport_parallel,
+                    verifier, options)
+            results.append((index, batch, pool.apply_async(self.batch_worker, args)))
+        pool.close()
+
+        failed = []
+        errors = []
+        durations = []
+        for index, batch, result in results:
+            batch_failed, error, seconds = result.get(REPO_TIMEOUT)
+            durations.append(seconds)
+            self.logger.info('Batch %s of %s from %s: %s files, %s, %s', index, len(bins), repo, len(batch),
+                             ''.join(convert_size(sum(file_object['size'] for file_object in batch.values()))),
+                             error or 'completed')
+            if error:
+                errors.append(index)
+            failed.extend(batch_failed)
+        pool.join()
+        if len(bins) <= processes:
+            utilisation, tail = tail_utilisation(durations)
+            self.logger.info('Client processes for %s were busy %.1f%% of the time, idle tail %.1f%%', repo,
+                             utilisation * 100, tail * 100)
+        if errors:
+            raise click.ClickException('Client batches failed for {0}: {1}'.format(repo, ', '.join(map(str, errors))))
+        return sorted(failed)
+
+    def batch_worker(self, repo, index, files, token, path, client, session, staging, output, transport_parallel,
+                     verifier, options):
+        """
+        Worker for batched_transfer.  Runs transfer for one batch and returns an error message instead of raising.
+        :return: tuple of the ids of files that failed verification, None on success or otherwise a description of the
+        failure, and the seconds the batch took
+        """
+        start = time.time()
+        batch_client = self.new_client(client, '{0}-{1}'.format(repo, index))
+        batch_client.session = session
+        for setting in ('request_batch', 'request_cache'):
+            if hasattr(client, setting):
+                setattr(batch_client, setting, getattr(client, setting))
+        batch_staging = os.path.join(staging, 'batch-{}'.format(index))
+        if not os.path.exists(batch_staging):
+            os.mkdir(batch_staging, 0777)
+        try:
+            return self.transfer(repo, files, token, path, batch_client, session, batch_staging, output,
+                                 transport_parallel, verifier, options), None, time.time() - start
+        except click.ClickException as ex:
+            return [], ex.format_message(), time.time() - start
+        except click.Abort:
+            return [], 'aborted', time.time() - start
+        except Exception as ex:
+            self.logger.exception(ex)
+            return [], str(ex), time.time() - start
+        finally:
+            try:
+                os.rmdir(batch_staging)
+            except OSError:
+                pass
+
+    def transfer(self, repo, files, token, path, client, session, staging, output, transport_parallel, verifier,
+                 options):
+        """
+        Runs one client download of a repository's files.  Files are placed in the output directory as they complete
+        and, with a verifier, checked against their expected md5 and size while the download carries on.  Files that
+        fail are removed from the output directory and marked Not started.
+        :param repo:
+        :param files: file data of the files to download, keyed by file id
+        :param token:
+        :param path:
+        :param client:
+        :param session:
+        :param staging:
+        :param output:
+        :param transport_parallel:
+        :param verifier: Verifier shared with other transfers, or None to skip verification
+        :param options: remaining arguments of the client's download method
+        :return: sorted ids of files that failed verification
+        """
+        if repo == 'pdc':
+            uuids = []
+            for object_id in files:
+                uuids.append(files[object_id]['fileUrl'])
+        else:
+            uuids = self.get_uuids(files)
+
+        fids = self.get_fids(files)
+        start_string = '************************************************************************************\n' + \
+                       'Starting download(s) for files: %s from: %s ' + \
+                       '\n************************************************************************************'
+        self.logger.info(start_string, fids, repo)
+        checks = verifier.checks() if verifier else None
+        completion = CompletionStage(session, staging, output, client.state, checks,
+                                     self.capacity.release_file if self.capacity else None)
+        client.on_file_complete = completion.submit
+        completion.start()
+        try:
+            return_code = client.download(uuids, token, path, staging, transport_parallel, **options)
+        finally:
+            client.on_file_complete = None
+            completion.close()
+        self.cleanup(repo, return_code, staging, output)
+        placed = completion.placed
+        downloaded = None
+        for file_id, file_object in files.iteritems():
+            if file_object['state'] == 'Downloaded':  # placed by the final move
+                file_object['state'] = 'Finished'
+                if checks:
+                    downloaded = downloaded or get_output_index(output)
+                    file_path = downloaded.path(file_object['fileName'])
+                    if file_path:
+                        placed[(repo, file_id)] = [file_path]
+                        checks.submit((repo, file_id), file_path, file_object.get('fileMd5sum'),
+                                      file_object['size'])
+        if not checks:
+            return []
+
+        failed = []
+        for (_, file_id), error in checks.failures().iteritems():
+            self.logger.error('File %s failed verification: %s', file_id, error)
+            remove_placed(placed.get((repo, file_id), []))
+            files[file_id]['state'] = 'Not started'
+            failed.append(file_id)
+        client.state.update(session)
+        return sorted(failed)
 
     def size_check(self, size, output):
         """
@@ -255,19 +720,19 @@ class DownloadDispatcher(object):
 
     def move_files(self, staging, output):
         """
-        Function that moves files from staging to output and handles errors
+        Function that moves files from staging to output and handles errors.  Entries are moved concurrently.
         :param staging:
         :param output:
         :return:
         """
-        for staged_file in os.listdir(staging):
-
+        staged_files = os.listdir(staging)
+        if len(staged_files) > 1 and MOVES['workers'] > 1:
+            pool = ThreadPool(min(MOVES['workers'], len(staged_files)))
             try:
-                shutil.move(os.path.join(staging, staged_file), output)
-            except shutil.Error:
-                try:
-                    self.logger.info('File %s already present in download directory', staged_file)
-                    os.remove(os.path.join(staging, staged_file))
-                except OSError:
-                    self.logger.error('Insufficient permissions to move files. ' +
-                                      'Please remove .staging from your download directory manually.')
+                pool.map_async(lambda staged_file: move_staged(staging, staged_file, output),
+                               staged_files).get(REPO_TIMEOUT)
+            finally:
+                pool.terminate()
+        else:
+            for staged_file in staged_files:
+                move_staged(staging, staged_file, output)
@@ -20,7 +20,8 @@
 import logging
 from collections import OrderedDict
 from tabulate import tabulate
-from icgcget.clients.utils import convert_size, donor_addition, increment_types, build_table, search_recursive
+from icgcget.clients.output_index import get_output_index
+from icgcget.clients.utils import convert_size, donor_addition, increment_types, build_table
 
 
 class StatusScreenDispatcher(object):
@@ -31,6 +32,18 @@ class StatusScreenDispatcher(object):
     def __init__(self):
         self.logger = logging.getLogger('__log__')
 
+    def cluster_progress(self, file_data, queue):
+        """
+        Updates file data with the progress of every node working from a shared work queue and logs a summary
+        :param file_data:
+        :param queue: WorkQueue of the download
+        :return:
+        """
+        summary = queue.progress(file_data)
+        self.logger.info('Cluster progress: %s of %s files, %s of %s, %s active nodes', summary['finished'],
+                         summary['files'], ''.join(convert_size(summary['finished_bytes'])),
+                         ''.join(convert_size(summary['bytes'])), summary['nodes'])
+
     def summary_table(self, file_data, output, table_format):
         """
         Function that constructs summary style tables out of file data
@@ -50,6 +63,7 @@ class StatusScreenDispatcher(object):
         else:
             headers = ['', 'Size', 'Unit', 'File Count', 'Donor Count']
         summary_table = []
+        downloaded = get_output_index(output)
 
         for repository in repos:
             repo_sizes = OrderedDict({'total': 0})
@@ -60,7 +74,7 @@ class StatusScreenDispatcher(object):
                 size = file_id['size']
 
                 data_type = file_id['dataType']
-                state = search_recursive(file_id['fileName'], output)
+                state = file_id['fileName'] in downloaded
                 type_sizes = increment_types(data_type, type_sizes, size)
                 type_counts = increment_types(data_type, type_counts, 1)
                 repo_sizes = increment_types(data_type, repo_sizes, size)
@@ -90,6 +104,7 @@ class StatusScreenDispatcher(object):
         repos = file_data.keys()
         headers = ['', 'Size', 'Unit', 'File Format', 'Data Type', 'Repo', 'Donor', 'File Name', 'Downloaded']
         file_table = []
+        downloaded = get_output_index(output)
         for repository in repos:
             for file_id in file_data[repository]:
                 data = file_data[repository][file_id]
@@ -99,7 +114,7 @@ class StatusScreenDispatcher(object):
                 else:
                     donor = data['donors'][0]['donorId']
                 data_type = data['dataType']
-                if search_recursive(data['fileName'], output):
+                if data['fileName'] in downloaded:
                     state = 'Yes'
                 else:
                     state = 'No'
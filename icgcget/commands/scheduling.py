@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import hashlib
+import heapq
+from collections import OrderedDict
+
+SCHEDULES = ('manifest', 'largest', 'smallest', 'balanced')
+SHARD_METHODS = ('hash', 'size')
+
+
+def schedule_files(files, policy, streams=1):
+    """
+    Orders a repository's files for download by their manifest sizes.  largest starts the biggest files first so that
+    the transfer does not end waiting on one of them, smallest gets the most files done early, and balanced deals the
+    files into one bin per stream by longest processing time first and interleaves the bins.  manifest keeps the order
+    of the manifest.
+    :param files: file data keyed by file id
+    :param policy: one of SCHEDULES
+    :param streams: number of files the client transfers at once
+    :return: OrderedDict of the file data in download order
+    """
+    file_ids = list(files)
+    if policy == 'largest':
+        file_ids.sort(key=lambda file_id: files[file_id]['size'], reverse=True)
+    elif policy == 'smallest':
+        file_ids.sort(key=lambda file_id: files[file_id]['size'])
+    elif policy == 'balanced':
+        bins = balanced_bins(dict((file_id, files[file_id]['size']) for file_id in file_ids), streams)
+        file_ids = []
+        for rank in range(max(len(file_bin) for file_bin in bins) if bins else 0):
+            file_ids.extend(file_bin[rank] for file_bin in bins if rank < len(file_bin))
+    return OrderedDict((file_id, files[file_id]) for file_id in file_ids)
+
+
+def balanced_bins(sizes, count, keep_empty=False, limit=None):
+    """
+    Splits files into bins of nearly equal total size by placing each file, largest first, in the lightest bin.  Ties
+    are broken by file id and bin number, so the same files always give the same bins.
+    :param sizes: file sizes keyed by file id
+    :param count: number of bins, raised if needed to respect limit
+    :param keep_empty: return all count bins, instead of leaving out empty ones
+    :param limit: maximum number of files in a bin
+    :return: list of lists of file ids, largest file first in each bin
+    """
+    if limit:
+        count = max(count, -(-len(sizes) // limit))
+    heap = [(0, index) for index in range(max(count, 1))]
+    bins = [[] for _ in heap]
+    for file_id in sorted(sizes, key=lambda key: (-sizes[key], key)):
+        load, index = heapq.heappop(heap)
+        bins[index].append(file_id)
+        if not limit or len(bins[index]) < limit:  # full bins are left out of the heap
+            heapq.heappush(heap, (load + sizes[file_id], index))
+    if keep_empty:
+        return bins
+    return [file_ids for file_ids in bins if file_ids]
+
+
+def shard_files(file_data, shard, count, method='hash'):
+    """
+    Keeps the files of one shard of a download, so that several nodes given the same manifest each download a
+    disjoint part of it.  hash assigns files by a digest of their id, size deals them into shards of nearly equal total
+    size.  Either way the split depends only on the file ids and manifest sizes.
+    :param file_data: file data keyed by repository and file id, edited in place
+    :param shard: number of the shard to keep, from 1 to count
+    :param count: number of shards
+    :param method: one of SHARD_METHODS
+    :return: file_data
+    """
+    if method == 'size':
+        sizes = dict(((repo, file_id), file_object['size']) for repo, files in file_data.iteritems()
+                     for file_id, file_object in files.iteritems())
+        keep = set(balanced_bins(sizes, count, keep_empty=True)[shard - 1])
+    else:
+        keep = set((repo, file_id) for repo, files in file_data.iteritems() for file_id in files
+                   if shard_of(file_id, count) == shard)
+    for repo, files in file_data.iteritems():
+        for file_id in [file_id for file_id in files if (repo, file_id) not in keep]:
+            del files[file_id]
+    return file_data
+
+
+def shard_of(file_id, count):
+    """
+    Stable shard number of a file id, the same on every node and python version
+    :param file_id:
+    :param count:
+    :return: shard number from 1 to count
+    """
+    return int(hashlib.md5(file_id).hexdigest()[:15], 16) % count + 1
+
+
+def stream_loads(sizes, streams):
+    """
+    Predicts the bytes each stream transfers when files are started in order on the first idle stream, assuming every
+    stream runs at the same rate
+    :param sizes: file sizes in download order
+    :param streams:
+    :return: list of bytes per stream
+    """
+    heap = [0] * max(streams, 1)
+    for size in sizes:
+        heapq.heapreplace(heap, heap[0] + size)
+    return heap
+
+
+def tail_utilisation(loads):
+    """
+    Measures how well a set of parallel streams or processes was kept busy
+    :param loads: work done by each stream, in bytes or seconds
+    :return: tuple of the fraction of stream time that was used, and the fraction of the elapsed time that at least one
+    stream sat idle at the end
+    """
+    makespan = max(loads) if loads else 0
+    if not makespan:
+        return 1.0, 0.0
+    return float(sum(loads)) / (len(loads) * makespan), float(makespan - min(loads)) / makespan
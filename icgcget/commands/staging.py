@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import logging
+import threading
+from collections import OrderedDict
+
+import psutil
+
+STAGING_FILL = 0.9  # fraction of the free space of a separate staging filesystem used when no size is configured
+WAIT_INTERVAL = 5  # seconds between checks while waiting for staging space
+
+
+class StagingCapacity(object):
+    """
+    Accounts for the staging space claimed by transfers in progress.  Files are handed to clients in batches that fit
+    in the staging capacity, and a batch only starts once enough space has been released by earlier batches, so that
+    concurrent repository downloads never overfill a small scratch directory.
+    """
+
+    def __init__(self, staging, capacity=None):
+        self.logger = logging.getLogger('__log__')
+        self.capacity = capacity or int(psutil.disk_usage(staging).free * STAGING_FILL)
+        self.reserved = 0
+        self.claims = {}
+        self.condition = threading.Condition()
+
+    def batches(self, files):
+        """
+        Splits files into batches that each fit in the staging capacity, keeping their download order.  A file larger
+        than the capacity gets a batch of its own.
+        :param files: file data keyed by file id
+        :return: list of file data dicts
+        """
+        batches = []
+        batch = OrderedDict()
+        batch_size = 0
+        for file_id, file_object in files.iteritems():
+            if batch and batch_size + file_object['size'] > self.capacity:
+                batches.append(batch)
+                batch = OrderedDict()
+                batch_size = 0
+            batch[file_id] = file_object
+            batch_size += file_object['size']
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def reserve(self, size):
+        """
+        Claims staging space, waiting until enough has been released.  A claim larger than the whole capacity is
+        granted once nothing else is staged.
+        :param size: bytes
+        :return:
+        """
+        with self.condition:
+            waiting = False
+            while self.reserved and self.reserved + size > self.capacity:
+                if not waiting:
+                    self.logger.info('Staging directory is full, waiting for %s MB to be released',
+                                     (self.reserved + size - self.capacity) / 1048576)
+                    waiting = True
+                self.condition.wait(WAIT_INTERVAL)
+            self.reserved += size
+
+    def release(self, size):
+        """
+        Returns staging space claimed by reserve
+        :param size: bytes
+        :return:
+        """
+        with self.condition:
+            self.reserved -= size
+            self.condition.notify_all()
+
+    def reserve_files(self, repo, files):
+        """
+        Claims the staging space of a batch of files, so that each file's space can be returned as it leaves staging
+        :param repo:
+        :param files: file data keyed by file id
+        :return:
+        """
+        self.reserve(sum(file_object['size'] for file_object in files.values()))
+        with self.condition:
+            for file_id, file_object in files.iteritems():
+                self.claims[(repo, file_id)] = file_object['size']
+
+    def release_file(self, repo, file_id):
+        """
+        Returns the staging space claimed for a file by reserve_files.  Files without a claim are ignored.
+        :param repo:
+        :param file_id:
+        :return:
+        """
+        with self.condition:
+            size = self.claims.pop((repo, file_id), None)
+            if size is not None:
+                self.release(size)
+
+    def release_files(self, repo, files):
+        """
+        Returns the staging space still claimed for a batch of files
+        :param repo:
+        :param files: file ids
+        :return:
+        """
+        for file_id in files:
+            self.release_file(repo, file_id)
@@ -21,14 +21,17 @@ import re
 import json
 import os
 import logging
-import psutil
 import click
-import yaml
 import signal
 from icgcget.clients import errors
+from icgcget.clients.cache import DEFAULT_CACHE_DIR, cache_key
+from icgcget.clients.state import session_parts
 from icgcget.clients.utils import normalize_keys, flatten_dict
 from icgcget.params import ICGC_REPOS
 
+CONFIG_SETTINGS = ('logfile', 'docker', 'http', 'portal', 'cache', 'move')  # read outside of subcommand options
+CONFIG_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'config')
+
 
 def api_error_catch(self, func, *args):
     try:
@@ -126,7 +129,8 @@ def config_errors(message, default):
 
 def config_parse(filename, default_filename, docker=False, docker_paths=None, empty_ok=False):
     """
-    Parses config.yaml file.  If docker is enabled, will add default docker paths to configuration.
+    Parses config.yaml file.  If docker is enabled, will add default docker paths to configuration.  Parsed
+    configurations are cached as json in the application directory until config.yaml changes.
     :param filename:
     :param default_filename:
     :param docker:
@@ -140,29 +144,111 @@ def config_parse(filename, default_filename, docker=False, docker_paths=None, em
     except IOError as ex:
         config_errors('Config file "{0}" not found: {1}'.format(filename, ex.strerror), default)
         if docker:
-            return {'download': docker_paths, 'report': docker_paths, 'version': docker_paths, 'check': docker_paths}
+            return {'download': docker_paths, 'report': docker_paths, 'version': docker_paths, 'check': docker_paths,
+                    'verify': docker_paths}
         else:
             return {}
-    try:
-        yaml.SafeLoader.add_constructor('tag:yaml.org,2002:python/unicode', constructor)
-        config_temp = yaml.safe_load(config_file)
-        if config_temp:
-            config = flatten_dict(normalize_keys(config_temp))
-            if (docker or ('docker' in config and config['docker'])) and docker_paths:
-                config.update(docker_paths)
-            config = {'download': config, 'report': config, 'version': config, 'check': config}
-            if 'logfile' in config_temp:
-                config['logfile'] = config_temp['logfile']
-            if 'docker' in config_temp:
-                config['docker'] = config_temp['docker']
-        elif empty_ok:
+    with config_file:
+        stamp = config_stamp(config_file, docker, docker_paths)
+        cached = load_cached_config(stamp)
+        if cached is not None:
+            return expand_config(*cached)
+        import yaml  # only loaded once there is a config file to parse, keeps it out of startup otherwise
+        try:
+            config_temp = yaml.load(config_file, Loader=config_loader(yaml))
+        except yaml.YAMLError:
+            return config_errors('Failed to parse config.yaml file "{}". Config must be in YAML format.'
+                                 .format(filename), default)
+    if not config_temp:
+        if empty_ok:
             return {}
-        else:
-            config = config_errors('Config file "{}" is an empty file.'.format(filename), default)
-    except yaml.YAMLError:
-        config = config_errors('Failed to parse config.yaml file "{}". Config must be in YAML format.'.format(filename),
-                               default)
-    return config
+        return config_errors('Config file "{}" is an empty file.'.format(filename), default)
+    config = flatten_dict(normalize_keys(config_temp))
+    if (docker or ('docker' in config and config['docker'])) and docker_paths:
+        config.update(docker_paths)
+    settings = dict((key, config_temp[key]) for key in CONFIG_SETTINGS if key in config_temp)
+    store_cached_config(stamp, config, settings)
+    return expand_config(config, settings)
+
+
+def expand_config(config, settings):
+    """
+    Builds the default map of every subcommand from a flattened configuration
+    :param config: flattened configuration
+    :param settings: sections of config.yaml read outside of subcommand options
+    :return:
+    """
+    expanded = {'download': config, 'report': config, 'version': config, 'check': config, 'verify': config}
+    expanded.update(settings)
+    return expanded
+
+
+def config_loader(yaml):
+    """
+    Returns the fastest safe yaml loader available, the libyaml one if pyyaml was built with it, with the constructor
+    for python unicode tags registered once
+    :param yaml:
+    :return:
+    """
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    if 'tag:yaml.org,2002:python/unicode' not in loader.yaml_constructors:
+        loader.add_constructor('tag:yaml.org,2002:python/unicode', constructor)
+    return loader
+
+
+def config_stamp(config_file, docker, docker_paths):
+    """
+    Identifies a version of config.yaml and the arguments it is parsed with
+    :param config_file: open config.yaml file
+    :param docker:
+    :param docker_paths:
+    :return: json serializable list
+    """
+    stat = os.fstat(config_file.fileno())
+    return [os.path.abspath(config_file.name), stat.st_mtime, stat.st_size, stat.st_ino, bool(docker), docker_paths]
+
+
+def config_cache_path(stamp):
+    return os.path.join(CONFIG_CACHE_DIR, cache_key(stamp[0]) + '.json')
+
+
+def load_cached_config(stamp):
+    """
+    Reads a parsed configuration cached for the same version of config.yaml
+    :param stamp: output of config_stamp
+    :return: tuple of flattened configuration and settings, or None if there is no usable cached configuration
+    """
+    try:
+        with open(config_cache_path(stamp)) as cache_file:
+            cached = json.load(cache_file)
+        if cached['stamp'] == stamp:
+            return cached['config'], cached['settings']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def store_cached_config(stamp, config, settings):
+    """
+    Caches a parsed configuration, writing through a temporary file so that concurrent runs never read partial json.
+    The configuration holds credentials, so the file is only readable by its owner.  Failures are ignored, the
+    configuration is parsed again next time.
+    :param stamp: output of config_stamp
+    :param config: flattened configuration
+    :param settings:
+    :return:
+    """
+    path = config_cache_path(stamp)
+    temp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    try:
+        if not os.path.isdir(CONFIG_CACHE_DIR):
+            os.makedirs(CONFIG_CACHE_DIR, 0700)
+        with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), 'w') as cache_file:
+            json.dump({'stamp': stamp, 'config': config, 'settings': settings}, cache_file)
+        os.rename(temp_path, path)
+    except (IOError, OSError, TypeError, ValueError):
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
 
 
 def constructor(node):
@@ -247,21 +333,24 @@ def load_json(json_path, abort=True):
     if os.path.isfile(json_path):
         try:
             old_download_session = json.load(open(json_path, 'r+'))
+            if abort:
+                import psutil  # only needed to stop an earlier download, kept out of startup otherwise
             if abort and psutil.pid_exists(old_download_session['pid']):
                 logger.error('Download currently in progress')
                 raise click.Abort()
-            for pid in old_download_session['subprocess']:
-                if psutil.pid_exists(pid) and abort:
-                    os.kill(pid, signal.SIGKILL)
-                    try:
-                        os.kill(pid, 0)
-                        print 'Unable to kill client process with pid {}'.format(pid)
-                    except OSError as ex:
-                        if ex.errno == 3:
-                            old_download_session['subprocess'].remove(pid)
-                            continue
-                        else:
-                            logger.warning(ex.message)
+            for part in session_parts(old_download_session):  # the session and each parallel repository worker
+                for pid in list(part['subprocess']):
+                    if abort and psutil.pid_exists(pid):
+                        os.kill(pid, signal.SIGKILL)
+                        try:
+                            os.kill(pid, 0)
+                            print 'Unable to kill client process with pid {}'.format(pid)
+                        except OSError as ex:
+                            if ex.errno == 3:
+                                part['subprocess'].remove(pid)
+                                continue
+                            else:
+                                logger.warning(ex.message)
             return old_download_session
         except ValueError:
             logger.info('Corrupted download state found.  Cleaning...')
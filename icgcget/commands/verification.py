@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import logging
+from icgcget.clients.checksums import Verifier
+from icgcget.clients.output_index import get_output_index
+from icgcget.clients.utils import convert_size
+from icgcget.commands.reports import StatusScreenDispatcher
+
+
+class VerificationDispatcher(object):
+    """
+    Dispatcher that checks the files of a download directory against their manifest md5s and sizes
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger('__log__')
+
+    def verify(self, file_data, output, table_format, processes=None):
+        """
+        Hashes every file of the manifest found in the output directory on a pool of processes and prints a table of
+        results.
+        :param file_data:
+        :param output:
+        :param table_format: tsv/json/pretty output format
+        :param processes: number of files hashed at once, defaults to the number of cores
+        :return: number of files that are missing or failed verification
+        """
+        downloaded = get_output_index(output)
+        results = {}
+        tasks = []
+        for repo in file_data:
+            for file_id, data in file_data[repo].iteritems():
+                path = downloaded.path(data['fileName'])
+                if path:
+                    tasks.append(((repo, file_id), path, data.get('fileMd5sum'), data['size']))
+                else:
+                    results[(repo, file_id)] = 'Missing'
+        verifier = Verifier(processes)
+        try:
+            for key, error in verifier.check_all(tasks):
+                results[key] = error or 'OK'
+        finally:
+            verifier.close()
+
+        headers = ['', 'Size', 'Unit', 'Repo', 'File Name', 'Status']
+        table = []
+        for repo, file_id in sorted(results):
+            data = file_data[repo][file_id]
+            file_size = convert_size(data['size'])
+            table.append([file_id, file_size[0], file_size[1], repo, data['fileName'], results[(repo, file_id)]])
+        StatusScreenDispatcher().print_table(headers, table, table_format)
+        return len([status for status in results.values() if status != 'OK'])
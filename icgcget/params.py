@@ -118,6 +118,32 @@ class ReposParam(click.ParamType):
         return repos
 
 
+class ShardParam(click.ParamType):
+    """
+    Custom click parameter for one shard of a download, given as i/N
+    """
+    name = 'shard'
+
+    def convert(self, value, param, ctx):
+        """
+        Function that parses a shard number and count, verifying the shard number is between 1 and the count
+        :param value:
+        :param param:
+        :param ctx:
+        :return: tuple of shard number and count
+        """
+        if isinstance(value, tuple):
+            return value
+        try:
+            shard, count = [int(part) for part in value.split('/')]
+        except ValueError:
+            self.fail('Invalid shard "{}".  Shards are given as i/N, for example 1/4'.format(value), param, ctx)
+        if count < 1 or not 1 <= shard <= count:
+            self.fail('Invalid shard "{}".  The shard number must be from 1 to {}'.format(value, max(count, 1)), param,
+                      ctx)
+        return shard, count
+
+
 class PathParam(click.ParamType):
     """
     Custom parameter to create directory if it doesn't exist.
@@ -25,7 +25,7 @@ setup(name='icgcget',
       description='Universal download client for ICGC data residing in various environments',
       url="https://github.com/icgc/icgc-get",
       packages=find_packages(exclude=['tests']),
-      install_requires=['PyYaml', 'logging', 'click', 'requests[security]', 'psutil', 'tabulate', 'subprocess32',
+      install_requires=['PyYaml', 'logging', 'click', 'requests[security]>=2.10.0', 'psutil', 'tabulate', 'subprocess32',
                         'certifi'],
       setup_requires=['pytest-runner'],
       tests_require=['pytest'],
@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Downloads a manifest of mixed file sizes through a fake client process that transfers at a fixed rate, as a single
+score-client or gdc-client does when it can't fill the network on its own, with one and with several concurrent client
+processes.  Run with `python -m tests.benchmarks.bench_client_batches [files] [rate_mb]`.
+"""
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from icgcget.clients.state import get_state_writer
+from icgcget.commands.download import DownloadDispatcher
+from tests.fixtures.helpers import file_object
+
+PROCESS_COUNTS = [1, 2, 4, 8]
+FAKE_CLIENT = """
+import os, sys, time
+staging, rate = sys.argv[1], float(sys.argv[2])
+for uuid in sys.argv[3:]:
+    size = int(uuid.split('-')[1])
+    time.sleep(size / rate)
+    with open(os.path.join(staging, uuid), 'wb') as staged:
+        staged.truncate(size)
+"""
+
+
+class FakeClient(object):
+    """Client whose every process transfers at a fixed rate"""
+    rate = 64 * 1024 * 1024
+
+    def __init__(self, json_path=None, docker=False, log_dir=None, container_version=''):
+        self.docker = docker
+        self.cidfile = None
+        self.session = {}
+        self.state = get_state_writer(None)
+        self.on_file_complete = None
+
+    def download(self, uuids, access, tool_path, staging, processes, udt=None, file_from=None, repo=None,
+                 password=None, secret_key=None):
+        return subprocess.call([sys.executable, '-c', FAKE_CLIENT, staging, str(self.rate)] + uuids)
+
+
+def file_data(files):
+    random.seed(files)
+    sizes = [random.choice([1, 2, 4, 8, 64]) * 1024 * 1024 for _ in range(files)]
+    return dict(('FI{}'.format(i), file_object('{0}-{1}'.format(i, size), size=size)) for i, size in enumerate(sizes))
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    FakeClient.rate = float(sys.argv[2] if len(sys.argv) > 2 else 64) * 1024 * 1024
+    total = sum(data['size'] for data in file_data(files).values()) / 1024.0 / 1024
+    print 'Downloading {0} files, {1:.0f} MB, at {2:.0f} MB/s per client process'.format(files, total,
+                                                                                     FakeClient.rate / 1024 / 1024)
+    for processes in PROCESS_COUNTS:
+        root = tempfile.mkdtemp()
+        try:
+            staging = os.path.join(root, '.staging')
+            os.mkdir(staging)
+            dispatcher = DownloadDispatcher()
+            dispatcher.client_processes = processes
+            dispatcher.verify_checksums = False
+            session = {'file_data': {'gdc': file_data(files)}}
+            start = time.time()
+            dispatcher.client_download('gdc', 'token', 'Default', FakeClient(), session, staging, root, '1')
+            seconds = time.time() - start
+            print '{0:2} client processes {1:8.3f}s {2:9.1f} MB/s'.format(processes, seconds, total / seconds)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Fetches file metadata for a large list of file ids from the local stub server, with latency injected into every
+response, for a range of worker counts.  Run with `python -m tests.benchmarks.bench_metadata_fetch [latency]`.
+"""
+
+import sys
+import threading
+import time
+
+from icgcget.clients.portal_client import IcgcPortalClient
+from tests.fixtures import stub_server
+
+PORT = 8123
+FILES = 2000
+WORKER_COUNTS = [1, 2, 4, 8, 16]
+KNOWN_IDS = ['FI250134', 'FI99990', 'FI99996', 'FI99994', 'FI98765', 'FI87654', 'FI76543', 'FI65432']
+
+
+class QuietHandler(stub_server.ServerHandler):
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    stub_server.ServerHandler.latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+    server = stub_server.ThreadedServer(('localhost', PORT), QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    api_url = 'http://localhost:{}/'.format(PORT)
+    file_ids = [KNOWN_IDS[i % len(KNOWN_IDS)] for i in range(FILES)]
+    print '{0} file ids, {1}s latency per request'.format(FILES, stub_server.ServerHandler.latency)
+    for workers in WORKER_COUNTS:
+        portal = IcgcPortalClient(verify=False, workers=workers)
+        start = time.time()
+        entities = portal.get_metadata_bulk(file_ids, api_url)
+        print '{0:3d} workers {1:8.2f}s {2} entities'.format(workers, time.time() - start, len(entities))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Measures staging to output throughput of the legacy one-at-a-time shutil.move against the move engine with concurrent
+moves.  Run with `python -m tests.benchmarks.bench_move [files] [size_mb] [fsync]`.  Both a same-device setup (tmpfs to
+tmpfs) and a cross-device setup (tmpfs staging to an output directory under the system temp directory) are measured.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+from icgcget.clients.moves import move_path, MOVES
+
+SHM = '/dev/shm'
+
+
+def legacy_move(staging, output):
+    for name in os.listdir(staging):
+        shutil.move(os.path.join(staging, name), output)
+
+
+def engine_move(pool, staging, output, fsync):
+    pool.map(lambda name: move_path(os.path.join(staging, name), os.path.join(output, name), fsync),
+             os.listdir(staging))
+
+
+def stage_files(staging, files, size):
+    block = os.urandom(1024 * 1024)
+    for i in range(files):
+        with open(os.path.join(staging, 'file{0}.bam'.format(i)), 'wb') as staged:
+            for _ in range(size):
+                staged.write(block)
+
+
+def measure(name, mover, staging_root, output_root, files, size):
+    staging = tempfile.mkdtemp(dir=staging_root)
+    output = tempfile.mkdtemp(dir=output_root)
+    try:
+        stage_files(staging, files, size)
+        start = time.time()
+        mover(staging, output)
+        seconds = time.time() - start
+        same = os.stat(staging).st_dev == os.stat(output).st_dev
+        print '{0:28} {1:13} {2:8.3f}s {3:9.1f} MB/s'.format(name, 'same-device' if same else 'cross-device',
+                                                           seconds, files * size / seconds)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.rmtree(output, ignore_errors=True)
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    fsync = sys.argv[3] if len(sys.argv) > 3 else 'none'
+    staging_root = SHM if os.access(SHM, os.W_OK) else tempfile.gettempdir()
+    print 'Moving {0} files of {1} MB, {2} workers, fsync {3}'.format(files, size, MOVES['workers'], fsync)
+    pool = ThreadPool(MOVES['workers'])
+    try:
+        for output_root in (staging_root, tempfile.gettempdir()):
+            measure('shutil.move', legacy_move, staging_root, output_root, files, size)
+            measure('move engine', lambda staging, output: engine_move(pool, staging, output, fsync), staging_root,
+                    output_root, files, size)
+    finally:
+        pool.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Replays a multi-megabyte download client transcript through the legacy byte-at-a-time reader and the chunked
+read_lines reader.  Run with `python -m tests.benchmarks.bench_output_reader [transcript]`; a synthetic score-client
+transcript with carriage return progress bars is generated when no transcript file is given.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from icgcget.clients.utils import read_lines
+
+
+def legacy_reader(stream, parser):
+    output = ''
+    while True:
+        char = stream.read(1)
+        if not char:
+            break
+        if (char == '\n' or char == '\r') and output:
+            parser(output)
+            output = ''
+        else:
+            output += char
+
+
+def chunked_reader(stream, parser):
+    for line in read_lines(stream):
+        parser(line)
+
+
+def synthetic_transcript(path, files=400, updates=500):
+    with open(path, 'w') as transcript:
+        for i in range(files):
+            transcript.write('Downloading (a5a6d87b-e599-528b-aea0-{0:012d}.bam)...\n'.format(i))
+            for step in range(updates):
+                transcript.write('\r\x1b[32m[{0:3d}%]\x1b[0m {1} MB/s, parts {2}/{3}'
+                                 .format(step * 100 / updates, 42.7, step, updates))
+            transcript.write('\nFinished download of {0}\n'.format(i))
+
+
+def replay(reader, path):
+    lines = []
+    process = subprocess.Popen(['cat', path], stdout=subprocess.PIPE)
+    reader(process.stdout, lines.append)
+    process.wait()
+    return len(lines)
+
+
+def main():
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = tempfile.mktemp(suffix='.log')
+        synthetic_transcript(path)
+    size = os.path.getsize(path)
+    print 'Transcript: {0} ({1:.1f} MB)'.format(path, size / 1048576.0)
+    for name, reader in [('legacy', legacy_reader), ('chunked', chunked_reader)]:
+        seconds = min(timeit.repeat(lambda: replay(reader, path), number=1, repeat=3))
+        print '{0:8} {1:8.3f}s {2:8.1f} MB/s {3} lines'.format(name, seconds, size / 1048576.0 / seconds,
+                                                              replay(reader, path))
+    if len(sys.argv) == 1:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
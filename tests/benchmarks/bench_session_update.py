@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Measures the cost of a single DownloadClient.session_update call against synthetic sessions of growing size, comparing
+the previous full scan of file_data with the indexed lookup.  Run with `python -m tests.benchmarks.bench_session_update`.
+"""
+
+import timeit
+
+from icgcget.clients.icgc.storage_client import StorageClient
+
+SESSION_SIZES = [1000, 10000, 50000]
+UPDATES = 200
+
+
+def synthetic_session(files):
+    file_data = {'collaboratory': {}}
+    for i in range(files):
+        file_data['collaboratory']['FI{}'.format(i)] = {'uuid': '{0:08d}-0000-0000-0000-000000000000'.format(i),
+                                                        'state': 'Not started', 'fileName': 'file{}.bam'.format(i),
+                                                        'index_filename': 'file{}.bam.bai'.format(i),
+                                                        'fileUrl': 'None', 'size': 1024}
+    return {'pid': 0, 'subprocess': [], 'container': 0, 'command': [], 'file_data': file_data}
+
+
+def scan_update(session, file_name, repo):
+    for name, file_object in session['file_data'][repo].iteritems():
+        if file_object['index_filename'] == file_name or file_object['fileName'] == file_name or \
+                        file_object['fileUrl'] == file_name:
+            file_object['state'] = 'Running'
+        elif file_object['state'] == 'Running':
+            file_object['state'] = 'Finished'
+
+
+def per_update(update, files):
+    names = ['file{}.bam'.format(i * files / UPDATES) for i in range(UPDATES)]
+
+    def run():
+        for name in names:
+            update(name)
+    return min(timeit.repeat(run, number=1, repeat=3)) / UPDATES
+
+
+def main():
+    print '{0:>8} {1:>14} {2:>14}'.format('files', 'scan (us)', 'indexed (us)')
+    for files in SESSION_SIZES:
+        session = synthetic_session(files)
+        scan = per_update(lambda name: scan_update(session, name, 'collaboratory'), files)
+
+        client = StorageClient()
+        client.session = synthetic_session(files)
+        client.session_update('', 'collaboratory')  # builds the index outside of the timed loop
+        indexed = per_update(lambda name: client.session_update(name, 'collaboratory'), files)
+        print '{0:8d} {1:14.1f} {2:14.1f}'.format(files, scan * 1e6, indexed * 1e6)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Measures the start up of the icgc-get command line: the median wall time of running each command's help in a fresh
+interpreter, as a multiple of the bare interpreter's start up, and the slowest imports of each, timed like python 3's
+-X importtime.  Kept out of the test suite, which only checks which modules start up imports, since wall times depend
+on the machine.  Run with
+`python -m tests.benchmarks.bench_startup [runs]`.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = [['--help'], ['download', '--help'], ['report', '--help'], ['check', '--help'], ['verify', '--help'],
+            ['version', '--help']]
+IMPORT_TIMES = """
+import __builtin__, json, sys, time
+times = {}
+original = __builtin__.__import__
+def timed_import(name, *args, **kwargs):
+    top = name.split('.')[0]
+    if top in sys.modules or top in times:
+        return original(name, *args, **kwargs)
+    start = time.time()
+    try:
+        return original(name, *args, **kwargs)
+    finally:
+        times[top] = time.time() - start
+__builtin__.__import__ = timed_import
+import icgcget.cli
+try:
+    icgcget.cli.cli.main(args=sys.argv[1:], prog_name='icgc-get')
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(times))
+"""
+
+
+def wall_time(command, env):
+    start = time.time()
+    subprocess.call(command, stdout=open(os.devnull, 'w'), env=env)
+    return time.time() - start
+
+
+def median(command, env, runs):
+    times = sorted(wall_time(command, env) for _ in range(runs))
+    return times[len(times) // 2]
+
+
+def import_times(args, env):
+    process = subprocess.Popen([sys.executable, '-c', IMPORT_TIMES] + args, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, env=env)
+    _, err = process.communicate()
+    return json.loads(err.splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    home = tempfile.mkdtemp()
+    env = dict((key, value) for key, value in os.environ.items() if not key.startswith('ICGCGET_'))
+    env['HOME'] = home  # no config file
+    try:
+        baseline = median([sys.executable, '-c', 'pass'], env, runs)
+        print '{0:20} {1:7.3f}s'.format('(interpreter)', baseline)
+        for args in COMMANDS:
+            measure(['--logfile', os.path.join(home, 'icgc-get.log'), '--docker', 'false'] + args, env, runs, baseline)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+
+def measure(args, env, runs, baseline):
+    seconds = median([sys.executable, '-m', 'icgcget.cli'] + args, env, runs)
+    slowest = sorted(import_times(args, env).items(), key=lambda item: item[1], reverse=True)[:5]
+    print '{0:20} {1:7.3f}s {2:5.1f}x  {3}'.format(' '.join(args[4:]), seconds, seconds / baseline,
+                                                  ', '.join('{0} {1:.1f}ms'.format(name, seconds * 1000)
+                                                            for name, seconds in slowest))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import os
+import stat
+import threading
+from collections import OrderedDict
+
+from tests.fixtures.stub_server import ThreadedServer
+
+
+def install_tool(tmpdir, name, script, monkeypatch=None):
+    """Writes an executable stand in for a client tool, first on the PATH when given monkeypatch"""
+    tool = tmpdir.join(name)
+    tool.write(script)
+    os.chmod(str(tool), stat.S_IRWXU)
+    if monkeypatch:
+        monkeypatch.setenv('PATH', str(tmpdir) + ':' + os.environ['PATH'])
+    return str(tool)
+
+
+def serve(handler):
+    """Starts a local server for handler on a free port, stopped with shutdown()"""
+    server = ThreadedServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def server_url(server, path=''):
+    return 'http://127.0.0.1:{0}/{1}'.format(server.server_port, path)
+
+
+def file_object(uuid, **fields):
+    """An entry of a session's file data, as calculate_size builds it from the manifest"""
+    entry = {'uuid': uuid, 'state': 'Not started', 'fileName': 'None', 'index_filename': 'None', 'fileUrl': 'None',
+             'size': 1}
+    entry.update(fields)
+    return entry
+
+
+def file_data(repo, count):
+    return dict(('FI{0}{1}'.format(repo, i), file_object('{0}-{1}'.format(repo, i))) for i in range(count))
+
+
+def download_session(files):
+    return {'subprocess': [], 'container': 0, 'containers': [], 'file_data': files}
+
+
+def sized_files(sizes, file_ids=None):
+    """File data holding only sizes, keyed FI0, FI1, ... unless file_ids are given"""
+    file_ids = file_ids or ['FI{}'.format(i) for i in range(len(sizes))]
+    return OrderedDict((file_id, {'size': size}) for file_id, size in zip(file_ids, sizes))
@@ -1,13 +1,17 @@
 import SimpleHTTPServer
 import BaseHTTPServer
+import SocketServer
 from json import dumps, load
+from time import sleep
 import re
 import os
 
 
 class ServerHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    latency = 0  # seconds added to every response, to imitate a remote API
 
     def do_GET(self):
+        sleep(self.latency)
         requestline = self.requestline
         json_dict = parse_id(requestline)
         if json_dict == {}:
@@ -19,9 +23,16 @@ class ServerHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
         self.wfile.write(json)
 
 
-def run():
-    server_address = ('localhost', 8000)
-    httpd = BaseHTTPServer.HTTPServer(server_address, ServerHandler)
+class ThreadedServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def run(port=8000, threaded=False):
+    server_address = ('localhost', port)
+    if threaded:
+        httpd = ThreadedServer(server_address, ServerHandler)
+    else:
+        httpd = BaseHTTPServer.HTTPServer(server_address, ServerHandler)
     httpd.serve_forever()
 
 
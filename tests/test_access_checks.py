@@ -0,0 +1,98 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import BaseHTTPServer
+import time
+import uuid
+
+import click
+import pytest
+
+from icgcget.clients.errors import ApiError
+from icgcget.clients.gdc.gdc_client import GdcDownloadClient
+from icgcget.commands.access_checks import AccessCheck, AccessCheckDispatcher
+from tests.fixtures.helpers import serve, server_url
+
+
+class RecordingDispatcher(AccessCheckDispatcher):
+    def __init__(self, timeout):
+        super(RecordingDispatcher, self).__init__(timeout=timeout)
+        self.responses = []
+
+    def access_response(self, result, repo):
+        self.responses.append((repo, result))
+
+
+def slow_check(delay, result):
+    time.sleep(delay)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def test_checks_run_concurrently_and_report_in_order():
+    dispatcher = RecordingDispatcher(timeout=5)
+    checks = [AccessCheck('collaboratory', 'COLLABORATORY', slow_check, (0.5, True), {}, False),
+              AccessCheck('ega', 'EGA', slow_check, (0.5, ApiError('request', 'down')), {}, False),
+              AccessCheck('gdc', 'GDC', slow_check, (0.1, False), {}, True)]
+    start = time.time()
+    dispatcher.run_checks(checks)
+    assert time.time() - start < 1
+    assert dispatcher.responses == [('COLLABORATORY', True), ('GDC', False)]
+
+
+def test_slow_repository_times_out_alone():
+    dispatcher = RecordingDispatcher(timeout=0.5)
+    checks = [AccessCheck('ega', 'EGA', slow_check, (5, True), {}, False),
+              AccessCheck('aws-virginia', 'AWS-VIRGINIA', slow_check, (0.1, True), {}, False)]
+    start = time.time()
+    dispatcher.run_checks(checks)
+    assert time.time() - start < 1.5
+    assert dispatcher.responses == [('AWS-VIRGINIA', True)]
+
+    with pytest.raises(click.Abort):
+        dispatcher.run_checks([AccessCheck('gdc', 'GDC', slow_check, (5, True), {}, True)])
+
+
+class GdcHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    forbidden = set()
+    requests = []
+
+    def do_HEAD(self):
+        uuids = self.path.rsplit('/', 1)[1].split(',')
+        GdcHandler.requests.append(uuids)
+        self.send_response(403 if GdcHandler.forbidden.intersection(uuids) else 200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_gdc_forbidden_files_are_isolated():
+    server = serve(GdcHandler)
+    files = dict(('FI{}'.format(i), {'uuid': str(uuid.UUID(int=i))}) for i in range(250))
+    GdcHandler.forbidden = set([files['FI7']['uuid'], files['FI201']['uuid']])
+    client = GdcDownloadClient(verify=False)
+    client.data_url = server_url(server, 'data/')
+    try:
+        allowed, forbidden = AccessCheckDispatcher.forbidden_files(client, 'token', files)
+    finally:
+        server.shutdown()
+    assert forbidden == ['FI201', 'FI7']
+    assert len(allowed) == 248
+    assert max(len(batch) for batch in GdcHandler.requests) == 100
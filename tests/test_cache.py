@@ -0,0 +1,138 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import BaseHTTPServer
+import os
+import stat
+import time
+
+import yaml
+
+from icgcget.clients import cache as cache_module
+from icgcget.clients.cache import cache_key, install_secret, FileCache
+from icgcget.clients.ega.ega_client import EgaDownloadClient
+from icgcget.clients.icgc.storage_client import StorageClient
+from icgcget.commands import utils
+from tests.fixtures.helpers import serve, server_url
+
+
+def test_fetch_counts_hits_and_misses(tmpdir):
+    cache = FileCache(str(tmpdir), ttl=60, max_bytes=1024)
+    calls = []
+    key = cache_key('metadata', ['FI1', 'FI2'], 'http://localhost/')
+    for _ in range(3):
+        assert cache.fetch(key, lambda ids: calls.append(ids) or {'hits': ids}, ['FI1']) == {'hits': ['FI1']}
+    assert (cache.hits, cache.misses, len(calls)) == (2, 1, 1)
+    FileCache(str(tmpdir), ttl=60, max_bytes=1024, refresh=True).fetch(key, calls.append, 'refresh')
+    assert calls[-1] == 'refresh'
+
+
+def test_expired_entries_are_ignored(tmpdir):
+    cache = FileCache(str(tmpdir), ttl=60, max_bytes=1024)
+    cache.put('entry', [1, 2, 3])
+    old = time.time() - 120
+    os.utime(str(tmpdir.join('entry.json')), (old, old))
+    assert cache.get('entry') is None
+
+
+def test_oldest_entries_evicted_over_size_limit(tmpdir):
+    cache = FileCache(str(tmpdir), ttl=60, max_bytes=250)
+    for i in range(5):
+        cache.put('entry{}'.format(i), 'x' * 100)
+        os.utime(str(tmpdir.join('entry{}.json'.format(i))), (time.time() - 10 + i, time.time() - 10 + i))
+    assert sorted(os.listdir(str(tmpdir))) == ['entry3.json', 'entry4.json']
+
+
+def test_disabled_cache_always_calls(tmpdir):
+    cache = FileCache(None, ttl=60, max_bytes=1024)
+    assert cache.fetch('key', lambda: 'value') == 'value'
+    assert cache.get('key') is None
+
+
+class TokenHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        TokenHandler.requests += 1
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write('{"scope": ["collab.download"]}')
+
+    def log_message(self, *args):
+        pass
+
+
+def test_token_scopes_cached_without_secret(tmpdir, monkeypatch):
+    monkeypatch.setattr(cache_module, 'SECRET_PATH', str(tmpdir.join('secret')))
+    server = serve(TokenHandler)
+    client = StorageClient(verify=False)
+    client.credential_cache = FileCache(str(tmpdir.mkdir('credentials')), ttl=60, max_bytes=1024)
+    api_url = server_url(server)
+    try:
+        assert client.access_check('secret-token', repo='collab', api_url=api_url)
+        assert not client.access_check('secret-token', repo='aws', api_url=api_url)
+    finally:
+        server.shutdown()
+    assert TokenHandler.requests == 1
+    for name in os.listdir(str(tmpdir.join('credentials'))):
+        assert 'secret-token' not in name and 'secret-token' not in tmpdir.join('credentials', name).read()
+
+
+def test_install_secret_private_and_stable(tmpdir):
+    path = str(tmpdir.join('cache', 'secret'))
+    secret = install_secret(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0600
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0700
+    del cache_module._SECRETS[path]
+    assert install_secret(path) == secret
+
+
+def test_ega_login_cached_by_user_with_password_hmac(tmpdir, monkeypatch):
+    monkeypatch.setattr(cache_module, 'SECRET_PATH', str(tmpdir.join('secret')))
+    logins = []
+    client = EgaDownloadClient()
+    client.credential_cache = FileCache(str(tmpdir.mkdir('credentials')), ttl=60, max_bytes=1024)
+    monkeypatch.setattr(client, 'ega_login', lambda access, password: logins.append(password) or {
+        'datasets': ['EGAD00001000023', 'EGAD00010000562']})
+    for password in ['hunter2', 'hunter2', 'wrong', 'hunter2']:
+        assert client.access_check('user', password=password)
+    assert logins == ['hunter2', 'wrong', 'hunter2']
+    assert len(tmpdir.join('credentials').listdir()) == 1
+    assert 'hunter2' not in tmpdir.join('credentials').listdir()[0].read()
+
+
+def test_parsed_config_cached_until_file_changes(tmpdir, monkeypatch):
+    monkeypatch.setattr(utils, 'CONFIG_CACHE_DIR', str(tmpdir.join('cache', 'config')))
+    config = tmpdir.join('config.yaml')
+    config.write('output: /data\ndocker: false\nhttp:\n  retries: 5\ngdc:\n  token: abc\n')
+    parsed = utils.config_parse(str(config), 'default.yaml')
+    assert parsed['download']['gdc_token'] == 'abc' and parsed['http'] == {'retries': 5}
+    cached = tmpdir.join('cache', 'config').listdir()[0]
+    assert stat.S_IMODE(os.stat(str(cached)).st_mode) == 0600
+    assert stat.S_IMODE(os.stat(str(tmpdir.join('cache'))).st_mode) == 0700
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError('config.yaml parsed again')
+    monkeypatch.setattr(yaml, 'load', no_parse)
+    assert utils.config_parse(str(config), 'default.yaml') == parsed
+
+    monkeypatch.undo()
+    monkeypatch.setattr(utils, 'CONFIG_CACHE_DIR', str(tmpdir.join('cache', 'config')))
+    config.write('output: /data\ndocker: false\ngdc:\n  token: abcdef\n')
+    assert utils.config_parse(str(config), 'default.yaml')['download']['gdc_token'] == 'abcdef'
@@ -0,0 +1,42 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import hashlib
+
+from icgcget.clients.checksums import check_file, file_md5
+from icgcget.commands.verification import VerificationDispatcher
+
+
+def test_check_file_reports_size_and_md5(tmpdir):
+    data = tmpdir.join('file.bam')
+    data.write('x' * 1000)
+    md5 = hashlib.md5('x' * 1000).hexdigest()
+    assert file_md5(str(data), buffer_size=64) == md5
+    assert check_file(('key', str(data), md5.upper(), 1000)) == ('key', None)
+    assert 'size' in check_file(('key', str(data), md5, 999))[1]
+    assert 'md5' in check_file(('key', str(data), '0' * 32, None))[1]
+    assert check_file(('key', str(tmpdir.join('missing')), md5, 1000))[1]
+
+
+def test_verify_directory(tmpdir):
+    tmpdir.mkdir('nested').join('good.bam').write('good')
+    tmpdir.join('bad.bam').write('bad')
+    file_data = {'gdc': {'FI1': {'fileName': 'good.bam', 'size': 4, 'fileMd5sum': hashlib.md5('good').hexdigest()},
+                         'FI2': {'fileName': 'bad.bam', 'size': 3, 'fileMd5sum': hashlib.md5('good').hexdigest()},
+                         'FI3': {'fileName': 'missing.bam', 'size': 1, 'fileMd5sum': None}}}
+    assert VerificationDispatcher().verify(file_data, str(tmpdir), 'tsv', processes=2) == 2
@@ -0,0 +1,52 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+
+from icgcget.clients import containers
+from icgcget.clients.gdc.gdc_client import GdcDownloadClient
+from tests.fixtures.helpers import download_session, install_tool
+
+FAKE_DOCKER = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+if [ "$1" = "run" ]; then
+    echo warmcontainer
+elif [ "$1" = "ps" ]; then
+    echo "stalecontainer 2147483646"
+    echo "livecontainer 1"
+fi
+"""
+
+
+def test_clients_share_warm_container(tmpdir, monkeypatch):
+    install_tool(tmpdir, 'docker', FAKE_DOCKER, monkeypatch)
+    staging = str(tmpdir.mkdir('staging'))
+
+    client = GdcDownloadClient(docker=True, container_version='latest')
+    client.session = download_session({})
+    for _ in range(3):
+        args = client.prepend_docker_args(['gdc-client', 'download'], staging, {'TOKEN': 'abc'})
+        assert args == ['docker', 'exec', '-t', '-e', 'TOKEN=abc', 'warmcontainer', 'gdc-client', 'download']
+        client.log_subprocess(1)
+    assert client.session['containers'] == ['warmcontainer']
+
+    containers.stop_containers()
+    calls = [line.split() for line in tmpdir.join('calls.log').readlines()]
+    assert [call[0] for call in calls] == ['run', 'ps', 'rm']
+    assert '{0}={1}'.format(containers.PID_LABEL, os.getpid()) in calls[0]
+    assert calls[2][2:] == ['warmcontainer', 'stalecontainer']
@@ -0,0 +1,212 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import hashlib
+import json
+import os
+import threading
+
+import click
+import pytest
+
+from icgcget.clients.state import get_state_writer
+from icgcget.clients.work_queue import WorkQueue
+from icgcget.commands import download
+from icgcget.commands.completion import CompletionStage
+from icgcget.commands.download import DownloadDispatcher
+from tests.fixtures.helpers import file_data
+
+
+class FakeClient(object):
+    def __init__(self, json_path=None, docker=True, log_dir=None, container_version=''):
+        self.docker = docker
+        self.cidfile = None
+        self.session = {}
+        self.state = get_state_writer(None)
+        self.on_file_complete = None
+
+    def download(self, uuids, access, tool_path, staging, processes, udt=None, file_from=None, repo=None,
+                 password=None, secret_key=None):
+        if access == 'bad-token':
+            return 1
+        for uuid in uuids:
+            open(os.path.join(staging, uuid), 'w').close()
+        return 0
+
+
+def test_parallel_repos_isolate_failures(tmpdir):
+    staging = tmpdir.mkdir('.staging')
+    output = str(tmpdir)
+    session = {'file_data': {'gdc': file_data('gdc', 2), 'ega': file_data('ega', 1), 'pdc': {}}}
+    client = FakeClient()
+    jobs = [('gdc', 'token', 'Default', client, '1', {}),
+            ('ega', 'bad-token', 'Default', client, '1', {}),
+            ('pdc', 'token', 'Default', client, '1', {})]
+    dispatcher = DownloadDispatcher()
+    with pytest.raises(click.ClickException) as ex:
+        dispatcher.parallel_download(jobs, session, str(staging), output, 3)
+    assert 'ega' in ex.value.message and 'gdc' not in ex.value.message
+    assert os.path.isfile(os.path.join(output, 'gdc-0')) and os.path.isfile(os.path.join(output, 'gdc-1'))
+    assert os.listdir(str(staging)) == []
+
+
+class RecordingClient(FakeClient):
+    """Records the session slice it is given and logs a subprocess id in it"""
+    sessions = {}
+
+    def download(self, uuids, access, tool_path, staging, processes, udt=None, file_from=None, repo=None,
+                 password=None, secret_key=None):
+        RecordingClient.sessions[os.path.basename(staging)] = self.session
+        self.session['subprocess'].append(len(uuids))
+        self.state.write(self.session)
+        return super(RecordingClient, self).download(uuids, access, tool_path, staging, processes)
+
+
+def test_parallel_repos_work_on_session_slices(tmpdir):
+    staging = tmpdir.mkdir('.staging')
+    json_path = str(tmpdir.join('state.json'))
+    session = {'file_data': {'gdc': file_data('gdc', 2), 'pdc': file_data('pdc', 1)}, 'subprocess': [],
+               'container': 0, 'command': ['FI1']}
+    get_state_writer(json_path).write(session)
+    client = RecordingClient()
+    client.state = get_state_writer(json_path)
+    jobs = [('gdc', 'token', 'Default', client, '1', {}), ('pdc', 'token', 'Default', client, '1', {})]
+    DownloadDispatcher(json_path).parallel_download(jobs, session, str(staging), str(tmpdir), 2)
+    assert sorted(RecordingClient.sessions) == ['gdc', 'pdc']
+    for repo, repo_session in RecordingClient.sessions.iteritems():
+        assert repo_session['file_data'].keys() == [repo]
+    get_state_writer(json_path).flush()
+    state = json.load(open(json_path))
+    assert sorted(state['file_data']) == ['gdc', 'pdc'] and state['subprocess'] == []
+    assert dict((repo, part['subprocess']) for repo, part in state['repos'].iteritems()) == {'gdc': [2], 'pdc': [1]}
+
+
+def test_completed_files_placed_before_client_exits(tmpdir):
+    staging = tmpdir.mkdir('.staging')
+    output = tmpdir.mkdir('output')
+    session = {'file_data': {'gdc': file_data('gdc', 2)}}
+    session['file_data']['gdc']['FIgdc0']['fileName'] = 'first.bam'
+    session['file_data']['gdc']['FIgdc0']['index_filename'] = 'first.bam.bai'
+    for name in ('first.bam', 'first.bam.bai', 'gdc-1.part'):
+        staging.join(name).write('')
+    stage = CompletionStage(session, str(staging), str(output), get_state_writer(None))
+    stage.start()
+    stage.submit('gdc', 'FIgdc0')
+    stage.submit('gdc', 'FIgdc1')
+    stage.close()
+    assert sorted(os.listdir(str(output))) == ['first.bam', 'first.bam.bai']
+    assert os.listdir(str(staging)) == ['gdc-1.part']
+    assert session['file_data']['gdc']['FIgdc0']['state'] == 'Finished'
+    assert session['file_data']['gdc']['FIgdc1']['state'] == 'Not started'
+
+
+class CorruptingClient(FakeClient):
+    """Writes a corrupt copy of each file on the first download and a good copy afterwards"""
+    def __init__(self):
+        super(CorruptingClient, self).__init__(docker=False)
+        self.calls = []
+
+    def download(self, uuids, access, tool_path, staging, processes, udt=None, file_from=None, repo=None,
+                 password=None, secret_key=None):
+        self.calls.append(sorted(uuids))
+        for file_id, file_object in self.session['file_data']['gdc'].items():
+            if file_object['uuid'] in uuids:
+                content = 'bad' if len(self.calls) == 1 and file_id == 'FIgdc1' else 'good'
+                open(os.path.join(staging, file_object['fileName']), 'w').write(content)
+                file_object['state'] = 'Downloaded'
+                self.on_file_complete('gdc', file_id)
+        return 0
+
+
+def test_failed_verification_downloaded_again(tmpdir):
+    staging = tmpdir.mkdir('.staging')
+    output = tmpdir.mkdir('output')
+    session = {'file_data': {'gdc': file_data('gdc', 2)}}
+    for file_id, file_object in session['file_data']['gdc'].items():
+        file_object.update({'fileName': file_id + '.bam', 'size': 4, 'fileMd5sum': hashlib.md5('good').hexdigest()})
+    client = CorruptingClient()
+    DownloadDispatcher().client_download('gdc', 'token', 'Default', client, session, str(staging), str(output), '1')
+    assert client.calls == [['gdc-0', 'gdc-1'], ['gdc-1']]
+    assert output.join('FIgdc1.bam').read() == 'good'
+    assert set(data['state'] for data in session['file_data']['gdc'].values()) == {'Finished'}
+
+
+def test_queue_download_skips_files_claimed_elsewhere(tmpdir):
+    staging = tmpdir.mkdir('.staging')
+    output = tmpdir.mkdir('output')
+    session = {'file_data': {'gdc': file_data('gdc', 5)}}
+    other = WorkQueue(str(tmpdir.join('queue')), node='other')
+    assert other.claim('gdc', ['FIgdc3'], 1) == ['FIgdc3']
+    other.complete('gdc', ['FIgdc3'])
+    queue = WorkQueue(str(tmpdir.join('queue')), node='this')
+    jobs = [('gdc', 'token', 'Default', FakeClient(docker=False), '1', {})]
+    DownloadDispatcher().queue_download(jobs, session, str(staging), str(output), queue, 2)
+    assert sorted(os.listdir(str(output))) == ['gdc-0', 'gdc-1', 'gdc-2', 'gdc-4']
+    assert queue.pending(session['file_data']) == 0
+    assert os.listdir(queue.claims_dir) == []
+
+
+class FailingBatchClient(FakeClient):
+    def download(self, uuids, access, tool_path, staging, processes, udt=None, file_from=None, repo=None,
+                 password=None, secret_key=None):
+        if 'gdc-0' in uuids:
+            return 1
+        return super(FailingBatchClient, self).download(uuids, access, tool_path, staging, processes)
+
+
+def test_batches_run_in_separate_client_processes(tmpdir):
+    staging = tmpdir.mkdir('.staging')
+    output = tmpdir.mkdir('output')
+    session = {'file_data': {'gdc': file_data('gdc', 7)}}
+    dispatcher = DownloadDispatcher()
+    dispatcher.client_processes = 3
+    dispatcher.client_batch = 2
+    dispatcher.verify_checksums = False
+    dispatcher.client_download('gdc', 'token', 'Default', FakeClient(docker=False), session, str(staging), str(output),
+                               '1')
+    assert sorted(os.listdir(str(output))) == ['gdc-{}'.format(i) for i in range(7)]
+    assert os.listdir(str(staging)) == []
+
+    session = {'file_data': {'gdc': file_data('gdc', 6)}}
+    output = tmpdir.mkdir('failed')
+    with pytest.raises(click.ClickException) as ex:
+        dispatcher.client_download('gdc', 'token', 'Default', FailingBatchClient(docker=False), session, str(staging),
+                                   str(output), '1')
+    assert 'Client batches failed for gdc' in ex.value.message
+    assert len(os.listdir(str(output))) == 4
+
+
+def test_one_verifier_shared_by_repositories_and_batches(tmpdir, monkeypatch):
+    started = []
+
+    class RecordingVerifier(download.Verifier):
+        def __init__(self, processes=None):
+            started.append(threading.current_thread().name)
+            super(RecordingVerifier, self).__init__(1)
+
+    monkeypatch.setattr(download, 'Verifier', RecordingVerifier)
+    staging = tmpdir.mkdir('.staging')
+    session = {'file_data': {'gdc': file_data('gdc', 4), 'pdc': file_data('pdc', 4)}}
+    client = FakeClient()
+    jobs = [('gdc', 'token', 'Default', client, '1', {}), ('pdc', 'token', 'Default', client, '1', {})]
+    dispatcher = DownloadDispatcher()
+    dispatcher.client_processes = 2
+    dispatcher.client_batch = 1
+    dispatcher.parallel_download(jobs, session, str(staging), str(tmpdir), 2)
+    assert started == [threading.current_thread().name]
+    assert dispatcher.verifier is None
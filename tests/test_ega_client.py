@@ -0,0 +1,120 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+import time
+
+import pytest
+
+from icgcget.clients import cache
+from icgcget.clients.cache import FileCache
+from icgcget.clients.ega.ega_client import EgaDownloadClient
+from tests.fixtures.helpers import download_session, file_object, install_tool
+
+FAKE_JAVA = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -path)
+            for name in $EGA_FILES; do
+                touch "$2/$name.cip"
+                echo "Downloading $2/$name.cip  (1 of 1)"
+                sleep 0.2
+            done
+            touch "$2/unreported.cip"
+            printf -- '-jar - -p - - -nt - dr-done\n' >> "$(dirname "$0")/calls.log" ;;
+    esac
+    shift
+done
+"""
+
+
+@pytest.fixture(autouse=True)
+def install_secret(tmpdir, monkeypatch):
+    monkeypatch.setattr(cache, 'SECRET_PATH', str(tmpdir.join('secret')))
+
+
+def ega_session(object_ids):
+    return download_session({'ega': dict(('FI{}'.format(i), file_object(object_id, fileName=object_id + '.bam'))
+                                         for i, object_id in enumerate(object_ids))})
+
+
+def calls(tmpdir):
+    return [line.split()[7] for line in tmpdir.join('calls.log').readlines()]
+
+
+def decrypted(tmpdir):
+    return sorted(line.split()[8].rsplit('/', 1)[1] for line in tmpdir.join('calls.log').readlines() if ' -dc ' in line)
+
+
+def test_requests_batched_and_reused(tmpdir, monkeypatch):
+    install_tool(tmpdir, 'java', FAKE_JAVA, monkeypatch)
+    monkeypatch.setenv('EGA_FILES', 'EGAF00000000000.bam')
+    staging = tmpdir.mkdir('staging')
+    object_ids = ['EGAF{:011d}'.format(i) for i in range(7)]
+
+    client = EgaDownloadClient()
+    client.request_batch = 5
+    client.request_cache = FileCache(str(tmpdir.mkdir('cache')), ttl=60, max_bytes=1024 * 1024)
+    client.session = ega_session(object_ids)
+    assert client.download(object_ids, 'user', 'ega.jar', str(staging), '1', password='pass') == 0
+    assert calls(tmpdir) == ['-lr', '-rf', '-rf', '-dr', 'dr-done', '-dc']
+    requests = [line for line in tmpdir.join('calls.log').readlines() if '-rf ' in line]
+    assert sum(line.count('-rf ') for line in requests) == 7
+    key = requests[0].split(' -re ')[1].split()[0]
+    for entry in tmpdir.join('cache').listdir():
+        assert key not in entry.read()
+
+    tmpdir.join('calls.log').remove()
+    client.session = ega_session(object_ids)
+    assert client.download(object_ids, 'user', 'ega.jar', str(staging), '1', password='pass') == 0
+    assert calls(tmpdir) == ['-dr', 'dr-done', '-dc']
+
+
+def test_files_decrypted_as_they_arrive(tmpdir, monkeypatch):
+    install_tool(tmpdir, 'java', FAKE_JAVA, monkeypatch)
+    object_ids = ['EGAF{:011d}'.format(i) for i in range(4)]
+    monkeypatch.setenv('EGA_FILES', ' '.join(object_id + '.bam' for object_id in object_ids[:3]))
+    staging = tmpdir.mkdir('staging')
+    for name in ['stale.cip', object_ids[3] + '.bam.cip']:  # left by an earlier run
+        staging.join(name).write('')
+        os.utime(str(staging.join(name)), (time.time() - 3600, time.time() - 3600))
+
+    client = EgaDownloadClient()
+    client.session = ega_session(object_ids)
+    assert client.download(object_ids, 'user', 'ega.jar', str(staging), '1', password='pass') == 0
+    assert decrypted(tmpdir) == [object_id + '.bam.cip' for object_id in object_ids]
+    assert calls(tmpdir).index('-dc') < calls(tmpdir).index('dr-done')
+    files = client.session['file_data']['ega']
+    assert set(files[file_id]['state'] for file_id in ['FI0', 'FI1', 'FI2']) == {'Finished'}
+
+
+def test_decryption_deferred_without_warm_container(tmpdir, monkeypatch):
+    install_tool(tmpdir, 'java', FAKE_JAVA, monkeypatch)
+    object_ids = ['EGAF{:011d}'.format(i) for i in range(3)]
+    monkeypatch.setenv('EGA_FILES', ' '.join(object_id + '.bam' for object_id in object_ids))
+    staging = tmpdir.mkdir('staging')
+
+    client = EgaDownloadClient(docker=True)
+    client.docker_mnt = str(staging)
+    monkeypatch.setattr(client, 'prepend_docker_args', lambda args, mnt=None, envvars=None: args)
+    client.session = ega_session(object_ids)
+    assert client.download(object_ids, 'user', 'ega.jar', str(staging), '1', password='pass') == 0
+    assert decrypted(tmpdir) == [object_id + '.bam.cip' for object_id in object_ids]
+    assert calls(tmpdir).index('-dc') > calls(tmpdir).index('dr-done')
+    assert set(data['state'] for data in client.session['file_data']['ega'].values()) == {'Finished'}
@@ -0,0 +1,72 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+
+import py
+import pytest
+
+from icgcget.clients import moves
+
+SHM = '/dev/shm'
+CROSS_DEVICE = os.path.isdir(SHM) and os.access(SHM, os.W_OK)
+
+
+def make_tree(root):
+    root.join('sample.bam').write('x' * (3 * 1024 * 1024 + 7))
+    nested = root.mkdir('bundle')
+    nested.join('sample.bam.bai').write('index')
+    nested.join('link').mksymlinkto('sample.bam.bai')
+
+
+def assert_tree(root):
+    assert root.join('sample.bam').size() == 3 * 1024 * 1024 + 7
+    assert root.join('bundle', 'sample.bam.bai').read() == 'index'
+    assert os.readlink(str(root.join('bundle', 'link'))) == 'sample.bam.bai'
+
+
+@pytest.mark.parametrize('kernel', [True, False])
+def test_copy_path(tmpdir, monkeypatch, kernel):
+    if not kernel:
+        monkeypatch.setattr(moves, '_COPY_FILE_RANGE', None)
+        monkeypatch.setattr(moves, '_SENDFILE', None)
+    monkeypatch.setattr(moves, 'BUFFER_SIZE', 1024 * 1024)
+    make_tree(tmpdir.mkdir('source'))
+    moves.copy_path(str(tmpdir.join('source')), str(tmpdir.join('copy')), fsync='file')
+    assert_tree(tmpdir.join('copy'))
+
+
+@pytest.mark.skipif(not CROSS_DEVICE or os.stat(SHM).st_dev == os.stat('/tmp').st_dev,
+                    reason='needs a tmpfs on a different device')
+def test_move_across_devices(tmpdir):
+    source = py.path.local.mkdtemp(rootdir=py.path.local(SHM))
+    try:
+        make_tree(source.mkdir('entry'))
+        moves.move_path(str(source.join('entry')), str(tmpdir.join('entry')), fsync='always')
+        assert_tree(tmpdir.join('entry'))
+        assert not source.join('entry').check()
+        assert [name for name in os.listdir(str(tmpdir)) if name.endswith('.part')] == []
+    finally:
+        source.remove()
+
+
+def test_move_same_device_is_rename(tmpdir):
+    make_tree(tmpdir.mkdir('source'))
+    inode = tmpdir.join('source', 'sample.bam').stat().ino
+    moves.move_path(str(tmpdir.join('source')), str(tmpdir.join('destination')))
+    assert tmpdir.join('destination', 'sample.bam').stat().ino == inode
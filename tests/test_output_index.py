@@ -0,0 +1,65 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+import time
+
+from icgcget.clients.output_index import OutputIndex
+
+
+def make_tree(root):
+    root.join('a.bam').write('1234')
+    root.mkdir('f483ad78').join('segment.tsv').write('12')
+    root.mkdir('nested').mkdir('deeper').join('b.vcf').write('')
+
+
+def test_index_finds_files_and_directories_at_any_depth(tmpdir):
+    make_tree(tmpdir)
+    index = OutputIndex(str(tmpdir))
+    for name in ['a.bam', 'f483ad78', 'segment.tsv', 'deeper', 'b.vcf']:
+        assert name in index
+    assert 'missing.bam' not in index
+    assert index.stat('a.bam')[0] == 4
+    assert index.path('b.vcf') == os.path.join(str(tmpdir), 'nested', 'deeper', 'b.vcf')
+
+
+def test_refresh_reuses_unchanged_directories(tmpdir):
+    make_tree(tmpdir)
+    cache_path = str(tmpdir.join('..', 'index.json'))
+    for directory in ['', 'f483ad78', 'nested']:
+        os.utime(str(tmpdir.join(directory)), (time.time() - 3600, time.time() - 3600))
+    OutputIndex(str(tmpdir), cache_path)
+    tmpdir.join('nested', 'deeper', 'c.vcf').write('')
+    index = OutputIndex(str(tmpdir), cache_path)
+    assert 'c.vcf' in index and 'segment.tsv' in index
+    index.directories['f483ad78']['files']['stale.tsv'] = [0, 0]  # unchanged directories come from the saved index
+    index.refresh()
+    assert index.stat('stale.tsv') == [0, 0]
+
+
+def test_refresh_relists_directories_changed_when_listed(tmpdir):
+    make_tree(tmpdir)
+    index = OutputIndex(str(tmpdir))
+    mtime = int(time.time())
+    os.utime(str(tmpdir.join('f483ad78')), (mtime, mtime))
+    index.refresh()
+    index.directories['f483ad78']['files']['stale.tsv'] = [0, 0]
+    tmpdir.join('f483ad78', 'late.tsv').write('')
+    os.utime(str(tmpdir.join('f483ad78')), (mtime, mtime))  # a change within the same mtime tick
+    index.refresh()
+    assert 'late.tsv' in index and 'stale.tsv' not in index
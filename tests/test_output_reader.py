@@ -0,0 +1,40 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import subprocess
+
+from icgcget.clients.utils import read_lines
+
+
+def replay(transcript, chunk_size=65536):
+    process = subprocess.Popen(['printf', '%s', transcript], stdout=subprocess.PIPE)
+    lines = list(read_lines(process.stdout, chunk_size))
+    process.wait()
+    return lines
+
+
+def test_splits_on_newline_and_carriage_return():
+    assert replay('first\nsecond\r 10%\r 20%\r\nthird\n') == ['first', 'second', ' 10%', ' 20%', 'third']
+
+
+def test_lines_spanning_chunks():
+    assert replay('abcdef\nghij\rklm\n', chunk_size=4) == ['abcdef', 'ghij', 'klm']
+
+
+def test_trailing_output_is_drained():
+    assert replay('progress 99%\rDone, no trailing newline') == ['progress 99%', 'Done, no trailing newline']
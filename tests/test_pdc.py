@@ -0,0 +1,59 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+
+from icgcget.clients.pdc.pdc_client import PdcDownloadClient
+from tests.fixtures.helpers import download_session, file_object, install_tool
+
+FAKE_AWS = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+grep -q max_concurrent_requests "$AWS_CONFIG_FILE" || exit 3
+source=$4
+destination=$5
+shift 5
+if [ $# -eq 0 ]; then
+    name=$(basename "$source")
+    touch "$destination$name"
+    printf 'download: %s to %s%s\\n' "$source" "$destination" "$name"
+fi
+while [ $# -gt 0 ]; do
+    if [ "$1" = "--include" ]; then
+        name=$(printf '%s' "$2" | sed 's/\\[\\(.\\)\\]/\\1/g')
+        touch "$destination$name"
+        printf 'Completed 1 of 1 part(s)\\rdownload: %s%s to %s%s\\n' "$source" "$name" "$destination" "$name"
+    fi
+    shift
+done
+"""
+
+
+def test_pdc_objects_batched_per_prefix(tmpdir):
+    tool = install_tool(tmpdir, 'aws', FAKE_AWS)
+    staging = tmpdir.mkdir('staging')
+    urls = ['s3://bucket/a/one.bam', 's3://bucket/a/two *.bam', 's3://bucket/b/three.bam', 's3://bucket/top.bam']
+    client = PdcDownloadClient()
+    client.session = download_session({'pdc': dict(('FI{}'.format(i), file_object(str(i), fileUrl=url))
+                                                   for i, url in enumerate(urls))})
+
+    assert client.download(urls, 'key', tool, str(staging), '4', secret_key='secret') == 0
+    calls = tmpdir.join('calls.log').readlines()
+    assert len(calls) == 3
+    assert '--include two [*].bam' in calls[0] and '--recursive' not in calls[2]
+    assert sorted(os.listdir(str(staging))) == ['one.bam', 'three.bam', 'top.bam', 'two *.bam']
+    assert set(data['state'] for data in client.session['file_data']['pdc'].values()) == {'Finished'}
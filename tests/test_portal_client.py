@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import BaseHTTPServer
+
+from icgcget.clients import portal_client
+from tests.fixtures import stub_server
+from tests.fixtures.helpers import serve, server_url
+
+
+class FlakyHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    failures = 2
+
+    def do_GET(self):
+        if FlakyHandler.failures:
+            FlakyHandler.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write('{"hits": []}')
+
+    def log_message(self, *args):
+        pass
+
+
+def test_call_api_retries_server_errors():
+    server = serve(FlakyHandler)
+    defaults = dict(portal_client.TRANSPORT)
+    portal_client.configure_transport({'retries': 3, 'backoff': 0})
+    try:
+        assert portal_client.call_api(server_url(server, 'repository/files')) == {'hits': []}
+        assert FlakyHandler.failures == 0
+    finally:
+        server.shutdown()
+        portal_client.configure_transport(defaults)
+
+
+def test_metadata_pages_merge_in_order():
+    server = serve(stub_server.ServerHandler)
+    try:
+        file_ids = ['FI250134', 'FI99990', 'FI99996', 'FI99994', 'FI98765', 'FI87654', 'FI76543', 'FI65432'] * 3
+        portal = portal_client.IcgcPortalClient(verify=False, page_size=5, workers=4)
+        entities = portal.get_metadata_bulk(file_ids, server_url(server))
+        assert [entity['id'] for entity in entities] == file_ids
+    finally:
+        server.shutdown()
@@ -0,0 +1,65 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+from icgcget.commands.scheduling import schedule_files, balanced_bins, stream_loads, tail_utilisation
+from tests.fixtures.helpers import sized_files
+
+SIZES = [200, 10, 70, 40, 30, 5, 45]
+FILES = sized_files(SIZES, ['FI{}'.format(size) for size in SIZES])
+
+
+def test_largest_and_smallest_first():
+    assert schedule_files(FILES, 'largest').keys() == ['FI200', 'FI70', 'FI45', 'FI40', 'FI30', 'FI10', 'FI5']
+    assert schedule_files(FILES, 'smallest').keys() == ['FI5', 'FI10', 'FI30', 'FI40', 'FI45', 'FI70', 'FI200']
+
+
+def test_manifest_order_kept():
+    assert schedule_files(FILES, 'manifest').keys() == FILES.keys()
+
+
+def test_balanced_bins():
+    sizes = dict((file_id, data['size']) for file_id, data in FILES.iteritems())
+    bins = balanced_bins(sizes, 2)
+    assert sorted(sum(sizes[file_id] for file_id in file_bin) for file_bin in bins) == [200, 200]
+    assert balanced_bins(sizes, 10)[0] == ['FI200']
+    assert len(balanced_bins(sizes, 10)) == len(sizes)
+
+
+def test_balanced_interleaves_bins():
+    files = schedule_files(FILES, 'balanced', 2)
+    assert files.keys()[:2] == ['FI200', 'FI70']
+    assert sorted(files) == sorted(FILES)
+
+
+def test_tail_utilisation():
+    assert tail_utilisation([]) == (1.0, 0.0)
+    assert tail_utilisation([100, 50]) == (0.75, 0.5)
+    assert stream_loads([5, 200], 2) == [5, 200]
+    late = tail_utilisation(stream_loads([file_object['size'] for file_object in
+                                          schedule_files(FILES, 'smallest').values()], 2))
+    early = tail_utilisation(stream_loads([file_object['size'] for file_object in
+                                           schedule_files(FILES, 'largest').values()], 2))
+    assert early[0] > late[0]
+
+
+def test_balanced_bins_limit():
+    sizes = dict(('FI{}'.format(number), 1) for number in range(10))
+    sizes['FI0'] = 100
+    bins = balanced_bins(sizes, 2, limit=3)
+    assert len(bins) == 4
+    assert max(len(file_bin) for file_bin in bins) <= 3
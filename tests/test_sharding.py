@@ -0,0 +1,58 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import click
+import pytest
+
+from icgcget.commands.scheduling import shard_files, shard_of
+from icgcget.params import ShardParam
+from tests.fixtures.helpers import sized_files
+
+
+def file_data():
+    return {'gdc': sized_files([number * 10 for number in range(40)]),
+            'ega': sized_files(range(40, 60), ['FI{}'.format(number) for number in range(40, 60)])}
+
+
+@pytest.mark.parametrize('method', ['hash', 'size'])
+def test_shards_are_disjoint_and_complete(method):
+    seen = []
+    for shard in range(1, 4):
+        shard_data = shard_files(file_data(), shard, 3, method)
+        ids = [(repo, file_id) for repo in shard_data for file_id in shard_data[repo]]
+        assert ids
+        seen.extend(ids)
+    assert len(seen) == len(set(seen)) == 60
+
+
+def test_size_shards_are_balanced():
+    totals = [sum(data['size'] for files in shard_files(file_data(), shard, 3, 'size').values()
+                  for data in files.values()) for shard in range(1, 4)]
+    assert max(totals) - min(totals) <= 390
+
+
+def test_shard_of_is_stable():
+    assert shard_of('FI1', 4) == shard_of('FI1', 4)
+    assert set(shard_of('FI{}'.format(number), 4) for number in range(100)) == set([1, 2, 3, 4])
+
+
+def test_shard_param():
+    assert ShardParam().convert('2/4', None, None) == (2, 4)
+    for value in ('0/4', '5/4', 'x/4', '1'):
+        with pytest.raises(click.BadParameter):
+            ShardParam().convert(value, None, None)
@@ -0,0 +1,71 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import threading
+
+from icgcget.commands.staging import StagingCapacity
+from tests.fixtures.helpers import sized_files
+
+
+def test_batches_fit_capacity(tmpdir):
+    capacity = StagingCapacity(str(tmpdir), 100)
+    batches = capacity.batches(sized_files([60, 30, 20, 250, 10]))
+    assert [sorted(batch) for batch in batches] == [['FI0', 'FI1'], ['FI2'], ['FI3'], ['FI4']]
+
+
+def test_default_capacity_uses_free_space(tmpdir):
+    assert StagingCapacity(str(tmpdir)).capacity > 0
+
+
+def test_reserve_waits_for_release(tmpdir):
+    capacity = StagingCapacity(str(tmpdir), 100)
+    capacity.reserve(80)
+    started = threading.Event()
+    granted = threading.Event()
+
+    def claim():
+        started.set()
+        capacity.reserve(50)
+        granted.set()
+
+    thread = threading.Thread(target=claim)
+    thread.start()
+    started.wait(1)
+    assert not granted.wait(0.2)
+    capacity.release(80)
+    assert granted.wait(2)
+    thread.join()
+    assert capacity.reserved == 50
+
+
+def test_oversized_claim_granted_when_empty(tmpdir):
+    capacity = StagingCapacity(str(tmpdir), 100)
+    capacity.reserve(500)
+    assert capacity.reserved == 500
+
+
+def test_placed_files_release_their_space(tmpdir):
+    capacity = StagingCapacity(str(tmpdir), 100)
+    files = sized_files([60, 30])
+    capacity.reserve_files('gdc', files)
+    assert capacity.reserved == 90
+    capacity.release_file('gdc', 'FI0')
+    capacity.release_file('gdc', 'FI0')
+    assert capacity.reserved == 30
+    capacity.release_files('gdc', files)
+    assert capacity.reserved == 0
@@ -0,0 +1,61 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ('requests', 'psutil', 'yaml', 'jinja2', 'tabulate', 'subprocess32', 'ctypes')
+MEASURE = """
+import json, sys
+import icgcget.cli
+try:
+    icgcget.cli.cli.main(args=sys.argv[1:], prog_name='icgc-get')
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted(set(name.split('.')[0] for name in sys.modules))))
+"""
+
+
+def startup_modules(args, home):
+    env = dict((key, value) for key, value in os.environ.items() if not key.startswith('ICGCGET_'))
+    env['HOME'] = home  # no config file, unless the test writes one
+    args = ['--logfile', os.path.join(home, 'icgc-get.log'), '--docker', 'false'] + args
+    process = subprocess.Popen([sys.executable, '-c', MEASURE] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    _, err = process.communicate()
+    return json.loads(err.splitlines()[-1])
+
+
+@pytest.mark.parametrize('args', [['--help'], ['download', '--help'], ['report', '--help'], ['check', '--help'],
+                                  ['verify', '--help'], ['version', '--help'], ['configure', '--help']])
+def test_help_stays_light(args, tmpdir):
+    modules = startup_modules(args, str(tmpdir))
+    assert [name for name in HEAVY_MODULES if name in modules] == []
+
+
+def test_cached_config_skips_yaml(tmpdir):
+    config = tmpdir.mkdir('.icgc-get').join('config.yaml')
+    config.write('output: {0}\ndocker: false\nlogfile: {0}/icgc-get.log\nhttp:\n  retries: 5\nmove:\n  workers: 2\n'
+                 .format(tmpdir))
+    assert 'yaml' in startup_modules(['version', '--help'], str(tmpdir))
+    modules = startup_modules(['version', '--help'], str(tmpdir))
+    assert [name for name in HEAVY_MODULES if name in modules] == []
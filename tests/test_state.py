@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import json
+import os
+
+from icgcget.clients.state import StateWriter, SessionIndex
+from icgcget.commands.utils import load_json
+from tests.fixtures.helpers import file_object
+
+
+def test_updates_are_coalesced(tmpdir):
+    json_path = str(tmpdir.join('state.json'))
+    writer = StateWriter(json_path, interval=3600, max_updates=3)
+    session = {'pid': 0, 'subprocess': [], 'file_data': {}}
+    writer.write(session)
+    session['container'] = 'first'
+    writer.update(session)
+    writer.update(session)
+    assert 'container' not in json.load(open(json_path))
+    writer.update(session)
+    assert load_json(json_path, abort=False)['container'] == 'first'
+
+
+def test_flush_replaces_file_atomically(tmpdir):
+    json_path = str(tmpdir.join('state.json'))
+    writer = StateWriter(json_path, interval=3600)
+    writer.write({'pid': 0, 'subprocess': [1]})
+    writer.update({'pid': 0, 'subprocess': [1, 2]})
+    writer.flush()
+    assert os.listdir(str(tmpdir)) == ['state.json']
+    assert json.load(open(json_path))['subprocess'] == [1, 2]
+
+
+def test_discard_removes_state(tmpdir):
+    json_path = str(tmpdir.join('state.json'))
+    writer = StateWriter(json_path, interval=3600)
+    writer.write({'pid': 0, 'subprocess': []})
+    writer.update({'pid': 0, 'subprocess': [3]})
+    writer.discard()
+    writer.flush()
+    assert not os.path.exists(json_path)
+
+
+def test_session_index_tracks_running_file():
+    file_data = {'gdc': dict(('FI{}'.format(i), file_object('uuid-{}'.format(i), fileName='file{}.bam'.format(i)))
+                             for i in range(3))}
+    index = SessionIndex({'file_data': file_data})
+    assert index.update('file0.bam', 'gdc') == []
+    assert index.update('file0.bam', 'gdc') == []
+    assert index.update('uuid-2', 'gdc') == ['FI0']
+    assert [file_data['gdc'][fid]['state'] for fid in ('FI0', 'FI1', 'FI2')] == ['Finished', 'Not started', 'Running']
+    assert index.update('', 'gdc') == ['FI2']
+    assert file_data['gdc']['FI2']['state'] == 'Finished'
+
+
+def test_session_index_marks_every_file_sharing_a_name():
+    file_data = {'gdc': dict(('FI{}'.format(i), file_object('uuid-{}'.format(i),
+                                                            fileName='shared.bam' if i < 2 else 'other.bam'))
+                             for i in range(3))}
+    index = SessionIndex({'file_data': file_data})
+    assert index.update('shared.bam', 'gdc') == []
+    assert [file_data['gdc'][fid]['state'] for fid in ('FI0', 'FI1', 'FI2')] == ['Running', 'Running', 'Not started']
+    assert sorted(index.update('other.bam', 'gdc')) == ['FI0', 'FI1']
+    assert index.finish('other.bam', 'gdc') == ['FI2']
+    assert set(data['state'] for data in file_data['gdc'].values()) == {'Finished'}
@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2016 The Ontario Institute for Cancer Research. All rights reserved.
+#
+# This program and the accompanying materials are made available under the terms of the GNU Public License v3.0.
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+
+from icgcget.clients.work_queue import WorkQueue, queue_directory
+
+FILES = ['FI1', 'FI2', 'FI3', 'FI4']
+
+
+def test_claims_are_exclusive(tmpdir):
+    first = WorkQueue(str(tmpdir), node='first')
+    second = WorkQueue(str(tmpdir), node='second')
+    assert first.claim('gdc', FILES, 2) == ['FI1', 'FI2']
+    assert second.claim('gdc', FILES, 3) == ['FI3', 'FI4']
+    assert second.claim('gdc', FILES, 3) == []
+
+
+def test_completed_files_leave_the_queue(tmpdir):
+    queue = WorkQueue(str(tmpdir), node='first')
+    queue.claim('gdc', FILES, 4)
+    queue.complete('gdc', ['FI1', 'FI2'], {'FI1': 10, 'FI2': 20})
+    queue.release([queue.key('gdc', 'FI3')])
+    file_data = {'gdc': dict((file_id, {'size': 10, 'state': 'Not started'}) for file_id in FILES)}
+    assert queue.pending(file_data) == 2
+    assert WorkQueue(str(tmpdir), node='second').claim('gdc', FILES, 4) == ['FI3']
+    summary = queue.progress(file_data)
+    assert (summary['finished'], summary['files'], summary['finished_bytes']) == (2, 4, 20)
+    assert [file_data['gdc'][file_id]['state'] for file_id in FILES] == ['Finished', 'Finished', 'Running', 'Running']
+
+
+def test_expired_claims_are_taken_over(tmpdir):
+    crashed = WorkQueue(str(tmpdir), node='crashed', lease=60)
+    crashed.claim('gdc', FILES, 2)
+    survivor = WorkQueue(str(tmpdir), node='survivor', lease=60)
+    assert survivor.claim('gdc', FILES[:2], 2) == []
+    os.utime(crashed.claim_path(crashed.key('gdc', 'FI1')), (0, 0))
+    assert survivor.claim('gdc', FILES[:2], 2) == ['FI1']
+    assert open(survivor.claim_path(survivor.key('gdc', 'FI1'))).read() == 'survivor'
+    crashed.renew()
+    assert crashed.key('gdc', 'FI1') not in crashed.held
+    crashed.stop()
+    assert os.listdir(crashed.claims_dir) == ['gdc.FI1']
+
+
+def test_take_over_puts_back_live_claims(tmpdir):
+    owner = WorkQueue(str(tmpdir), node='owner', lease=60)
+    owner.claim('gdc', FILES, 1)
+    late = WorkQueue(str(tmpdir), node='late', lease=60)
+    key = late.key('gdc', 'FI1')
+    assert not late.take_over(key, late.clock())  # renewed after it was found expired
+    assert open(late.claim_path(key)).read() == 'owner'
+    assert os.listdir(late.claims_dir) == [key]
+    os.utime(late.claim_path(key), (0, 0))
+    assert late.take_over(key, late.clock())
+    assert open(late.claim_path(key)).read() == 'late'
+
+
+def test_stop_releases_claims(tmpdir):
+    queue = WorkQueue(str(tmpdir), node='first', heartbeat=0.01)
+    queue.start()
+    queue.claim('gdc', FILES, 2)
+    queue.stop()
+    assert os.listdir(queue.claims_dir) == []
+    assert os.listdir(queue.nodes_dir) == []
+
+
+def test_queue_directory_per_download(tmpdir):
+    assert queue_directory(str(tmpdir), ('FI2', 'FI1'), ()) == queue_directory(str(tmpdir), ('FI1', 'FI2'), ())
+    assert queue_directory(str(tmpdir), ('FI1',), ()) != queue_directory(str(tmpdir), ('FI1',), ('gdc',))
+
+
+def test_read_only_progress_leaves_queue_untouched(tmpdir):
+    file_data = {'gdc': dict((file_id, {'state': 'Not started', 'size': 1}) for file_id in FILES)}
+    reader = WorkQueue(str(tmpdir.join('missing')), read_only=True)
+    assert reader.progress(file_data)['finished'] == 0
+    assert not tmpdir.join('missing').check()
+
+    worker = WorkQueue(str(tmpdir), node='worker')
+    worker.claim('gdc', FILES, 2)
+    worker.complete('gdc', ['FI1'], {'FI1': 1})
+    mtime = int(os.path.getmtime(str(tmpdir))) - 100
+    os.utime(str(tmpdir), (mtime, mtime))
+    summary = WorkQueue(str(tmpdir), read_only=True).progress(file_data)
+    assert (summary['finished'], summary['nodes']) == (1, 1)
+    assert file_data['gdc']['FI2']['state'] == 'Running'
+    assert os.path.getmtime(str(tmpdir)) == mtime